@@ -3,9 +3,10 @@ Aggregated API endpoints for the Invasive Species Tracker
 '''
 
 from fastapi import APIRouter
-from app.api.v1.endpoints import health, species, risk
+from app.api.v1.endpoints import admin, health, species, risk
 
 router = APIRouter()
 router.include_router(health.router)
 router.include_router(species.router)
-router.include_router(risk.router)
\ No newline at end of file
+router.include_router(risk.router)
+router.include_router(admin.router)
\ No newline at end of file
@@ -0,0 +1,33 @@
+'''
+Admin endpoints for the Invasive Species Tracker
+'''
+
+import asyncio
+from dataclasses import asdict
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+
+from app.core.config import settings
+from app.db.datasets import ReloadInProgress, reload_datasets
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(default=None)) -> None:
+    if not settings.admin_token:
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled (set ADMIN_TOKEN)")
+    if x_admin_token != settings.admin_token:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@router.post("/reload", dependencies=[Depends(require_admin_token)])
+async def reload(
+    force: bool = Query(False, description="Rebuild even if the source files are unchanged"),
+):
+    # Build off the event loop; requests keep being served from the current version meanwhile
+    try:
+        version, reloaded = await asyncio.to_thread(reload_datasets, force)
+    except ReloadInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"reloaded": reloaded, "dataset": asdict(version)}
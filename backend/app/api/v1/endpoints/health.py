@@ -2,11 +2,31 @@
 Health endpoint for the Invasive Species Tracker
 '''
 
+from dataclasses import asdict
+
 from fastapi import APIRouter
 from app.core.config import settings
+from app.core.rainfall_cache import get_rainfall_cache
+from app.core.gbif_cache import get_gbif_tile_cache
+from app.core.risk_cache import get_risk_cache
+from app.db.datasets import get_dataset_version
 
 router = APIRouter(tags=["health"])
 
 @router.get("/health")
 async def health():
-    return {"status": "ok", "app": settings.app_name, "env": settings.env}
\ No newline at end of file
+    rainfall_cache = get_rainfall_cache()
+    gbif_tile_cache = get_gbif_tile_cache()
+    risk_cache = get_risk_cache()
+    dataset = get_dataset_version()
+    return {
+        "status": "ok",
+        "app": settings.app_name,
+        "env": settings.env,
+        "dataset": asdict(dataset) if dataset is not None else None,
+        "caches": {
+            "rainfall": rainfall_cache.stats() if rainfall_cache is not None else None,
+            "gbif_tiles": gbif_tile_cache.stats() if gbif_tile_cache is not None else None,
+            "risk_scan": risk_cache.stats() if risk_cache is not None else None,
+        },
+    }
\ No newline at end of file
@@ -1,135 +1,391 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Path, Query
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+import asyncio
 import pandas as pd
 import numpy as np
 
-from app.db.ml_store import get_ml_df
-from app.ml.risk_engine import calculate_risk
-from app.core.utils import fetch_rainfall, estimate_soil_ph, fetch_species_from_gbif
-from app.schemas.risk import RiskAnalysisRequest, RiskAnalysisResponse
+from app.db import mongo_store
+from app.db.csv_store import nearby_species_names
+from app.db.mongo import get_db
+from app.db.spatial_index import GridIndex
+from app.db.datasets import DatasetVersion, LiveDatasets, get_live_datasets
+from app.db.ml_store import MLCatalog, get_ml_catalog, normalize_scientific_name
+from app.ml.risk_engine import (
+    build_site_profile,
+    build_target_matrix,
+    build_target_vector,
+    cosine_score_matrix,
+    rank_risk,
+    rank_scores,
+)
+from app.ml.catalog_index import get_catalog_index, search_catalog
+from app.ml.risk_table import get_risk_table, lookup_scores
+from app.ml.risk_tiles import render_tile
+from app.core.config import settings
+from app.core.metrics import RISK_CACHE, ROWS, TILE_CACHE, count, stage
+from app.core.responses import envelope_json, records_json, splice_json
+from app.core.risk_cache import BYPASS, RiskScanCache, get_risk_cache
+from app.core.tile_cache import get_tile_cache, tile_version
+from app.core.utils import fetch_rainfall_async, estimate_soil_ph, fetch_species_from_gbif_async, rainfall_key
+from app.schemas.risk import CatalogRiskRequest, RiskAnalysisRequest, RiskAnalysisResponse, RiskBatchResponse
 
 router = APIRouter(prefix="/risk", tags=["risk"])
 
 
-def _normalize_scientific_name(name: str) -> str:
-    """Normalize scientific name for matching: remove author info, lowercase, trim."""
-    if not name:
-        return ""
-    # Remove author info in parentheses: "Genus species (Author)" -> "Genus species"
-    return name.split('(')[0].strip().lower()
+async def _fetch_nearby_names(
+    lat: float, lng: float, radius_km: float, occurrences: Tuple[pd.DataFrame, GridIndex]
+) -> list:
+    """
+    Scientific names observed near the site: from GBIF, or with
+    NEARBY_SPECIES_SOURCE=local from the occurrence store (the in-process
+    mirror snapshot in `occurrences`, or MongoDB with OCCURRENCE_STORE=mongo).
+    """
+    if settings.nearby_species_source == "local" and settings.occurrence_store == "mongo":
+        return (await mongo_store.nearby_species_names(get_db(), lat, lng, radius_km)).tolist()
+    if settings.nearby_species_source == "local":
+        df, index = occurrences
+        with stage("local_occurrences"):
+            return nearby_species_names(df, lat, lng, radius_km, index=index).tolist()
 
+    nearby_species = await fetch_species_from_gbif_async(lat, lng, radius_meters=int(radius_km * 1000))
+    return [s.get('scientific_name') for s in nearby_species]
 
-def _filter_ml_dataset_by_species(ml_df: pd.DataFrame, species_names: set) -> pd.DataFrame:
-    """Filter ML dataset to only include species in the provided set (case-insensitive match)."""
-    if 'scientific_name' not in ml_df.columns:
-        return ml_df.iloc[0:0].copy()
-    
-    # Normalize ML dataset names
-    ml_df_normalized = ml_df.copy()
-    ml_df_normalized['_normalized_name'] = ml_df_normalized['scientific_name'].astype(str).apply(_normalize_scientific_name)
-    
-    # Filter and drop temporary column
-    filtered = ml_df_normalized[ml_df_normalized['_normalized_name'].isin(species_names)].copy()
-    return filtered.drop(columns=['_normalized_name']) if '_normalized_name' in filtered.columns else filtered
+
+def _nearby_catalog_rows(catalog: MLCatalog, names: Iterable[Optional[str]]) -> Tuple[set, np.ndarray]:
+    """Normalized nearby names and the catalog rows they match."""
+    nearby_names = {normalize_scientific_name(name) for name in names if name}
+    # Look up catalog rows of nearby species in the startup-built name index
+    return nearby_names, catalog.match_species(nearby_names)
+
+
+def _scan_meta(request: RiskAnalysisRequest, rainfall: float, soil_ph: float, n_nearby: int, n_matched: int) -> dict:
+    return {
+        "rainfall_used": rainfall,
+        "soil_ph_used": soil_ph,
+        "biome": request.biome_context,
+        "species_found_nearby": n_nearby,
+        "species_in_ml_dataset": n_matched,
+        "k": request.k,
+        "offset": request.offset,
+        "total_ranked": 0,
+    }
+
+
+def _page_kwargs(request: RiskAnalysisRequest) -> dict:
+    return {"k": request.k, "offset": request.offset, "min_score": request.min_score}
+
+
+def _result_columns(ranked: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    common_name = ranked['common_name']
+    return {
+        "scientific_name": ranked['scientific_name'],
+        "common_name": np.where(pd.isna(common_name) | (common_name == ""), "Unknown", common_name),
+        "is_invasive": ranked['is_invasive'],
+        "risk_score": ranked['risk_score'],
+        "risk_label": ranked['risk_label'],
+    }
+
+
+EMPTY_RESULTS = _result_columns({
+    'scientific_name': np.array([], dtype=object),
+    'common_name': np.array([], dtype=object),
+    'is_invasive': np.array([], dtype=np.int64),
+    'risk_score': np.array([], dtype=np.float64),
+    'risk_label': np.array([], dtype=object),
+})
+
+
+def _rank_site(
+    request: RiskAnalysisRequest,
+    catalog: MLCatalog,
+    rainfall: float,
+    soil_ph: float,
+    rows: np.ndarray,
+) -> Dict[str, np.ndarray]:
+    """
+    Ranked page of the matched rows: gathered from the profile-space lookup
+    table when it is enabled and covers the rainfall (rows near a label
+    threshold rescored exactly), else scored exactly.
+    """
+    table = get_risk_table(catalog)
+    scores = None
+    if table is not None:
+        scores = lookup_scores(table, catalog, request.biome_context, request.is_urban, rainfall, rows)
+    if scores is not None:
+        count(ROWS, "risk_scan", "table_lookup", amount=int(rows.size))
+        return rank_scores(catalog, rows, scores, **_page_kwargs(request))
+
+    dynamic_profile = build_site_profile(request.is_urban, request.biome_context, soil_ph, rainfall)
+    return rank_risk(catalog, dynamic_profile, rows=rows, **_page_kwargs(request))
+
+
+async def _scan(request: RiskAnalysisRequest, live: LiveDatasets) -> Tuple[dict, str]:
+    """Meta and serialized results of one site scan."""
+    catalog = live.catalog
+    # Fetch species near location from GBIF and rainfall (always needed for metadata) concurrently
+    with stage("upstream"):
+        nearby_species, rainfall = await asyncio.gather(
+            _fetch_nearby_names(request.lat, request.lng, request.radius_km, live.occurrences),
+            fetch_rainfall_async(request.lat, request.lng),
+        )
+    soil_ph = estimate_soil_ph(request.biome_context)
+
+    with stage("match"):
+        nearby_names, matched_rows = _nearby_catalog_rows(catalog, nearby_species)
+    count(ROWS, "risk_scan", "scanned", amount=len(nearby_names))
+    count(ROWS, "risk_scan", "matched", amount=int(matched_rows.size))
+    meta = _scan_meta(request, rainfall, soil_ph, len(nearby_names), int(matched_rows.size))
+
+    # Early return if no species found / no matches in ML dataset
+    if matched_rows.size == 0:
+        return meta, records_json(EMPTY_RESULTS)
+
+    with stage("score"):
+        ranked = _rank_site(request, catalog, rainfall, soil_ph, matched_rows)
+    meta["total_ranked"] = ranked['total']
+
+    # Columns are typed by construction, so they are serialized without per-row models
+    with stage("serialize"):
+        return meta, records_json(_result_columns(ranked))
+
+
+def _scan_cache_key(cache: RiskScanCache, request: RiskAnalysisRequest, version: Optional[DatasetVersion]) -> tuple:
+    return (
+        *cache.cell(request.lat, request.lng),
+        cache.radius(request.radius_km),
+        request.biome_context,
+        request.is_urban,
+        request.k,
+        request.offset,
+        request.min_score,
+        version.version if version is not None else None,  # a reload invalidates old entries
+    )
 
 
 @router.post("/scan", response_model=RiskAnalysisResponse)
 async def scan_risk(
     request: RiskAnalysisRequest,
-    ml_df: pd.DataFrame = Depends(get_ml_df),
+    live: LiveDatasets = Depends(get_live_datasets),
 ):
-    # Fetch species near location from GBIF
-    nearby_species = fetch_species_from_gbif(
-        request.lat, 
-        request.lng, 
-        radius_meters=int(request.radius_km * 1000)
-    )
-    
-    # Calculate environmental data (always needed for metadata)
-    rainfall = fetch_rainfall(request.lat, request.lng)
+    cache = get_risk_cache()
+    if cache is None:
+        (meta, results), status = await _scan(request, live), BYPASS
+    else:
+        # Scan the cell center and key radius so every request mapping to this key gets the same answer
+        lat, lng = cache.cell(request.lat, request.lng)
+        cell_request = request.model_copy(update={"lat": lat, "lng": lng, "radius_km": cache.radius(request.radius_km)})
+
+        async def compute() -> Tuple[Tuple[dict, str], bool]:
+            meta, results = await _scan(cell_request, live)
+            # Nothing nearby is also what a failed GBIF call looks like: do not cache it
+            return (meta, results), meta["species_found_nearby"] > 0
+
+        (meta, results), status = await cache.get_or_compute(_scan_cache_key(cache, cell_request, live.version), compute)
+
+    count(RISK_CACHE, status)
+    body = splice_json({"meta": {**meta, "cache": status}}, "results", results)
+    return Response(content=body, media_type="application/json", headers={"X-Cache": status})
+
+
+@router.post("/catalog", response_model=RiskAnalysisResponse)
+async def catalog_risk(
+    request: CatalogRiskRequest,
+    catalog: MLCatalog = Depends(get_ml_catalog),
+):
+    """
+    Most dangerous species of the whole catalog for the site profile, not
+    only those observed nearby. Searched through the IVF catalog index when
+    it is enabled (at most `nprobe` lists; meta.exact tells whether the
+    bounds proved the page exact), else by brute force.
+    """
+    rainfall = await fetch_rainfall_async(request.lat, request.lng)
     soil_ph = estimate_soil_ph(request.biome_context)
-    
-    # Early return if no species found
-    if not nearby_species:
-        return {
-            "meta": {
-                "rainfall_used": rainfall,
-                "soil_ph_used": soil_ph,
-                "biome": request.biome_context,
-                "species_found_nearby": 0,
-                "species_in_ml_dataset": 0
-            },
-            "results": []
-        }
-    
-    # Normalize GBIF species names for matching
-    nearby_names = {
-        _normalize_scientific_name(s.get('scientific_name', '')) 
-        for s in nearby_species 
-        if s.get('scientific_name')
+
+    with stage("score"):
+        profile = build_site_profile(request.is_urban, request.biome_context, soil_ph, rainfall)
+        target_vec = build_target_vector(catalog, profile)
+        index = None if request.exact else get_catalog_index(catalog)
+        found = search_catalog(
+            catalog, index, target_vec,
+            need=request.offset + request.k,
+            nprobe=request.nprobe or settings.catalog_index_nprobe,
+            min_score=request.min_score,
+        )
+        ranked = rank_scores(
+            catalog, found.rows, found.scores, k=request.k, offset=request.offset, min_score=request.min_score
+        )
+    count(ROWS, "risk_catalog", "scanned", amount=found.candidates)
+
+    meta = {
+        "rainfall_used": rainfall,
+        "soil_ph_used": soil_ph,
+        "biome": request.biome_context,
+        "k": request.k,
+        "offset": request.offset,
+        "total_ranked": ranked['total'],  # with the index: only rows that could make the page
+        "search": "ivf" if index is not None else "brute_force",
+        "exact": found.exact,  # False when nprobe cut the search short: ranks may be approximate
+        "lists_probed": found.lists_probed,
+        "candidates": found.candidates,
     }
-    
-    # Filter ML dataset to only nearby species
-    ml_df_filtered = _filter_ml_dataset_by_species(ml_df, nearby_names)
-    
-    # Early return if no matches in ML dataset
-    if ml_df_filtered.empty:
-        return {
-            "meta": {
-                "rainfall_used": rainfall,
-                "soil_ph_used": soil_ph,
-                "biome": request.biome_context,
-                "species_found_nearby": len(nearby_names),
-                "species_in_ml_dataset": 0
-            },
-            "results": []
-        }
-
-    # Build dynamic profile for risk calculation
-    dynamic_profile = {}
-    
-    dynamic_profile['native_region_count'] = 1.0 if request.is_urban else 0.5
-    
-    norm_ph = np.clip((soil_ph - 3.0) / 6.0, 0, 1)
-    dynamic_profile['growth_ph_minimum'] = norm_ph
-    dynamic_profile['growth_ph_maximum'] = norm_ph
-    
-    norm_rain = np.clip(rainfall / 3000.0, 0, 1)
-    dynamic_profile['growth_minimum_precipitation_mm'] = norm_rain
-    
-    if request.biome_context == 'Grassland':
-        dynamic_profile['habit_Graminoid'] = 1.0
-    elif request.biome_context == 'Forest':
-        dynamic_profile['habit_Shrub'] = 1.0
-        
-    raw_results = calculate_risk(ml_df_filtered, dynamic_profile) # pass in the filtered dataframe
-    
-    formatted_results = []
-    for row in raw_results:
-        score = row['risk_score']
-        if score >= 0.65:
-            label = "High Risk"
-        elif score >= 0.45:
-            label = "Moderate Risk"
-        else:
-            label = "Low Risk"
-            
-        formatted_results.append({
-            "scientific_name": row['scientific_name'],
-            "common_name": row.get('common_name', "Unknown"),
-            "is_invasive": int(row['is_invasive']),
-            "risk_score": float(score),
-            "risk_label": label
-        })
-        
-    return {
-        "meta": {
-            "rainfall_used": rainfall,
-            "soil_ph_used": soil_ph,
-            "biome": request.biome_context,
-            "species_found_nearby": len(nearby_names),
-            "species_in_ml_dataset": len(ml_df_filtered)
-        },
-        "results": formatted_results
-    }
\ No newline at end of file
+    with stage("serialize"):
+        body = envelope_json({"meta": meta}, "results", _result_columns(ranked))
+    return Response(content=body, media_type="application/json")
+
+
+@router.get("/tiles/{z}/{x}/{y}")
+async def risk_tile(
+    z: int = Path(..., ge=0, le=22),
+    x: int = Path(..., ge=0),
+    y: int = Path(..., ge=0),
+    biome_context: str = Query(..., description="Biome of the site profile"),
+    is_urban: bool = Query(False),
+    grid: Optional[int] = Query(None, ge=1, le=256, description="Cells per tile side; default RISK_TILE_GRID"),
+    live: LiveDatasets = Depends(get_live_datasets),
+):
+    """
+    XYZ heatmap tile: max and mean risk (for the biome / urban profile) of
+    the catalog species observed in each cell of the tile, from the local
+    occurrence store, plus the number of species per cell. Rows run north
+    to south. Rendered tiles are cached in memory and on disk.
+    """
+    if x >= 1 << z or y >= 1 << z:
+        raise HTTPException(status_code=404, detail=f"No tile {x}/{y} at zoom {z}")
+    grid = grid or settings.risk_tile_grid
+    df, index = live.occurrences
+    catalog = live.catalog
+
+    async def compute() -> Tuple[bytes, bool]:
+        # Tiles scored with the fallback rainfall are served but not cached
+        return await render_tile(df, index, catalog, z, x, y, grid, biome_context, is_urban)
+
+    cache = get_tile_cache()
+    if cache is None:
+        (body, _), status = await compute(), BYPASS
+    else:
+        key = (tile_version(live.version), z, x, y, grid, biome_context, is_urban)
+        body, status = await cache.get_or_compute(key, compute)
+
+    count(TILE_CACHE, status)
+    return Response(content=body, media_type="application/json", headers={"X-Cache": status})
+
+
+class _BatchLookups:
+    """
+    Deduplicated upstream lookups for a batch: one task per distinct
+    nearby-species query circle and one per distinct rainfall key.
+    """
+
+    def __init__(self, sites: List[RiskAnalysisRequest], occurrences: Tuple[pd.DataFrame, GridIndex]):
+        self._gbif: Dict[tuple, asyncio.Task] = {}
+        self._rainfall: Dict[tuple, asyncio.Task] = {}
+        self.site_keys = []
+        for site in sites:
+            gbif_key = (site.lat, site.lng, int(site.radius_km * 1000))
+            rain_key = rainfall_key(site.lat, site.lng)
+            if gbif_key not in self._gbif:
+                self._gbif[gbif_key] = asyncio.create_task(
+                    _fetch_nearby_names(site.lat, site.lng, site.radius_km, occurrences)
+                )
+            if rain_key not in self._rainfall:
+                self._rainfall[rain_key] = asyncio.create_task(fetch_rainfall_async(site.lat, site.lng))
+            self.site_keys.append((gbif_key, rain_key))
+
+    @property
+    def upstream_calls(self) -> int:
+        return len(self._gbif) + len(self._rainfall)
+
+    async def site(self, i: int) -> Tuple[list, float]:
+        gbif_key, rain_key = self.site_keys[i]
+        return await self._gbif[gbif_key], await self._rainfall[rain_key]
+
+    def cancel(self) -> None:
+        for task in [*self._gbif.values(), *self._rainfall.values()]:
+            task.cancel()
+
+
+def _site_json(meta: dict, columns: Dict[str, np.ndarray], index: Optional[int] = None) -> str:
+    envelope = {"meta": meta} if index is None else {"index": index, "meta": meta}
+    return envelope_json(envelope, "results", columns)
+
+
+async def _stream_sites(
+    sites: List[RiskAnalysisRequest],
+    lookups: _BatchLookups,
+    catalog: MLCatalog,
+) -> AsyncIterator[bytes]:
+    """NDJSON: one line per site, in completion order, tagged with its request index."""
+    async def scan_site(i: int) -> str:
+        site = sites[i]
+        nearby_species, rainfall = await lookups.site(i)
+        soil_ph = estimate_soil_ph(site.biome_context)
+        nearby_names, rows = _nearby_catalog_rows(catalog, nearby_species)
+        meta = _scan_meta(site, rainfall, soil_ph, len(nearby_names), int(rows.size))
+        if rows.size == 0:
+            return _site_json(meta, EMPTY_RESULTS, index=i)
+        ranked = _rank_site(site, catalog, rainfall, soil_ph, rows)
+        meta["total_ranked"] = ranked['total']
+        return _site_json(meta, _result_columns(ranked), index=i)
+
+    try:
+        for finished in asyncio.as_completed([scan_site(i) for i in range(len(sites))]):
+            yield (await finished + "\n").encode("utf-8")
+    finally:
+        lookups.cancel()
+
+
+@router.post("/scan/batch", response_model=RiskBatchResponse)
+async def scan_risk_batch(
+    sites: List[RiskAnalysisRequest],
+    stream: bool = Query(False, description="Stream one NDJSON line per site as it finishes"),
+    live: LiveDatasets = Depends(get_live_datasets),
+):
+    """
+    Scan many sites at once. Upstream lookups are deduplicated across sites,
+    and every site profile is scored in a single matrix-matrix product over
+    the union of matched catalog rows. Results keep request order.
+    """
+    if not sites:
+        raise HTTPException(status_code=422, detail="At least one site is required")
+    if len(sites) > settings.risk_batch_max_sites:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(sites)} sites (max {settings.risk_batch_max_sites})",
+        )
+
+    catalog = live.catalog
+    lookups = _BatchLookups(sites, live.occurrences)
+    if stream:
+        return StreamingResponse(_stream_sites(sites, lookups, catalog), media_type="application/x-ndjson")
+
+    try:
+        fetched = await asyncio.gather(*(lookups.site(i) for i in range(len(sites))))
+    finally:
+        lookups.cancel()
+
+    metas, site_rows, profiles = [], [], []
+    for site, (nearby_species, rainfall) in zip(sites, fetched):
+        soil_ph = estimate_soil_ph(site.biome_context)
+        nearby_names, rows = _nearby_catalog_rows(catalog, nearby_species)
+        metas.append(_scan_meta(site, rainfall, soil_ph, len(nearby_names), int(rows.size)))
+        site_rows.append(rows)
+        profiles.append(build_site_profile(site.is_urban, site.biome_context, soil_ph, rainfall))
+
+    # Score the union of matched rows against all profiles at once, then slice per site
+    union_rows = np.unique(np.concatenate(site_rows)) if site_rows else np.array([], dtype=np.intp)
+    scores = cosine_score_matrix(catalog, build_target_matrix(catalog, profiles), rows=union_rows)
+
+    parts = []
+    for j, (site, meta, rows) in enumerate(zip(sites, metas, site_rows)):
+        if rows.size == 0:
+            parts.append(_site_json(meta, EMPTY_RESULTS))
+            continue
+        positions = np.searchsorted(union_rows, rows)
+        ranked = rank_scores(catalog, rows, scores[positions, j], **_page_kwargs(site))
+        meta["total_ranked"] = ranked['total']
+        parts.append(_site_json(meta, _result_columns(ranked)))
+
+    body = '{"sites":[' + ",".join(parts) + ']}'
+    return Response(content=body.encode("utf-8"), media_type="application/json")
@@ -7,9 +7,14 @@ from datetime import datetime
 from bson import ObjectId
 import pandas as pd
 
-# from app.db.mongo import get_db
+from app.db import mongo_store
+from app.db.mongo import get_db
 from app.schemas.species import SpeciesNearbyOut
-from app.db.csv_store import get_df, query_species_by_location
+from app.core.config import settings
+from app.core.metrics import stage
+from app.core.responses import ColumnarJSONResponse
+from app.db.csv_store import SpeciesColumns, get_occurrences, query_species_columns
+from app.db.spatial_index import GridIndex
 
 
 router = APIRouter(prefix="/species", tags=["species"])
@@ -24,20 +29,38 @@ def _to_out(species: dict) -> SpeciesNearbyOut:
         distance_km=species.get("distance_km", 0),
     )
 
+def _columns_response(columns: SpeciesColumns) -> ColumnarJSONResponse:
+    with stage("serialize"):
+        names = pd.Series(columns["scientific_name"], dtype=object, copy=False)
+        return ColumnarJSONResponse({
+            "id": names.str.lower().str.replace(" ", "_", regex=False).to_numpy(),
+            "scientific_name": columns["scientific_name"],
+            "common_name": columns["common_name"],
+            "family": columns["family"],
+            "distance_km": columns["distance_km"],
+        })
+
+
 @router.get("/by-location", response_model=list[SpeciesNearbyOut])
 async def get_species_by_location(
     latitude: float = Query(..., ge=-90, le=90, description="Latitude between -90 and 90"),
     longitude: float = Query(..., ge=-180, le=180, description="Longitude between -180 and 180"),
     radius_km: float = Query(5.0, gt=0, le=1000, description="Search radius in km (max 1000)"),
     limit: int = Query(50, ge=1, le=200, description="Max number of results"),
-    df: pd.DataFrame = Depends(get_df),
+    occurrences: tuple[pd.DataFrame, GridIndex] = Depends(get_occurrences),
 ):
+    df, index = occurrences  # one snapshot, even if a reload swaps the store mid-request
     limit = min(max(limit, 1), 200) # pagination limit
 
-    # uncomment to use real data from .csv file
-    # return [_to_out(species) for species in query_species_by_location(
-    #     df, latitude, longitude, radius_km, limit)
-    # ]
+    # MongoDB backend: $geoNear on the 2dsphere index, deduplicated by species in the pipeline
+    if settings.occurrence_store == "mongo":
+        return _columns_response(
+            await mongo_store.query_species_columns(get_db(), latitude, longitude, radius_km, limit)
+        )
+
+    # Real data from the .csv store; the mock list below is served while it is empty
+    if len(df) > 0:
+        return _columns_response(query_species_columns(df, latitude, longitude, radius_km, limit, index=index))
 
     MOCK_SPECIES_NEARBY = [
         {
@@ -0,0 +1,226 @@
+'''
+Offline build commands for the Invasive Species Tracker
+
+Usage (from backend/):
+    python -m app.cli build-catalog [CSV]
+    python -m app.cli build-catalog-index [CSV] [--lists N]
+    python -m app.cli ingest-gbif EXPORT [--out CSV]
+    python -m app.cli load-mongo [CSV] [--replace]
+    python -m app.cli build-precip-grid GRID.asc [--out DIR]
+    python -m app.cli prerender-risk-tiles [--zooms 4-9] [--biomes A,B] [--max-tiles N]
+'''
+
+import argparse
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_ML_DATA_PATH = os.path.join(os.path.dirname(BACKEND_DIR), "notebooks", "vectorized_species_master.csv")
+
+
+def _build_catalog(args: argparse.Namespace) -> None:
+    from app.db import binary_cache
+    from app.db.ml_store import build_catalog
+
+    start = time.perf_counter()
+    directory = build_catalog(args.csv, args.out)
+    print(f"Catalog build: {directory} ({time.perf_counter() - start:.2f}s)")
+
+    manifest, arrays = binary_cache.open_build(directory)
+    if "pca_components" in arrays:
+        n_components, n_features = arrays["pca_components"].shape
+        print(f"PCA scoring space: {n_components} of {n_features} dimensions, "
+              f"{manifest['pca_explained_variance']:.1%} of the variance")
+
+
+def _build_catalog_index(args: argparse.Namespace) -> None:
+    from app.core.config import settings
+    from app.db.ml_store import load_ml_data
+    from app.ml.catalog_index import build_catalog_index, load_catalog_index
+
+    catalog = load_ml_data(args.csv)
+    lists = settings.catalog_index_lists if args.lists is None else args.lists
+    start = time.perf_counter()
+    directory = build_catalog_index(args.csv, catalog, lists, args.out)
+    index = load_catalog_index(args.csv, catalog, lists, args.out)
+    print(f"Catalog index build: {directory} ({index.n_lists} lists over {len(catalog)} species, "
+          f"{time.perf_counter() - start:.2f}s)")
+
+
+def _ingest_gbif(args: argparse.Namespace) -> None:
+    from app.db.csv_store import build_spatial_index, load_csv_with_stats
+    from app.db.datasets import OCCURRENCE_CSV_PATH
+    from app.db.gbif_mirror import ingest_gbif_export
+
+    out = args.out or OCCURRENCE_CSV_PATH
+    stats = ingest_gbif_export(args.export, out)
+    print(f"Ingested {stats.rows_written}/{stats.rows_read} occurrences of {stats.species} species "
+          f"into {out} ({stats.seconds:.2f}s)")
+
+    # Load it the way the service will, to validate the file and time the index build
+    df, load = load_csv_with_stats(out)
+    start = time.perf_counter()
+    build_spatial_index(df)
+    print(f"Store load: {load.rows_kept} rows, {load.table_mb:.1f} MB ({load.seconds:.2f}s); "
+          f"spatial index ({time.perf_counter() - start:.2f}s)")
+
+
+def _load_mongo(args: argparse.Namespace) -> None:
+    import asyncio
+
+    from app.core.config import settings
+    from app.db.csv_store import load_csv_with_stats
+    from app.db.datasets import OCCURRENCE_CSV_PATH
+    from app.db.indexes import ensure_indexes
+    from app.db.mongo import close_db, open_db
+    from app.db.mongo_store import insert_occurrences
+
+    path = args.csv or OCCURRENCE_CSV_PATH
+    df, load = load_csv_with_stats(path)
+
+    async def load_all() -> int:
+        db = open_db()
+        if args.replace:
+            await db[settings.mongo_occurrences_collection].drop()
+        await ensure_indexes(db)
+        return await insert_occurrences(db, df)
+
+    start = time.perf_counter()
+    try:
+        inserted = asyncio.run(load_all())
+    finally:
+        close_db()
+    print(f"Loaded {inserted}/{load.rows_kept} occurrences from {path} into "
+          f"{settings.mongo_db}.{settings.mongo_occurrences_collection} ({time.perf_counter() - start:.2f}s)")
+
+
+def _build_precip_grid(args: argparse.Namespace) -> None:
+    from app.db.precip_grid import build_precip_grid, load_precip_grid
+
+    start = time.perf_counter()
+    directory = build_precip_grid(args.grid, args.out)
+    grid = load_precip_grid(args.grid, args.out)
+    rows, cols = grid.values.shape
+    print(f"Precipitation grid build: {directory} ({rows}x{cols} cells of {grid.cellsize} deg, "
+          f"{time.perf_counter() - start:.2f}s)")
+
+
+def _zooms(value: str) -> list:
+    """"4-9" or "4,6,8" -> zoom levels."""
+    zooms = []
+    for part in value.split(","):
+        first, _, last = part.partition("-")
+        zooms.extend(range(int(first), int(last or first) + 1))
+    return zooms
+
+
+def _prerender_risk_tiles(args: argparse.Namespace) -> None:
+    import asyncio
+
+    from app.core.config import settings
+    from app.core.http_client import close_http_client, open_http_client
+    from app.core.rainfall_cache import close_rainfall_cache, open_rainfall_cache
+    from app.core.tile_cache import RiskTileCache, tile_version
+    from app.db.datasets import get_live_datasets, load_datasets, unload_datasets
+    from app.db.precip_grid import close_precip_grid, open_precip_grid
+    from app.ml.risk_table import TABLE_BIOMES
+    from app.ml.risk_tiles import popular_tiles, render_tile
+
+    db_path = args.out or settings.risk_tile_cache_path
+    if not db_path:
+        raise SystemExit("Tiles are stored in SQLite: set RISK_TILE_CACHE_PATH or pass --out")
+    biomes = args.biomes.split(",") if args.biomes else list(TABLE_BIOMES)
+    urban_flags = {"both": (False, True), "true": (True,), "false": (False,)}[args.urban]
+    grid = args.grid or settings.risk_tile_grid
+
+    # Same datasets and rainfall sources as the service, so the tiles land under its version
+    load_datasets()
+    open_rainfall_cache()
+    open_precip_grid()
+    cache = RiskTileCache(maxsize=1, db_path=db_path)
+    live = get_live_datasets()
+    df, index = live.occurrences
+    catalog = live.catalog
+    version = tile_version(live.version)
+
+    async def render_all() -> None:
+        open_http_client()
+        try:
+            for z in args.zooms:
+                start = time.perf_counter()
+                tiles = popular_tiles(df, z, args.max_tiles)
+                rendered = skipped = 0
+                for x, y in tiles:
+                    for biome in biomes:
+                        for is_urban in urban_flags:
+                            key = (version, z, x, y, grid, biome, is_urban)
+                            if args.force or cache.get(key) is None:
+                                body, cacheable = await render_tile(df, index, catalog, z, x, y, grid, biome, is_urban)
+                                if cacheable:
+                                    cache.put(key, body)
+                                    rendered += 1
+                                else:
+                                    skipped += 1  # fallback rainfall: left for the service to render
+                print(f"Zoom {z}: {len(tiles)} tiles, {rendered} renders, {skipped} skipped on rainfall errors "
+                      f"({time.perf_counter() - start:.2f}s)")
+        finally:
+            await close_http_client()
+
+    try:
+        asyncio.run(render_all())
+        print(f"Risk tiles in {db_path} (version {version}); dropped {cache.prune(version)} stale tiles")
+    finally:
+        cache.close()
+        close_precip_grid()
+        close_rainfall_cache()
+        unload_datasets()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("build-catalog", help="Convert the vectorized species CSV into its binary build")
+    p.add_argument("csv", nargs="?", default=DEFAULT_ML_DATA_PATH)
+    p.add_argument("--out", default=None, help="Cache directory (default: .build_cache beside the CSV)")
+    p.set_defaults(func=_build_catalog)
+
+    p = commands.add_parser("build-catalog-index", help="Train the IVF index for catalog-wide risk search")
+    p.add_argument("csv", nargs="?", default=DEFAULT_ML_DATA_PATH)
+    p.add_argument("--lists", type=int, default=None, help="Inverted lists (default CATALOG_INDEX_LISTS; 0: sqrt(n))")
+    p.add_argument("--out", default=None, help="Cache directory (default: .build_cache beside the CSV)")
+    p.set_defaults(func=_build_catalog_index)
+
+    p = commands.add_parser("ingest-gbif", help="Load a GBIF DwC-A / occurrence export into the local occurrence store")
+    p.add_argument("export", help="DwC-A .zip or occurrence .csv/.txt export")
+    p.add_argument("--out", default=None, help="Occurrence CSV to (re)write (default: the store's CSV)")
+    p.set_defaults(func=_ingest_gbif)
+
+    p = commands.add_parser("load-mongo", help="Copy an occurrence CSV into the MongoDB occurrence collection")
+    p.add_argument("csv", nargs="?", default=None, help="Occurrence CSV (default: the store's CSV)")
+    p.add_argument("--replace", action="store_true", help="Drop the collection first")
+    p.set_defaults(func=_load_mongo)
+
+    p = commands.add_parser("build-precip-grid", help="Convert an ESRI ASCII precipitation grid into its binary build")
+    p.add_argument("grid", help="Annual precipitation grid (.asc), e.g. WorldClim BIO12")
+    p.add_argument("--out", default=None, help="Cache directory (default: .build_cache beside the grid)")
+    p.set_defaults(func=_build_precip_grid)
+
+    p = commands.add_parser("prerender-risk-tiles", help="Render the busiest risk heatmap tiles into the tile cache")
+    p.add_argument("--zooms", type=_zooms, default=_zooms("4-9"), help="Zoom levels, e.g. 4-9 or 4,6,8")
+    p.add_argument("--biomes", default=None, help="Comma-separated biomes (default: every biome with its own profile)")
+    p.add_argument("--urban", choices=("both", "true", "false"), default="both")
+    p.add_argument("--max-tiles", type=int, default=100, help="Tiles per zoom level, those with the most occurrences")
+    p.add_argument("--grid", type=int, default=None, help="Cells per tile side (default RISK_TILE_GRID)")
+    p.add_argument("--out", default=None, help="SQLite tile store (default RISK_TILE_CACHE_PATH)")
+    p.add_argument("--force", action="store_true", help="Re-render tiles already stored for this version")
+    p.set_defaults(func=_prerender_risk_tiles)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+'''
+Small in-process caches shared by the upstream fetchers
+'''
+
+import asyncio
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+# How long a writer waits on another process's lock before the call fails
+SQLITE_BUSY_TIMEOUT_S = 2.0
+
+
+def connect_sqlite(db_path: str) -> sqlite3.Connection:
+    """
+    Open a disk cache tier shared by several worker processes. WAL lets
+    readers proceed during a write, and a busy writer waits up to
+    SQLITE_BUSY_TIMEOUT_S instead of failing at once. The connection may be
+    used from worker threads; callers serialize access to it.
+    """
+    db_dir = os.path.dirname(db_path)
+    if db_dir:
+        os.makedirs(db_dir, exist_ok=True)
+    db = sqlite3.connect(db_path, timeout=SQLITE_BUSY_TIMEOUT_S, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")  # WAL keeps this crash-safe; a cache may lose its last commits
+    return db
+
+
+class LRUCache:
+    """
+    Bounded LRU cache with an optional per-entry TTL and hit/miss counters.
+    Not thread-safe: meant to be used from the event loop thread.
+    """
+
+    def __init__(self, maxsize: int, ttl_s: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl_s = ttl_s
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self._lookup(key) is not None
+
+    def _lookup(self, key: Hashable) -> Optional[tuple]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] < time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._lookup(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        expires_at = time.monotonic() + self.ttl_s if self.ttl_s is not None else None
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key into one in-flight awaitable.
+    Later callers await the first caller's result instead of repeating the work.
+    The work runs as its own task: a cancelled caller (e.g. a disconnected
+    client) stops waiting, but the others still get the result.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, "asyncio.Task"] = {}
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: "asyncio.Task") -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark retrieved so a failure nobody is waiting for does not log a warning
+        if not task.cancelled():
+            task.exception()
@@ -17,6 +17,88 @@ class Settings(BaseSettings):
 
     mongo_uri: str = Field(default="mongodb://localhost:27017", alias="MONGO_URI")
     mongo_db: str = Field(default="invasive_tracker", alias="MONGO_DB")
+    # Occurrence store: "csv" (in-process table + grid index) | "mongo" (2dsphere-indexed collection)
+    occurrence_store: str = Field(default="csv", alias="OCCURRENCE_STORE")
+    mongo_occurrences_collection: str = Field(default="occurrences", alias="MONGO_OCCURRENCES_COLLECTION")
+    mongo_max_pool_size: int = Field(default=50, alias="MONGO_MAX_POOL_SIZE")
+    mongo_min_pool_size: int = Field(default=4, alias="MONGO_MIN_POOL_SIZE")  # kept warm between bursts
+    mongo_max_idle_time_ms: int = Field(default=300_000, alias="MONGO_MAX_IDLE_TIME_MS")
+    mongo_wait_queue_timeout_ms: int = Field(default=2_000, alias="MONGO_WAIT_QUEUE_TIMEOUT_MS")
+    mongo_server_selection_timeout_ms: int = Field(default=3_000, alias="MONGO_SERVER_SELECTION_TIMEOUT_MS")
+
+    gbif_api_url: str = Field(default="https://api.gbif.org/v1", alias="GBIF_API_URL")
+    open_meteo_archive_url: str = Field(default="https://archive-api.open-meteo.com/v1/archive", alias="OPEN_METEO_ARCHIVE_URL")
+    gbif_timeout_s: float = Field(default=10.0, alias="GBIF_TIMEOUT_S")
+    rainfall_timeout_s: float = Field(default=5.0, alias="RAINFALL_TIMEOUT_S")
+    http_max_connections: int = Field(default=100, alias="HTTP_MAX_CONNECTIONS")
+    http_max_keepalive_connections: int = Field(default=20, alias="HTTP_MAX_KEEPALIVE_CONNECTIONS")
+    http_keepalive_expiry_s: float = Field(default=30.0, alias="HTTP_KEEPALIVE_EXPIRY_S")
+
+    nearby_species_source: str = Field(default="gbif", alias="NEARBY_SPECIES_SOURCE")  # "gbif" | "local"
+    gbif_retrieval_mode: str = Field(default="occurrences", alias="GBIF_RETRIEVAL_MODE")  # "occurrences" | "facets"
+    gbif_facet_page_size: int = Field(default=100, alias="GBIF_FACET_PAGE_SIZE")
+    # As many species as the baseline's 300-occurrence page can hold, each needing a name lookup when cold
+    gbif_facet_max_species: int = Field(default=300, alias="GBIF_FACET_MAX_SPECIES")
+    gbif_facet_concurrency: int = Field(default=8, alias="GBIF_FACET_CONCURRENCY")
+    gbif_name_cache_size: int = Field(default=50_000, alias="GBIF_NAME_CACHE_SIZE")
+    gbif_name_cache_path: str = Field(default="app/db/gbif_names.sqlite3", alias="GBIF_NAME_CACHE_PATH")
+
+    rainfall_cache_enabled: bool = Field(default=True, alias="RAINFALL_CACHE_ENABLED")
+    rainfall_cache_grid_deg: float = Field(default=0.1, alias="RAINFALL_CACHE_GRID_DEG")
+    rainfall_cache_size: int = Field(default=4096, alias="RAINFALL_CACHE_SIZE")
+    rainfall_cache_path: str = Field(default="app/db/rainfall_cache.sqlite3", alias="RAINFALL_CACHE_PATH")
+
+    precip_grid_path: str = Field(default="", alias="PRECIP_GRID_PATH")  # ESRI ASCII annual precipitation grid
+    precip_grid_cache_dir: str = Field(default="", alias="PRECIP_GRID_CACHE_DIR")
+
+    gbif_tile_cache_enabled: bool = Field(default=True, alias="GBIF_TILE_CACHE_ENABLED")
+    gbif_tile_zoom: int = Field(default=9, alias="GBIF_TILE_ZOOM")
+    gbif_tile_cache_size: int = Field(default=2048, alias="GBIF_TILE_CACHE_SIZE")
+    gbif_tile_ttl_s: float = Field(default=24 * 3600.0, alias="GBIF_TILE_TTL_S")
+    gbif_tile_max_tiles_per_query: int = Field(default=64, alias="GBIF_TILE_MAX_TILES_PER_QUERY")
+    # Pages of GBIF_PAGE_LIMIT occurrences fetched per tile; denser tiles fall back to geoDistance queries
+    gbif_tile_max_pages: int = Field(default=10, alias="GBIF_TILE_MAX_PAGES")
+    # Those geoDistance queries are cached per cell of this size (shared TTL / size with the tiles)
+    gbif_circle_grid_deg: float = Field(default=0.01, alias="GBIF_CIRCLE_GRID_DEG")
+
+    csv_chunk_rows: int = Field(default=1_000_000, alias="CSV_CHUNK_ROWS")
+    spatial_index_cell_deg: float = Field(default=0.1, alias="SPATIAL_INDEX_CELL_DEG")
+
+    risk_cache_enabled: bool = Field(default=True, alias="RISK_CACHE_ENABLED")
+    risk_cache_grid_deg: float = Field(default=0.01, alias="RISK_CACHE_GRID_DEG")
+    risk_cache_size: int = Field(default=2048, alias="RISK_CACHE_SIZE")
+    risk_cache_ttl_s: float = Field(default=600.0, alias="RISK_CACHE_TTL_S")
+    # Catalog-wide score lookup table per (biome, urban, rainfall bucket), built on dataset load
+    risk_table_enabled: bool = Field(default=False, alias="RISK_TABLE_ENABLED")
+    risk_table_rainfall_step_mm: float = Field(default=50.0, alias="RISK_TABLE_RAINFALL_STEP_MM")
+
+    # Risk heatmap tiles (/risk/tiles): cells per tile side, LRU tier and SQLite tier ("" keeps them in memory only)
+    risk_tile_grid: int = Field(default=32, alias="RISK_TILE_GRID")
+    risk_tile_cache_enabled: bool = Field(default=True, alias="RISK_TILE_CACHE_ENABLED")
+    risk_tile_cache_size: int = Field(default=1024, alias="RISK_TILE_CACHE_SIZE")
+    risk_tile_cache_path: str = Field(default="app/db/risk_tiles.sqlite3", alias="RISK_TILE_CACHE_PATH")
+
+    risk_batch_max_sites: int = Field(default=500, alias="RISK_BATCH_MAX_SITES")
+
+    ml_catalog_cache_enabled: bool = Field(default=True, alias="ML_CATALOG_CACHE_ENABLED")
+    ml_catalog_cache_dir: str = Field(default="", alias="ML_CATALOG_CACHE_DIR")
+    # Boolean one-hot columns are stored as CSR when there are at least this many (0 never)
+    ml_catalog_sparse_min_onehot: int = Field(default=64, alias="ML_CATALOG_SPARSE_MIN_ONEHOT")
+    risk_scoring_space: str = Field(default="exact", alias="RISK_SCORING_SPACE")  # "exact" | "pca"
+    ml_pca_variance: float = Field(default=0.95, alias="ML_PCA_VARIANCE")  # variance share kept by the PCA build
+    # IVF index for catalog-wide search (/risk/catalog); without it searches are brute force
+    catalog_index_enabled: bool = Field(default=False, alias="CATALOG_INDEX_ENABLED")
+    catalog_index_lists: int = Field(default=0, alias="CATALOG_INDEX_LISTS")  # 0: sqrt(catalog size)
+    catalog_index_nprobe: int = Field(default=8, alias="CATALOG_INDEX_NPROBE")  # default recall / latency knob
+
+    shared_memory_enabled: bool = Field(default=False, alias="SHARED_MEMORY_ENABLED")
+    shared_memory_prefix: str = Field(default="invtracker", alias="SHARED_MEMORY_PREFIX")
+    shared_memory_lock_path: str = Field(default="/tmp/invasive-tracker-shm.lock", alias="SHARED_MEMORY_LOCK_PATH")
+
+    metrics_enabled: bool = Field(default=False, alias="METRICS_ENABLED")  # /metrics and Server-Timing
+
+    dataset_reload_interval_s: float = Field(default=0.0, alias="DATASET_RELOAD_INTERVAL_S")  # 0 disables the watcher
+    admin_token: str = Field(default="", alias="ADMIN_TOKEN")  # empty disables /admin endpoints
 
     app_description: str = Field(default="API for the Invasive Species Tracker", alias="APP_DESCRIPTION")
     version: str = Field(default="0.1.0", alias="VERSION")
@@ -0,0 +1,211 @@
+'''
+Geotile cache for GBIF occurrences.
+
+Occurrences are cached per XYZ tile at a fixed zoom. A radius query is
+answered from the tiles its bounding box touches, fetching only the
+missing ones, then filtered to the exact radius locally. A tile is paged
+until GBIF reports its last record; one that is still incomplete after
+GBIF_TILE_MAX_PAGES cannot answer a query, which then goes to GBIF directly.
+Those radius queries are cached too, keyed on the query snapped to a
+GBIF_CIRCLE_GRID_DEG cell, so dense areas are not sent upstream on every hit.
+'''
+
+import asyncio
+import math
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.cache import LRUCache, SingleFlight
+from app.core.config import settings
+from app.core.geo import haversine_km, tile_bounds, tiles_for_circle
+
+TileKey = Tuple[int, int, int]
+Bounds = Tuple[float, float, float, float]  # (min_lat, min_lng, max_lat, max_lng)
+# Returns (records, complete) for a box, or None if the upstream call failed
+TileFetcher = Callable[[Bounds], Awaitable[Optional[Tuple[List[dict], bool]]]]
+CircleKey = Tuple[float, float, float]  # (cell center lat, cell center lng, radius_km)
+# Returns the unique species of a radius query, or None if the upstream call failed
+CircleFetcher = Callable[[float, float, float], Awaitable[Optional[List[dict]]]]
+
+
+@dataclass(frozen=True)
+class TileOccurrences:
+    """Columnar occurrences of one tile."""
+    scientific_name: np.ndarray  # object
+    common_name: np.ndarray      # object
+    latitude: np.ndarray         # float64
+    longitude: np.ndarray        # float64
+    complete: bool = True        # False: GBIF holds more occurrences than were fetched
+
+    @classmethod
+    def from_records(cls, records: List[dict], complete: bool = True) -> "TileOccurrences":
+        return cls(
+            scientific_name=np.array([r["scientific_name"] for r in records], dtype=object),
+            common_name=np.array([r.get("common_name", "") for r in records], dtype=object),
+            latitude=np.array([r["latitude"] for r in records], dtype=np.float64),
+            longitude=np.array([r["longitude"] for r in records], dtype=np.float64),
+            complete=complete,
+        )
+
+
+class GBIFTileCache:
+    """
+    TTL + LRU bounded cache of TileOccurrences, plus the radius queries made
+    where the tiles cannot answer. Concurrent requests that need the same
+    missing tile or radius query share a single upstream fetch.
+    """
+
+    def __init__(
+        self, zoom: int, maxsize: int, ttl_s: float, max_tiles_per_query: int, circle_grid_deg: float = 0.01,
+    ):
+        self.zoom = zoom
+        self.max_tiles_per_query = max_tiles_per_query
+        self.circle_grid_deg = circle_grid_deg
+        self.tiles = LRUCache(maxsize, ttl_s=ttl_s)
+        self.circles = LRUCache(maxsize, ttl_s=ttl_s)
+        self._inflight = SingleFlight()
+
+    def tile_bounds(self, key: TileKey) -> Bounds:
+        """Tile bounds, stretched to the poles for the first/last tile row."""
+        z, x, y = key
+        min_lat, min_lng, max_lat, max_lng = tile_bounds(z, x, y)
+        if y == 0:
+            max_lat = 90.0
+        if y == (1 << z) - 1:
+            min_lat = -90.0
+        return min_lat, min_lng, max_lat, max_lng
+
+    def covering_tiles(self, lat: float, lng: float, radius_km: float) -> Optional[List[TileKey]]:
+        """Tiles touched by the query circle, or None if there are too many to serve from cache."""
+        tiles = []
+        for key in tiles_for_circle(lat, lng, radius_km, self.zoom):
+            tiles.append(key)
+            if len(tiles) > self.max_tiles_per_query:
+                return None
+        return tiles
+
+    async def _get_tile(self, key: TileKey, fetch_tile: TileFetcher) -> Optional[TileOccurrences]:
+        tile = self.tiles.get(key)
+        if tile is not None:
+            return tile
+
+        async def load() -> Optional[TileOccurrences]:
+            fetched = await fetch_tile(self.tile_bounds(key))
+            if fetched is None:
+                return None  # upstream failure: do not cache
+            # Incomplete tiles are cached too, so later queries skip straight to the fallback
+            tile = TileOccurrences.from_records(*fetched)
+            self.tiles.set(key, tile)
+            return tile
+
+        return await self._inflight.do(key, load)
+
+    async def query(
+        self,
+        lat: float,
+        lng: float,
+        radius_km: float,
+        tiles: List[TileKey],
+        fetch_tile: TileFetcher,
+    ) -> Optional[List[dict]]:
+        """
+        Unique species within radius_km of (lat, lng), nearest occurrence first.
+        Returns None if the tiles cannot answer the query: a tile fetch
+        failed or a tile holds only part of GBIF's occurrences.
+        """
+        loaded = await asyncio.gather(*(self._get_tile(key, fetch_tile) for key in tiles))
+        if any(t is None or not t.complete for t in loaded):
+            return None
+
+        names = np.concatenate([t.scientific_name for t in loaded])
+        common = np.concatenate([t.common_name for t in loaded])
+        lats = np.concatenate([t.latitude for t in loaded])
+        lngs = np.concatenate([t.longitude for t in loaded])
+
+        dists = haversine_km(lat, lng, lats, lngs)
+        inside = np.flatnonzero(dists <= radius_km)
+        inside = inside[np.argsort(dists[inside], kind="stable")]
+
+        results = []
+        seen_species = set()
+        for i in inside:
+            name = names[i]
+            if name in seen_species:
+                continue
+            seen_species.add(name)
+            results.append({
+                "scientific_name": name,
+                "latitude": float(lats[i]),
+                "longitude": float(lngs[i]),
+                "common_name": common[i],
+                "family": "",
+            })
+        return results
+
+    def circle_key(self, lat: float, lng: float, radius_km: float) -> CircleKey:
+        """Snap a radius query to the center of its grid cell."""
+        g = self.circle_grid_deg
+        return (
+            round((math.floor(lat / g) + 0.5) * g, 6),
+            round((math.floor(lng / g) + 0.5) * g, 6),
+            round(radius_km, 3),
+        )
+
+    async def query_circle(
+        self, lat: float, lng: float, radius_km: float, fetch_circle: CircleFetcher,
+    ) -> Optional[List[dict]]:
+        """
+        Radius query made upstream at the cell center of (lat, lng), for
+        queries the tiles cannot answer. Returns None if the upstream call
+        failed, which is not cached.
+        """
+        key = self.circle_key(lat, lng, radius_km)
+        results = self.circles.get(key)
+        if results is not None:
+            return list(results)
+
+        async def load() -> Optional[List[dict]]:
+            results = await fetch_circle(*key)
+            if results is not None:
+                self.circles.set(key, results)
+            return results
+
+        results = await self._inflight.do(("circle", *key), load)
+        return list(results) if results is not None else None
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "zoom": self.zoom,
+            **self.tiles.stats(),
+            "circles": len(self.circles),
+            "inflight": len(self._inflight),
+        }
+
+
+_gbif_tile_cache: Optional[GBIFTileCache] = None
+
+
+def open_gbif_tile_cache() -> Optional[GBIFTileCache]:
+    """Create the process-wide GBIF tile cache from settings. Call once in the app lifespan."""
+    global _gbif_tile_cache
+    if settings.gbif_tile_cache_enabled and _gbif_tile_cache is None:
+        _gbif_tile_cache = GBIFTileCache(
+            zoom=settings.gbif_tile_zoom,
+            maxsize=settings.gbif_tile_cache_size,
+            ttl_s=settings.gbif_tile_ttl_s,
+            max_tiles_per_query=settings.gbif_tile_max_tiles_per_query,
+            circle_grid_deg=settings.gbif_circle_grid_deg,
+        )
+    return _gbif_tile_cache
+
+
+def get_gbif_tile_cache() -> Optional[GBIFTileCache]:
+    """Returns the GBIF tile cache, or None when caching is disabled / not opened."""
+    return _gbif_tile_cache
+
+
+def close_gbif_tile_cache() -> None:
+    global _gbif_tile_cache
+    _gbif_tile_cache = None
@@ -0,0 +1,259 @@
+'''
+Species-level GBIF retrieval through occurrence facets.
+
+Instead of downloading raw occurrences and deduplicating them locally, the
+geoDistance search is asked for `facet=speciesKey` with `limit=0`: each
+facet page lists up to `facetLimit` distinct species keys with their
+occurrence counts. Further pages are requested in concurrent waves of
+GBIF_FACET_CONCURRENCY up to the species cap, and keys are resolved to
+names through /species/{key}. Backbone names do not change, so they are
+kept in an LRU backed by SQLite (GBIF_NAME_CACHE_PATH) that survives
+restarts and is shared by the workers: only keys never seen before cost a
+lookup, and the stored ones are read in one query per scan.
+'''
+
+import asyncio
+import logging
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from app.core.cache import LRUCache, SingleFlight, connect_sqlite
+from app.core.config import settings
+from app.core.http_client import get_http_client
+from app.core.metrics import UPSTREAM_ERRORS, count, stage
+
+logger = logging.getLogger(__name__)
+
+_species_names = LRUCache(settings.gbif_name_cache_size)
+_resolving = SingleFlight()
+_names_db: Optional[sqlite3.Connection] = None
+_names_db_lock = threading.Lock()
+
+# SQLite's default limit on bound parameters is 999
+_READ_BATCH = 500
+
+
+def _facet_params(lat: float, lng: float, radius_meters: int, offset: int, page_size: int) -> dict:
+    return {
+        "geoDistance": f"{lat},{lng},{radius_meters}m",
+        "hasCoordinate": "true",
+        "hasGeospatialIssue": "false",
+        "limit": 0,  # facet counts only, no occurrence records
+        "facet": "speciesKey",
+        "facetLimit": page_size,
+        "facetOffset": offset,
+    }
+
+
+def _parse_facet_counts(data: dict) -> List[tuple]:
+    """(speciesKey, occurrence count) pairs of a facet response, most frequent first."""
+    for facet in data.get("facets", []):
+        if facet.get("field") == "SPECIES_KEY":
+            return [(str(c["name"]), int(c.get("count", 0))) for c in facet.get("counts", [])]
+    return []
+
+
+async def _fetch_facet_page(lat: float, lng: float, radius_meters: int, offset: int, page_size: int) -> Optional[list]:
+    """One page of species facet counts, or None if the upstream call failed."""
+    try:
+        with stage("gbif"):
+            response = await get_http_client().get(
+                f"{settings.gbif_api_url}/occurrence/search",
+                params=_facet_params(lat, lng, radius_meters, offset, page_size),
+                timeout=settings.gbif_timeout_s,
+            )
+        if response.status_code != 200:
+            count(UPSTREAM_ERRORS, "gbif")
+            return None
+
+        return _parse_facet_counts(response.json())
+    except Exception:
+        count(UPSTREAM_ERRORS, "gbif")
+        return None
+
+
+async def _resolve_species(key: str) -> Optional[dict]:
+    """Name fields of a backbone species key (cached), or None if the lookup failed."""
+    cached = _species_names.get(key)
+    if cached is not None:
+        return cached
+
+    async def load() -> Optional[dict]:
+        try:
+            with stage("gbif_names"):
+                response = await get_http_client().get(
+                    f"{settings.gbif_api_url}/species/{key}",
+                    timeout=settings.gbif_timeout_s,
+                )
+            if response.status_code != 200:
+                count(UPSTREAM_ERRORS, "gbif")
+                return None
+            data = response.json()
+        except Exception:
+            count(UPSTREAM_ERRORS, "gbif")
+            return None
+
+        # GBIF sends null for fields it could not resolve
+        names = {
+            "scientific_name": data.get("species") or data.get("canonicalName") or data.get("scientificName") or "",
+            "common_name": data.get("vernacularName") or "",
+            "family": data.get("family") or "",
+        }
+        _species_names.set(key, names)
+        return names
+
+    return await _resolving.do(key, load)
+
+
+def _read_names(keys: List[str]) -> Dict[str, dict]:
+    """Stored names of `keys`; whatever the SQLite tier cannot answer is left out."""
+    found = {}
+    try:
+        with _names_db_lock:
+            if _names_db is None:
+                return found
+            for start in range(0, len(keys), _READ_BATCH):
+                batch = keys[start:start + _READ_BATCH]
+                rows = _names_db.execute(
+                    "SELECT species_key, scientific_name, common_name, family FROM gbif_species_names"
+                    f" WHERE species_key IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                for key, scientific_name, common_name, family in rows:
+                    found[key] = {"scientific_name": scientific_name, "common_name": common_name, "family": family}
+    except sqlite3.Error:
+        pass  # locked or failing: the names are looked up upstream instead
+    return found
+
+
+def _write_names(names: Dict[str, dict]) -> None:
+    rows = [
+        (str(key), n.get("scientific_name") or "", n.get("common_name") or "", n.get("family") or "")
+        for key, n in names.items()
+        if key is not None
+    ]
+    try:
+        with _names_db_lock:
+            if _names_db is None:
+                return
+            _names_db.executemany(
+                "INSERT OR REPLACE INTO gbif_species_names (species_key, scientific_name, common_name, family)"
+                " VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            _names_db.commit()
+    except sqlite3.Error:
+        # Still served from memory; the names are looked up again after a restart
+        logger.warning("Could not store %d GBIF species names", len(rows), exc_info=True)
+
+
+async def _resolve_all(keys: Iterable[str]) -> List[Optional[dict]]:
+    """
+    Names of `keys` in order (None where a lookup failed): from memory, then
+    one SQLite read for the rest, then /species/{key} for keys never seen.
+    New names are written back in one transaction.
+    """
+    keys = list(keys)
+    missing = [key for key in keys if key not in _species_names]
+    stored = await asyncio.to_thread(_read_names, missing) if missing and _names_db is not None else {}
+    for key, names in stored.items():
+        _species_names.set(key, names)
+
+    # Bounds name lookups in flight so they do not starve the shared pool
+    semaphore = asyncio.Semaphore(settings.gbif_facet_concurrency)
+
+    async def resolve(key: str) -> Optional[dict]:
+        if key in stored:
+            return stored[key]
+        async with semaphore:
+            return await _resolve_species(key)
+
+    resolved = await asyncio.gather(*[resolve(key) for key in keys])
+    looked_up = set(missing).difference(stored)
+    fresh = {key: names for key, names in zip(keys, resolved) if key in looked_up and names is not None}
+    if fresh and _names_db is not None:
+        await asyncio.to_thread(_write_names, fresh)
+    return resolved
+
+
+async def fetch_species_facets(lat: float, lng: float, radius_meters: int) -> Optional[list]:
+    """
+    Distinct species in the circle as records shaped like
+    _parse_gbif_occurrences (coordinates are None: facets carry none) plus
+    'occurrence_count', most observed first. None if the first page failed.
+    """
+    page_size = settings.gbif_facet_page_size
+    cap = settings.gbif_facet_max_species
+    concurrency = settings.gbif_facet_concurrency
+
+    first = await _fetch_facet_page(lat, lng, radius_meters, 0, min(page_size, cap))
+    if first is None:
+        return None
+
+    counts = list(first)
+    more = len(first) == min(page_size, cap)
+    offset = len(first)
+    # A full page means more species: fetch further pages in concurrent waves,
+    # so at most one wave of requests is spent past the last species
+    while more and offset < cap:
+        wave = range(offset, min(cap, offset + page_size * concurrency), page_size)
+        pages = await asyncio.gather(*[
+            _fetch_facet_page(lat, lng, radius_meters, start, min(page_size, cap - start)) for start in wave
+        ])
+        for start, page in zip(wave, pages):
+            # A failed page ends the list there: partial results beat none
+            if not page:
+                more = False
+                break
+            counts.extend(page)
+            if len(page) < min(page_size, cap - start):
+                more = False
+                break
+        offset = wave[-1] + page_size
+
+    resolved = await _resolve_all(key for key, _ in counts)
+
+    results = []
+    seen_species = set()
+    for (_, n), names in zip(counts, resolved):
+        if names is None or not names["scientific_name"] or names["scientific_name"] in seen_species:
+            continue
+        seen_species.add(names["scientific_name"])
+        results.append({
+            "scientific_name": names["scientific_name"],
+            "latitude": None,
+            "longitude": None,
+            "common_name": names["common_name"],
+            "family": names["family"],
+            "occurrence_count": n,
+        })
+    return results
+
+
+def open_species_names() -> None:
+    """Open the SQLite tier of the species name cache from settings. Call once in the app lifespan."""
+    global _names_db
+    if settings.gbif_name_cache_path and _names_db is None:
+        db = connect_sqlite(settings.gbif_name_cache_path)
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS gbif_species_names ("
+            " species_key TEXT PRIMARY KEY, scientific_name TEXT NOT NULL,"
+            " common_name TEXT NOT NULL, family TEXT NOT NULL)"
+        )
+        db.commit()
+        with _names_db_lock:
+            _names_db = db
+
+
+def close_species_names() -> None:
+    global _names_db
+    with _names_db_lock:
+        if _names_db is not None:
+            _names_db.close()
+            _names_db = None
+
+
+def clear_species_names() -> None:
+    """Forget the names held in memory (the SQLite tier is kept)."""
+    _species_names.clear()
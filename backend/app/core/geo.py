@@ -0,0 +1,92 @@
+'''
+Geographic helpers: great-circle distance and slippy-map tile math
+'''
+
+import math
+from typing import Iterator, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+# Great-circle km per degree on the sphere haversine_km measures on
+KM_PER_DEG = math.pi * EARTH_RADIUS_KM / 180.0
+MAX_TILE_LAT = 85.05112878
+
+
+def haversine_km(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """
+    Vectorized haversine distance from a single point (lat1,lng1)
+    to arrays lat2,lng2. Returns km.
+    """
+    lat1 = np.radians(lat1)
+    lng1 = np.radians(lng1)
+    lat2 = np.radians(lat2)
+    lng2 = np.radians(lng2)
+
+    dlat = lat2 - lat1
+    dlng = lng2 - lng1
+
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return EARTH_RADIUS_KM * c
+
+
+def radius_to_deltas(lat: float, radius_km: float) -> Tuple[float, float]:
+    """
+    Half-widths (delta_lat, delta_lng) in degrees of a box enclosing the
+    circle. delta_lng is 180 when the circle reaches a pole or wraps the globe.
+    """
+    delta_lat = radius_km / KM_PER_DEG
+    if abs(lat) + delta_lat >= 90.0:
+        return delta_lat, 180.0
+    # Widest point of the circle is on its most poleward latitude
+    cos_lat = math.cos(math.radians(abs(lat) + delta_lat))
+    delta_lng = radius_km / (KM_PER_DEG * max(cos_lat, 1e-6))
+    return delta_lat, min(delta_lng, 180.0)
+
+
+def lng_to_tile_x(lng: float, zoom: int) -> int:
+    n = 1 << zoom
+    return min(int((lng + 180.0) / 360.0 * n), n - 1)
+
+
+def lat_to_tile_y(lat: float, zoom: int) -> int:
+    n = 1 << zoom
+    lat = max(min(lat, MAX_TILE_LAT), -MAX_TILE_LAT)
+    rad = math.radians(lat)
+    y = int((1.0 - math.asinh(math.tan(rad)) / math.pi) / 2.0 * n)
+    return max(min(y, n - 1), 0)
+
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """(min_lat, min_lng, max_lat, max_lng) of an XYZ tile."""
+    n = 1 << z
+    min_lng = x / n * 360.0 - 180.0
+    max_lng = (x + 1) / n * 360.0 - 180.0
+    max_lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    min_lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return min_lat, min_lng, max_lat, max_lng
+
+
+def tiles_for_circle(lat: float, lng: float, radius_km: float, zoom: int) -> Iterator[Tuple[int, int, int]]:
+    """
+    Yield the XYZ tiles that intersect the bounding box of a circle.
+    Longitudes wrap across the antimeridian.
+    """
+    n = 1 << zoom
+    delta_lat, delta_lng = radius_to_deltas(lat, radius_km)
+
+    y_min = lat_to_tile_y(lat + delta_lat, zoom)
+    y_max = lat_to_tile_y(lat - delta_lat, zoom)
+
+    if delta_lng >= 180.0:
+        xs = range(n)
+    else:
+        x_start = lng_to_tile_x(((lng - delta_lng + 180.0) % 360.0) - 180.0, zoom)
+        x_end = lng_to_tile_x(((lng + delta_lng + 180.0) % 360.0) - 180.0, zoom)
+        count = (x_end - x_start) % n + 1
+        xs = [(x_start + i) % n for i in range(count)]
+
+    for y in range(y_min, y_max + 1):
+        for x in xs:
+            yield zoom, x, y
@@ -0,0 +1,151 @@
+'''
+Grid-quantized rainfall cache: in-memory LRU tier backed by SQLite
+'''
+
+import asyncio
+import math
+import sqlite3
+import threading
+from typing import Dict, Optional, Tuple
+
+from app.core.cache import LRUCache, connect_sqlite
+from app.core.config import settings
+
+CellKey = Tuple[float, float]
+
+
+class RainfallCache:
+    """
+    Annual rainfall keyed on the center of a lat/lng grid cell.
+    Lookups check the LRU tier first, then SQLite (promoting hits back
+    into memory). The SQLite tier survives restarts and is shared by the
+    workers; when it is locked or failing, the cache runs on memory alone.
+    From the event loop use aget/aput, which do disk I/O in a thread.
+    """
+
+    def __init__(self, grid_deg: float, maxsize: int, db_path: Optional[str] = None):
+        self.grid_deg = grid_deg
+        self.memory = LRUCache(maxsize)
+        self.disk_hits = 0
+        self.disk_errors = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._db = connect_sqlite(db_path)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS rainfall ("
+                " grid_deg REAL NOT NULL, lat REAL NOT NULL, lng REAL NOT NULL, rainfall_mm REAL NOT NULL,"
+                " PRIMARY KEY (grid_deg, lat, lng))"
+            )
+            self._db.commit()
+
+    def cell(self, lat: float, lng: float) -> CellKey:
+        """Snap a point to the center of its grid cell."""
+        g = self.grid_deg
+        return (
+            round((math.floor(lat / g) + 0.5) * g, 6),
+            round((math.floor(lng / g) + 0.5) * g, 6),
+        )
+
+    def _read(self, key: CellKey) -> Optional[float]:
+        try:
+            with self._lock:
+                if self._db is None:
+                    return None
+                row = self._db.execute(
+                    "SELECT rainfall_mm FROM rainfall WHERE grid_deg = ? AND lat = ? AND lng = ?",
+                    (self.grid_deg, key[0], key[1]),
+                ).fetchone()
+        except sqlite3.Error:
+            self.disk_errors += 1
+            return None
+        return row[0] if row is not None else None
+
+    def _write(self, key: CellKey, rainfall_mm: float) -> None:
+        try:
+            with self._lock:
+                if self._db is None:
+                    return
+                self._db.execute(
+                    "INSERT OR REPLACE INTO rainfall (grid_deg, lat, lng, rainfall_mm) VALUES (?, ?, ?, ?)",
+                    (self.grid_deg, key[0], key[1], rainfall_mm),
+                )
+                self._db.commit()
+        except sqlite3.Error:
+            self.disk_errors += 1
+
+    def _from_disk(self, key: CellKey, value: Optional[float]) -> Optional[float]:
+        if value is None:
+            self.misses += 1
+            return None
+        self.disk_hits += 1
+        self.memory.set(key, value)
+        return value
+
+    def get(self, key: CellKey) -> Optional[float]:
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+        return self._from_disk(key, self._read(key))
+
+    async def aget(self, key: CellKey) -> Optional[float]:
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+        if self._db is None:
+            self.misses += 1
+            return None
+        return self._from_disk(key, await asyncio.to_thread(self._read, key))
+
+    def put(self, key: CellKey, rainfall_mm: float) -> None:
+        self.memory.set(key, rainfall_mm)
+        self._write(key, rainfall_mm)
+
+    async def aput(self, key: CellKey, rainfall_mm: float) -> None:
+        self.memory.set(key, rainfall_mm)
+        if self._db is not None:
+            await asyncio.to_thread(self._write, key, rainfall_mm)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "grid_deg": self.grid_deg,
+            "memory_size": len(self.memory),
+            "memory_hits": self.memory.hits,
+            "disk_hits": self.disk_hits,
+            "disk_errors": self.disk_errors,
+            "misses": self.misses,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+_rainfall_cache: Optional[RainfallCache] = None
+
+
+def open_rainfall_cache() -> Optional[RainfallCache]:
+    """Create the process-wide rainfall cache from settings. Call once in the app lifespan."""
+    global _rainfall_cache
+    if settings.rainfall_cache_enabled and _rainfall_cache is None:
+        _rainfall_cache = RainfallCache(
+            grid_deg=settings.rainfall_cache_grid_deg,
+            maxsize=settings.rainfall_cache_size,
+            db_path=settings.rainfall_cache_path or None,
+        )
+    return _rainfall_cache
+
+
+def get_rainfall_cache() -> Optional[RainfallCache]:
+    """Returns the rainfall cache, or None when caching is disabled / not opened."""
+    return _rainfall_cache
+
+
+def close_rainfall_cache() -> None:
+    global _rainfall_cache
+    if _rainfall_cache is not None:
+        _rainfall_cache.close()
+        _rainfall_cache = None
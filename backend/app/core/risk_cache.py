@@ -0,0 +1,96 @@
+'''
+Response cache for /risk/scan with request coalescing
+'''
+
+import math
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from app.core.cache import LRUCache, SingleFlight
+from app.core.config import settings
+
+# Cache status reported in the scan meta and the X-Cache header
+HIT, MISS, COALESCED, BYPASS = "hit", "miss", "coalesced", "bypass"
+
+
+class RiskScanCache:
+    """
+    TTL + LRU bounded cache of finished scan responses, keyed on the
+    quantized request. Concurrent identical misses share one computation.
+    """
+
+    def __init__(self, grid_deg: float, maxsize: int, ttl_s: float):
+        self.grid_deg = grid_deg
+        self.responses = LRUCache(maxsize, ttl_s=ttl_s)
+        self.coalesced = 0
+        self._inflight = SingleFlight()
+
+    # Radii are keyed to this step, and a radius is never keyed below one step
+    RADIUS_STEP_KM = 0.1
+
+    def radius(self, radius_km: float) -> float:
+        """Snap a search radius to the key step (at least one step, so small radii never become 0)."""
+        step = self.RADIUS_STEP_KM
+        return round(max(round(radius_km / step), 1) * step, 6)
+
+    def cell(self, lat: float, lng: float) -> Tuple[float, float]:
+        """Snap a point to the center of its grid cell."""
+        g = self.grid_deg
+        return (
+            round((math.floor(lat / g) + 0.5) * g, 6),
+            round((math.floor(lng / g) + 0.5) * g, 6),
+        )
+
+    async def get_or_compute(
+        self,
+        key: Hashable,
+        compute: Callable[[], Awaitable[Tuple[Any, bool]]],
+    ) -> Tuple[Any, str]:
+        """
+        Cached value for `key` and its cache status. On a miss `compute()`
+        runs once for all concurrent callers and returns (value, cacheable).
+        """
+        value = self.responses.get(key)
+        if value is not None:
+            return value, HIT
+
+        if key in self._inflight:
+            self.coalesced += 1
+            value, _ = await self._inflight.do(key, compute)
+            return value, COALESCED
+
+        async def load() -> Tuple[Any, bool]:
+            value, cacheable = await compute()
+            if cacheable:
+                self.responses.set(key, value)
+            return value, cacheable
+
+        value, _ = await self._inflight.do(key, load)
+        return value, MISS
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.responses.stats(), "coalesced": self.coalesced, "inflight": len(self._inflight)}
+
+
+_risk_cache: Optional[RiskScanCache] = None
+
+
+def open_risk_cache() -> Optional[RiskScanCache]:
+    """Create the process-wide scan response cache from settings. Call once in the app lifespan."""
+    global _risk_cache
+    if settings.risk_cache_enabled and _risk_cache is None:
+        _risk_cache = RiskScanCache(
+            grid_deg=settings.risk_cache_grid_deg,
+            maxsize=settings.risk_cache_size,
+            ttl_s=settings.risk_cache_ttl_s,
+        )
+    return _risk_cache
+
+
+def get_risk_cache() -> Optional[RiskScanCache]:
+    """Returns the scan response cache, or None when caching is disabled / not opened."""
+    return _risk_cache
+
+
+def close_risk_cache() -> None:
+    global _risk_cache
+    _risk_cache = None
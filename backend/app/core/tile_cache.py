@@ -0,0 +1,194 @@
+'''
+Risk tile cache: in-memory LRU tier backed by SQLite, with request coalescing
+'''
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from app.core.cache import LRUCache, SingleFlight, connect_sqlite
+from app.core.config import settings
+from app.core.risk_cache import COALESCED, HIT, MISS
+from app.db.datasets import DatasetVersion
+from app.db.precip_grid import get_precip_grid
+
+# (version, z, x, y, grid, biome, is_urban)
+TileKey = Tuple[str, int, int, int, int, str, bool]
+
+
+def tile_version(version: Optional[DatasetVersion]) -> str:
+    """
+    Identity of everything a tile is rendered from: the datasets (and
+    scoring settings, see datasets._dataset_key) plus the precipitation grid.
+    """
+    digest = hashlib.sha1(f"{version.version if version is not None else None}".encode())
+    if get_precip_grid() is not None and settings.precip_grid_path:
+        try:
+            st = os.stat(settings.precip_grid_path)
+            digest.update(f"{os.path.abspath(settings.precip_grid_path)}:{st.st_size}:{st.st_mtime_ns}".encode())
+        except OSError:
+            digest.update(settings.precip_grid_path.encode())
+    return digest.hexdigest()[:16]
+
+
+class RiskTileCache:
+    """
+    Rendered tile bodies keyed on (version, z, x, y, grid, biome, urban).
+    Lookups check the LRU tier first, then SQLite (promoting hits back into
+    memory); the SQLite tier survives restarts and is shared with the
+    offline prerender command and the other workers. When it is locked or
+    failing, tiles are served from memory and rendering alone. Concurrent
+    misses for a tile render it once; get_or_compute does disk I/O in a
+    worker thread.
+    """
+
+    def __init__(self, maxsize: int, db_path: Optional[str] = None):
+        self.memory = LRUCache(maxsize)
+        self.disk_hits = 0
+        self.disk_errors = 0
+        self.coalesced = 0
+        self._inflight = SingleFlight()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._db = connect_sqlite(db_path)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS risk_tiles ("
+                " version TEXT NOT NULL, z INTEGER NOT NULL, x INTEGER NOT NULL, y INTEGER NOT NULL,"
+                " grid INTEGER NOT NULL, biome TEXT NOT NULL, is_urban INTEGER NOT NULL, body BLOB NOT NULL,"
+                " PRIMARY KEY (version, z, x, y, grid, biome, is_urban))"
+            )
+            self._db.commit()
+
+    def _read(self, key: TileKey) -> Optional[bytes]:
+        try:
+            with self._lock:
+                if self._db is None:
+                    return None
+                row = self._db.execute(
+                    "SELECT body FROM risk_tiles"
+                    " WHERE version = ? AND z = ? AND x = ? AND y = ? AND grid = ? AND biome = ? AND is_urban = ?",
+                    (*key[:6], int(key[6])),
+                ).fetchone()
+        except sqlite3.Error:
+            self.disk_errors += 1
+            return None
+        return row[0] if row is not None else None
+
+    def _write(self, key: TileKey, body: bytes) -> None:
+        try:
+            with self._lock:
+                if self._db is None:
+                    return
+                self._db.execute(
+                    "INSERT OR REPLACE INTO risk_tiles (version, z, x, y, grid, biome, is_urban, body)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (*key[:6], int(key[6]), body),
+                )
+                self._db.commit()
+        except sqlite3.Error:
+            self.disk_errors += 1
+
+    def _from_disk(self, key: TileKey, body: Optional[bytes]) -> Optional[bytes]:
+        if body is not None:
+            self.disk_hits += 1
+            self.memory.set(key, body)
+        return body
+
+    def get(self, key: TileKey) -> Optional[bytes]:
+        body = self.memory.get(key)
+        if body is not None:
+            return body
+        return self._from_disk(key, self._read(key))
+
+    async def aget(self, key: TileKey) -> Optional[bytes]:
+        body = self.memory.get(key)
+        if body is not None or self._db is None:
+            return body
+        return self._from_disk(key, await asyncio.to_thread(self._read, key))
+
+    def put(self, key: TileKey, body: bytes) -> None:
+        self.memory.set(key, body)
+        self._write(key, body)
+
+    async def aput(self, key: TileKey, body: bytes) -> None:
+        self.memory.set(key, body)
+        if self._db is not None:
+            await asyncio.to_thread(self._write, key, body)
+
+    async def get_or_compute(
+        self, key: TileKey, compute: Callable[[], Awaitable[Tuple[bytes, bool]]],
+    ) -> Tuple[bytes, str]:
+        """
+        Cached body for `key` and its cache status. On a miss `compute()`
+        runs once for all concurrent callers and returns (body, cacheable).
+        """
+        body = await self.aget(key)
+        if body is not None:
+            return body, HIT
+
+        if key in self._inflight:
+            self.coalesced += 1
+            body, _ = await self._inflight.do(key, compute)
+            return body, COALESCED
+
+        async def load() -> Tuple[bytes, bool]:
+            body, cacheable = await compute()
+            if cacheable:
+                await self.aput(key, body)
+            return body, cacheable
+
+        body, _ = await self._inflight.do(key, load)
+        return body, MISS
+
+    def prune(self, version: str) -> int:
+        """Drop stored tiles of every other version; returns how many."""
+        with self._lock:
+            if self._db is None:
+                return 0
+            deleted = self._db.execute("DELETE FROM risk_tiles WHERE version != ?", (version,)).rowcount
+            self._db.commit()
+        return deleted
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            **self.memory.stats(),
+            "disk_hits": self.disk_hits,
+            "disk_errors": self.disk_errors,
+            "coalesced": self.coalesced,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+_tile_cache: Optional[RiskTileCache] = None
+
+
+def open_tile_cache() -> Optional[RiskTileCache]:
+    """Create the process-wide risk tile cache from settings. Call once in the app lifespan."""
+    global _tile_cache
+    if settings.risk_tile_cache_enabled and _tile_cache is None:
+        _tile_cache = RiskTileCache(
+            maxsize=settings.risk_tile_cache_size,
+            db_path=settings.risk_tile_cache_path or None,
+        )
+    return _tile_cache
+
+
+def get_tile_cache() -> Optional[RiskTileCache]:
+    """Returns the risk tile cache, or None when caching is disabled / not opened."""
+    return _tile_cache
+
+
+def close_tile_cache() -> None:
+    global _tile_cache
+    if _tile_cache is not None:
+        _tile_cache.close()
+        _tile_cache = None
@@ -1,26 +1,112 @@
 import requests
 import numpy as np
+from typing import Optional
+
+from app.core.config import settings
+from app.core.http_client import get_http_client
+from app.core.rainfall_cache import get_rainfall_cache
+from app.core.gbif_cache import get_gbif_tile_cache
+from app.core.gbif_facets import fetch_species_facets
+from app.db.precip_grid import get_precip_grid
+from app.core.metrics import UPSTREAM_ERRORS, UPSTREAM_FALLBACKS, count, stage
+
+RAINFALL_FALLBACK_MM = 500.0
+
+
+def _rainfall_params(lat: float, lon: float) -> dict:
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "start_date": "2023-01-01",
+        "end_date": "2023-12-31",
+        "daily": "precipitation_sum",
+        "timezone": "auto"
+    }
+
+
+def _parse_rainfall(data: dict) -> float:
+    total_rain = sum(data.get('daily', {}).get('precipitation_sum', []))
+    return total_rain if total_rain > 0 else RAINFALL_FALLBACK_MM
+
 
 def fetch_rainfall(lat: float, lon: float) -> float:
     try:
-        url = "https://archive-api.open-meteo.com/v1/archive"
-        params = {
-            "latitude": lat,
-            "longitude": lon,
-            "start_date": "2023-01-01",
-            "end_date": "2023-12-31",
-            "daily": "precipitation_sum",
-            "timezone": "auto"
-        }
-        response = requests.get(url, params=params, timeout=5)
+        response = requests.get(
+            settings.open_meteo_archive_url,
+            params=_rainfall_params(lat, lon),
+            timeout=settings.rainfall_timeout_s,
+        )
+        if response.status_code != 200:
+            return RAINFALL_FALLBACK_MM
+
+        return _parse_rainfall(response.json())
+    except Exception:
+        return RAINFALL_FALLBACK_MM
+
+
+async def _fetch_rainfall_upstream(lat: float, lon: float) -> Optional[float]:
+    """Annual rainfall from Open-Meteo, or None if the upstream call failed."""
+    try:
+        with stage("open_meteo"):
+            response = await get_http_client().get(
+                settings.open_meteo_archive_url,
+                params=_rainfall_params(lat, lon),
+                timeout=settings.rainfall_timeout_s,
+            )
         if response.status_code != 200:
-            return 500.0
-            
-        data = response.json()
-        total_rain = sum(data.get('daily', {}).get('precipitation_sum', []))
-        return total_rain if total_rain > 0 else 500.0
+            count(UPSTREAM_ERRORS, "open_meteo")
+            return None
+
+        return _parse_rainfall(response.json())
     except Exception:
-        return 500.0
+        count(UPSTREAM_ERRORS, "open_meteo")
+        return None
+
+
+def rainfall_key(lat: float, lon: float) -> tuple:
+    """Key under which two locations share a rainfall lookup (the cache cell when caching)."""
+    cache = get_rainfall_cache()
+    return cache.cell(lat, lon) if cache is not None else (lat, lon)
+
+
+async def lookup_rainfall_async(lat: float, lon: float) -> Optional[float]:
+    """
+    Non-blocking fetch_rainfall on the shared pooled client, or None if the
+    upstream call failed.
+    With a precipitation grid loaded, points it covers are answered from it
+    and Open-Meteo is only asked for the rest. When the rainfall cache is
+    open, results are keyed on the grid cell and fetched for the cell
+    center; upstream failures are never cached.
+    """
+    grid = get_precip_grid()
+    if grid is not None:
+        with stage("precip_grid"):
+            rainfall = grid.value(lat, lon)
+        if rainfall is not None:
+            return rainfall
+
+    cache = get_rainfall_cache()
+    if cache is None:
+        rainfall = await _fetch_rainfall_upstream(lat, lon)
+    else:
+        key = cache.cell(lat, lon)
+        rainfall = await cache.aget(key)
+        if rainfall is not None:
+            return rainfall
+
+        rainfall = await _fetch_rainfall_upstream(*key)
+        if rainfall is not None:
+            await cache.aput(key, rainfall)
+    return rainfall
+
+
+async def fetch_rainfall_async(lat: float, lon: float) -> float:
+    """lookup_rainfall_async, with RAINFALL_FALLBACK_MM when the upstream call failed."""
+    rainfall = await lookup_rainfall_async(lat, lon)
+    if rainfall is None:
+        count(UPSTREAM_FALLBACKS, "open_meteo")
+        return RAINFALL_FALLBACK_MM
+    return rainfall
 
 def estimate_soil_ph(biome: str) -> float:
     biome_map = {
@@ -29,42 +115,167 @@ def estimate_soil_ph(biome: str) -> float:
         'Forest': 5.5,
         'Rainforest': 4.5,
         'Wetland': 6.0,
-        'Chaparral': 7.0 
+        'Chaparral': 7.0
     }
     return biome_map.get(biome, 6.5)
 
+
+GBIF_PAGE_LIMIT = 300
+
+
+def _gbif_params(lat: float, lng: float, radius_meters: int) -> dict:
+    return {
+        "geoDistance": f"{lat},{lng},{radius_meters}m",  # Format: lat,lng,distance
+        "limit": GBIF_PAGE_LIMIT,
+        "hasCoordinate": "true",
+        "hasGeospatialIssue": "false"
+    }
+
+
+def _gbif_bbox_params(bounds: tuple, offset: int = 0) -> dict:
+    min_lat, min_lng, max_lat, max_lng = bounds
+    return {
+        "decimalLatitude": f"{min_lat},{max_lat}",  # Range format: min,max
+        "decimalLongitude": f"{min_lng},{max_lng}",
+        "limit": GBIF_PAGE_LIMIT,
+        "offset": offset,
+        "hasCoordinate": "true",
+        "hasGeospatialIssue": "false"
+    }
+
+
+def _parse_gbif_records(data: dict) -> list:
+    """Every occurrence with a name and coordinates, without deduplication."""
+    records = []
+    for record in data.get("results", []):
+        scientific_name = record.get("species") or record.get("scientificName", "")
+        lat = record.get("decimalLatitude")
+        lng = record.get("decimalLongitude")
+        if not scientific_name or lat is None or lng is None:
+            continue
+        records.append({
+            "scientific_name": scientific_name,
+            "latitude": lat,
+            "longitude": lng,
+            "common_name": record.get("vernacularName", ""),
+        })
+    return records
+
+
+def _parse_gbif_occurrences(data: dict) -> list:
+    results = []
+    seen_species = set()  # Deduplicate by scientific name
+
+    for record in data.get("results", []):
+        scientific_name = record.get("species") or record.get("scientificName", "")
+        if not scientific_name or scientific_name in seen_species:
+            continue
+
+        seen_species.add(scientific_name)
+        results.append({
+            "scientific_name": scientific_name,
+            "latitude": record.get("decimalLatitude"),
+            "longitude": record.get("decimalLongitude"),
+            "common_name": record.get("vernacularName", ""),
+            "family": "",  # GBIF doesn't always provide this
+        })
+
+    return results
+
+
 def fetch_species_from_gbif(lat: float, lng: float, radius_meters: int = 50000) -> list:
     try:
-        url = "https://api.gbif.org/v1/occurrence/search"
-        params = {
-            "geoDistance": f"{lat},{lng},{radius_meters}m",  # Format: lat,lng,distance
-            "limit": 300,
-            "hasCoordinate": "true",
-            "hasGeospatialIssue": "false"
-        }
-
-        response = requests.get(url, params=params, timeout=10)
+        response = requests.get(
+            f"{settings.gbif_api_url}/occurrence/search",
+            params=_gbif_params(lat, lng, radius_meters),
+            timeout=settings.gbif_timeout_s,
+        )
         if response.status_code != 200:
             return []
 
-        data = response.json()
-        results = []
-        seen_species = set()  # Deduplicate by scientific name
-
-        for record in data.get("results", []):
-            scientific_name = record.get("species") or record.get("scientificName", "")
-            if not scientific_name or scientific_name in seen_species:
-                continue
-                
-            seen_species.add(scientific_name)
-            results.append({
-                "scientific_name": scientific_name,
-                "latitude": record.get("decimalLatitude"),
-                "longitude": record.get("decimalLongitude"),
-                "common_name": record.get("vernacularName", ""),
-                "family": "",  # GBIF doesn't always provide this
-            })
-        
-        return results
+        return _parse_gbif_occurrences(response.json())
     except Exception:
-        return []
\ No newline at end of file
+        return []
+
+
+async def _fetch_gbif_tile(bounds: tuple) -> Optional[tuple]:
+    """
+    Raw occurrences inside a lat/lng box, paged up to GBIF_TILE_MAX_PAGES, and
+    whether they are all of GBIF's; None if an upstream call failed.
+    """
+    records = []
+    try:
+        for page in range(settings.gbif_tile_max_pages):
+            with stage("gbif"):
+                response = await get_http_client().get(
+                    f"{settings.gbif_api_url}/occurrence/search",
+                    params=_gbif_bbox_params(bounds, offset=page * GBIF_PAGE_LIMIT),
+                    timeout=settings.gbif_timeout_s,
+                )
+            if response.status_code != 200:
+                count(UPSTREAM_ERRORS, "gbif")
+                return None
+
+            data = response.json()
+            records.extend(_parse_gbif_records(data))
+            if data.get("endOfRecords", len(data.get("results", [])) < GBIF_PAGE_LIMIT):
+                return records, True
+        return records, False
+    except Exception:
+        count(UPSTREAM_ERRORS, "gbif")
+        return None
+
+
+async def _fetch_gbif_circle(lat: float, lng: float, radius_km: float) -> Optional[list]:
+    """Unique species of one GBIF radius query; None if the upstream call failed."""
+    try:
+        with stage("gbif"):
+            response = await get_http_client().get(
+                f"{settings.gbif_api_url}/occurrence/search",
+                params=_gbif_params(lat, lng, int(round(radius_km * 1000))),
+                timeout=settings.gbif_timeout_s,
+            )
+        if response.status_code != 200:
+            count(UPSTREAM_ERRORS, "gbif")
+            return None
+
+        return _parse_gbif_occurrences(response.json())
+    except Exception:
+        count(UPSTREAM_ERRORS, "gbif")
+        return None
+
+
+async def fetch_species_from_gbif_async(lat: float, lng: float, radius_meters: int = 50000) -> list:
+    """
+    Non-blocking fetch_species_from_gbif on the shared pooled client.
+    When the GBIF tile cache is open, the query circle is served from cached
+    tiles (fetching only missing ones) and filtered to the exact radius;
+    if they cannot answer it (a failed or incomplete tile), GBIF is asked
+    for the circle around the query's cache cell center, and that answer
+    is cached as well.
+    With GBIF_RETRIEVAL_MODE=facets the distinct species are listed through
+    speciesKey facets instead of raw occurrences.
+    """
+    if settings.gbif_retrieval_mode == "facets":
+        results = await fetch_species_facets(lat, lng, radius_meters)
+        if results is None:
+            count(UPSTREAM_FALLBACKS, "gbif")
+            return []
+        return results
+
+    radius_km = radius_meters / 1000.0
+    cache = get_gbif_tile_cache()
+    if cache is None:
+        results = await _fetch_gbif_circle(lat, lng, radius_km)
+    else:
+        tiles = cache.covering_tiles(lat, lng, radius_km)
+        if tiles is not None:
+            results = await cache.query(lat, lng, radius_km, tiles, _fetch_gbif_tile)
+            if results is not None:
+                return results
+        results = await cache.query_circle(lat, lng, radius_km, _fetch_gbif_circle)
+
+    if results is None:
+        count(UPSTREAM_FALLBACKS, "gbif")
+        return []
+    return results
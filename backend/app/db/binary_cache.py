@@ -0,0 +1,99 @@
+'''
+Hash-keyed binary builds of source data files.
+
+A build is a directory of .npy arrays plus a manifest.json recording the
+format and the SHA-256 of the source file it was built from. Builds are
+written to a temporary directory and renamed into place, so readers never
+see a partial build, and are opened with np.load(mmap_mode="r").
+'''
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+MANIFEST = "manifest.json"
+DEFAULT_CACHE_DIRNAME = ".build_cache"
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_directory(source_path: str, source_hash: str, cache_dir: Optional[str] = None, kind: str = "") -> str:
+    """
+    <cache_dir or source dir/.build_cache>/<source file name>[-<kind>].<hash prefix>
+    `kind` tells apart several builds derived from the same source file.
+    """
+    root = cache_dir or os.path.join(os.path.dirname(os.path.abspath(source_path)), DEFAULT_CACHE_DIRNAME)
+    name = f"{os.path.basename(source_path)}-{kind}" if kind else os.path.basename(source_path)
+    return os.path.join(root, f"{name}.{source_hash[:16]}")
+
+
+def read_manifest(directory: str, fmt: str, source_hash: str) -> Optional[dict]:
+    """The build's manifest if it exists and matches format and source hash, else None."""
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("format") != fmt or manifest.get("source_sha256") != source_hash:
+        return None
+    return manifest
+
+
+def write_build(
+    directory: str,
+    fmt: str,
+    source_hash: str,
+    manifest: dict,
+    arrays: Dict[str, np.ndarray],
+) -> None:
+    """Atomically publish a build; stale builds of the same source file are pruned."""
+    parent = os.path.dirname(directory)
+    os.makedirs(parent, exist_ok=True)
+
+    tmp = tempfile.mkdtemp(prefix=".tmp-", dir=parent)
+    os.chmod(tmp, 0o755)  # mkdtemp is owner-only; workers may run as another user
+    try:
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp, f"{name}.npy"), np.ascontiguousarray(array), allow_pickle=False)
+        with open(os.path.join(tmp, MANIFEST), "w") as f:
+            json.dump({**manifest, "format": fmt, "source_sha256": source_hash, "arrays": sorted(arrays)}, f)
+        try:
+            os.rename(tmp, directory)
+        except OSError:
+            # Another process published the same build first
+            if read_manifest(directory, fmt, source_hash) is None:
+                raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    prefix = os.path.basename(directory).rsplit(".", 1)[0] + "."
+    for entry in os.listdir(parent):
+        if entry.startswith(prefix) and os.path.join(parent, entry) != directory:
+            shutil.rmtree(os.path.join(parent, entry), ignore_errors=True)
+
+
+def open_build(directory: str) -> Tuple[dict, Dict[str, np.ndarray]]:
+    """Manifest and read-only memory-mapped arrays of a build."""
+    with open(os.path.join(directory, MANIFEST)) as f:
+        manifest = json.load(f)
+    arrays = {
+        name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r", allow_pickle=False)
+        for name in manifest["arrays"]
+    }
+    return manifest, arrays
+
+
+def remove_build(directory: str) -> None:
+    """Delete a build (e.g. to replace one built with other options); open mappings stay valid."""
+    shutil.rmtree(directory, ignore_errors=True)
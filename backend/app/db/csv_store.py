@@ -2,14 +2,25 @@
 
 from __future__ import annotations
 
+import logging
+import resource
+import sys
+import time
 from dataclasses import dataclass
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 
 import pandas as pd
 import numpy as np
 
+from app.core.config import settings
+from app.core.geo import haversine_km
+from app.core.metrics import ROWS, count, stage
+from app.db.spatial_index import GridIndex, build_grid_index
 
-_df: Optional[pd.DataFrame] = None
+
+logger = logging.getLogger(__name__)
+
+_occurrences: Optional[Tuple[pd.DataFrame, GridIndex]] = None
 
 
 @dataclass(frozen=True)
@@ -24,81 +35,361 @@ class CSVSchema:
 SCHEMA = CSVSchema()
 
 
-def load_csv(path: str) -> pd.DataFrame:
+STRING_COLUMNS = (SCHEMA.scientific_name, SCHEMA.common_name, SCHEMA.family)
+
+
+@dataclass(frozen=True)
+class LoadStats:
+    rows_read: int
+    rows_kept: int
+    seconds: float
+    rows_per_sec: float
+    table_mb: float             # in-memory size of the loaded table
+    process_peak_rss_mb: float  # peak RSS of the whole process so far, not of this load alone
+
+
+def _process_peak_rss_mb() -> float:
+    """Peak resident set size of this process since it started, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes on Linux and the BSDs
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def _codes_dtype(n_categories: int) -> np.dtype:
+    """Smallest signed code dtype, as pandas picks for a Categorical."""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+class _DictionaryEncoder:
+    """Incrementally maps string values to stable integer codes across chunks."""
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.categories: List[str] = []
+        self.chunks: List[np.ndarray] = []
+
+    def add(self, values: pd.Series) -> None:
+        # Factorize the chunk, then translate only its distinct values
+        local_codes, uniques = pd.factorize(values, use_na_sentinel=False)
+        mapping = np.empty(len(uniques), dtype=np.int64)
+        for i, value in enumerate(uniques):
+            code = self.codes.get(value)
+            if code is None:
+                code = self.codes[value] = len(self.categories)
+                self.categories.append(value)
+            mapping[i] = code
+        self.chunks.append(mapping[local_codes])
+
+    def finish(self) -> pd.Categorical:
+        codes = np.concatenate(self.chunks) if self.chunks else np.array([], dtype=np.int64)
+        codes = codes.astype(_codes_dtype(len(self.categories)))
+        categories = pd.Index(self.categories, dtype=object)
+        return pd.Categorical.from_codes(codes, categories=categories, validate=False)
+
+
+def _clean_strings(chunk: pd.DataFrame, col: str) -> pd.Series:
+    if col not in chunk.columns:
+        return pd.Series("", index=chunk.index, dtype=object)
+    return chunk[col].fillna("").astype(str).str.strip()
+
+
+def load_csv_with_stats(path: str, chunksize: Optional[int] = None) -> tuple:
     """
-    Load CSV into a DataFrame and normalize column types.
-    Call once at app startup, cache the result.
+    Stream the CSV in chunks into a compact DataFrame and report load stats.
+
+    Each chunk is validated on its own (coordinates coerced to numbers,
+    rows with invalid coordinates or an empty scientific name dropped);
+    coordinates are kept as float32 and the name columns as categoricals
+    whose dictionary is built incrementally, so peak memory is bounded by
+    one raw chunk plus the compact columns.
     """
-    df = pd.read_csv(path)
+    start = time.perf_counter()
+    chunksize = chunksize or settings.csv_chunk_rows
 
     # Basic normalization: trim column names
-    df.columns = [c.strip() for c in df.columns]
+    header = pd.read_csv(path, nrows=0).columns
+    rename = {c: c.strip() for c in header}
 
     # Validate required columns
     required = {SCHEMA.lat, SCHEMA.lng, SCHEMA.scientific_name}
-    missing = required - set(df.columns)
+    missing = required - set(rename.values())
     if missing:
         raise ValueError(f"CSV missing required columns: {sorted(missing)}")
 
-    # Normalize types
-    df[SCHEMA.lat] = pd.to_numeric(df[SCHEMA.lat], errors="coerce")
-    df[SCHEMA.lng] = pd.to_numeric(df[SCHEMA.lng], errors="coerce")
+    wanted = {SCHEMA.lat, SCHEMA.lng, *STRING_COLUMNS}
+    usecols = [raw for raw, clean in rename.items() if clean in wanted]
+    string_dtypes = {raw: object for raw in usecols if rename[raw] in STRING_COLUMNS}
+
+    lats: List[np.ndarray] = []
+    lngs: List[np.ndarray] = []
+    encoders = {col: _DictionaryEncoder() for col in STRING_COLUMNS}
+    rows_read = 0
+
+    reader = pd.read_csv(path, usecols=usecols, dtype=string_dtypes, chunksize=chunksize)
+    for chunk in reader:
+        chunk = chunk.rename(columns=rename)
+        rows_read += len(chunk)
+
+        # Normalize types
+        lat = pd.to_numeric(chunk[SCHEMA.lat], errors="coerce").to_numpy(dtype=np.float64)
+        lng = pd.to_numeric(chunk[SCHEMA.lng], errors="coerce").to_numpy(dtype=np.float64)
+        names = _clean_strings(chunk, SCHEMA.scientific_name)
+
+        # Drop rows with invalid coordinates or missing scientific name
+        keep = ~np.isnan(lat) & ~np.isnan(lng) & (names.str.len() > 0).to_numpy()
+        lats.append(lat[keep].astype(np.float32))
+        lngs.append(lng[keep].astype(np.float32))
+        encoders[SCHEMA.scientific_name].add(names[keep])
+        for col in (SCHEMA.common_name, SCHEMA.family):
+            encoders[col].add(_clean_strings(chunk, col)[keep])
+
+    df = pd.DataFrame(
+        {
+            SCHEMA.lat: np.concatenate(lats) if lats else np.array([], dtype=np.float32),
+            SCHEMA.lng: np.concatenate(lngs) if lngs else np.array([], dtype=np.float32),
+            **{col: encoders[col].finish() for col in STRING_COLUMNS},
+        },
+        copy=False,
+    )
+
+    seconds = time.perf_counter() - start
+    stats = LoadStats(
+        rows_read=rows_read,
+        rows_kept=len(df),
+        seconds=seconds,
+        rows_per_sec=rows_read / seconds if seconds > 0 else 0.0,
+        table_mb=df.memory_usage(deep=True).sum() / 2**20,
+        process_peak_rss_mb=_process_peak_rss_mb(),
+    )
+    logger.info(
+        "Loaded %s: %d/%d rows in %.2fs (%.0f rows/s), table %.1f MB, process peak RSS %.1f MB",
+        path, stats.rows_kept, stats.rows_read, stats.seconds, stats.rows_per_sec,
+        stats.table_mb, stats.process_peak_rss_mb,
+    )
+    return df, stats
 
-    # Drop rows with invalid coordinates or missing scientific name
-    df[SCHEMA.scientific_name] = df[SCHEMA.scientific_name].astype(str).str.strip()
-    df = df.dropna(subset=[SCHEMA.lat, SCHEMA.lng])
-    df = df[df[SCHEMA.scientific_name].str.len() > 0]
 
-    # Optional columns: if absent, create empty
-    for col in [SCHEMA.common_name, SCHEMA.family]:
-        if col not in df.columns:
-            df[col] = ""
+def load_csv(path: str) -> pd.DataFrame:
+    """
+    Load CSV into a compact DataFrame (float32 coordinates, categorical
+    name columns). Call once at app startup, cache the result.
+    """
+    df, _ = load_csv_with_stats(path)
+    return df
 
-    # Ensure consistent dtypes
-    df[SCHEMA.common_name] = df[SCHEMA.common_name].astype(str).fillna("").str.strip()
-    df[SCHEMA.family] = df[SCHEMA.family].astype(str).fillna("").str.strip()
 
-    # Reset index for predictable slicing
-    df = df.reset_index(drop=True)
-    return df
+def occurrence_to_arrays(df: pd.DataFrame) -> tuple:
+    """
+    Flatten a loaded DataFrame into JSON-able meta and plain arrays (float
+    coordinates, dictionary-encoded string columns), e.g. for shared memory.
+    """
+    arrays = {
+        SCHEMA.lat: df[SCHEMA.lat].to_numpy(),
+        SCHEMA.lng: df[SCHEMA.lng].to_numpy(),
+    }
+    for col in STRING_COLUMNS:
+        values = df[col].array
+        if not isinstance(values, pd.Categorical):
+            values = pd.Categorical(df[col])
+        arrays[f"{col}.codes"] = values.codes
+        arrays[f"{col}.categories"] = values.categories.to_numpy(dtype=str)
+    return {"columns": [SCHEMA.lat, SCHEMA.lng, *STRING_COLUMNS]}, arrays
+
+
+def occurrence_from_arrays(meta: dict, arrays: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """Inverse of occurrence_to_arrays. Coordinates and category codes are not copied."""
+    data = {SCHEMA.lat: arrays[SCHEMA.lat], SCHEMA.lng: arrays[SCHEMA.lng]}
+    for col in STRING_COLUMNS:
+        categories = pd.Index(arrays[f"{col}.categories"].astype(object))
+        data[col] = pd.Categorical.from_codes(arrays[f"{col}.codes"], categories=categories, validate=False)
+    return pd.DataFrame(data, columns=meta["columns"], copy=False)
+
+
+def _take(df: pd.DataFrame, col: str, rows: np.ndarray) -> np.ndarray:
+    """df[col] values at positional `rows`, decoding categoricals only for those rows."""
+    values = df[col].array
+    if isinstance(values, pd.Categorical):
+        codes = values.codes[rows]
+        if len(values.categories) == 0:
+            return np.full(codes.shape[0], "", dtype=object)
+        out = values.categories.take(np.maximum(codes, 0)).to_numpy(dtype=object, copy=True)
+        out[codes < 0] = ""
+        return out
+    return df[col].to_numpy()[rows]
+
+
+def build_spatial_index(df: pd.DataFrame) -> GridIndex:
+    """
+    Build the lat/lng grid index for a loaded DataFrame.
+    Row positions in the index refer to df's (reset) positional index.
+    """
+    return build_grid_index(
+        df[SCHEMA.lat].to_numpy(),
+        df[SCHEMA.lng].to_numpy(),
+        cell_deg=settings.spatial_index_cell_deg,
+    )
 
 
-def set_df(df: pd.DataFrame) -> None:
-    global _df
-    _df = df
+def set_df(df: pd.DataFrame, index: Optional[GridIndex] = None) -> None:
+    """
+    Cache the DataFrame and its spatial index (built here if not given).
+    Both are swapped in with a single assignment, so a concurrent reader
+    sees either the old pair or the new one, never a mix.
+    """
+    global _occurrences
+    _occurrences = (df, index if index is not None else build_spatial_index(df))
 
 
-def get_df() -> pd.DataFrame:
+def get_occurrences() -> Tuple[pd.DataFrame, GridIndex]:
     """
-    FastAPI dependency: returns the cached DataFrame.
+    FastAPI dependency: returns the cached DataFrame and its spatial index
+    as one consistent snapshot.
     """
-    if _df is None:
+    if _occurrences is None:
         raise RuntimeError("CSV DataFrame not loaded. Did you call load_csv() at startup?")
-    return _df
+    return _occurrences
 
 
-def unload_df() -> None:
-    global _df
-    _df = None
+def get_df() -> pd.DataFrame:
+    """
+    FastAPI dependency: returns the cached DataFrame.
+    """
+    return get_occurrences()[0]
 
 
-def _haversine_km(lat1, lng1, lat2, lng2) -> np.ndarray:
+def get_spatial_index() -> GridIndex:
     """
-    Vectorized haversine distance from a single point (lat1,lng1)
-    to arrays lat2,lng2. Returns km.
+    FastAPI dependency: returns the spatial index of the cached DataFrame.
     """
-    R = 6371.0088  # Earth radius in km
-    lat1 = np.radians(lat1)
-    lng1 = np.radians(lng1)
-    lat2 = np.radians(lat2)
-    lng2 = np.radians(lng2)
+    return get_occurrences()[1]
+
+
+def unload_df() -> None:
+    global _occurrences
+    _occurrences = None
+
+
+SpeciesColumns = Dict[str, np.ndarray]
+
+OUTPUT_COLUMNS = ("scientific_name", "common_name", "family", "latitude", "longitude", "distance_km")
+
+
+def _empty_columns() -> SpeciesColumns:
+    return {
+        "scientific_name": np.array([], dtype=object),
+        "common_name": np.array([], dtype=object),
+        "family": np.array([], dtype=object),
+        "latitude": np.array([], dtype=np.float64),
+        "longitude": np.array([], dtype=np.float64),
+        "distance_km": np.array([], dtype=np.float64),
+    }
 
-    dlat = lat2 - lat1
-    dlng = lng2 - lng1
 
-    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
-    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
-    return R * c
+# float32 holds ~7 significant digits: about 1 m at the antimeridian
+COORDINATE_DECIMALS = 5
+
+
+def _coordinates(df: pd.DataFrame, col: str, rows: np.ndarray) -> np.ndarray:
+    """Coordinates at `rows` as float64, rounded so float32 storage noise is not echoed."""
+    values = df[col].to_numpy()[rows].astype(np.float64)
+    if df[col].dtype == np.float32:
+        values = np.round(values, COORDINATE_DECIMALS)
+    return values
+
+
+def query_species_columns(
+    df: pd.DataFrame,
+    lat: float,
+    lng: float,
+    radius_km: float = 5.0,
+    limit: int = 50,
+    index: Optional[GridIndex] = None,
+) -> SpeciesColumns:
+    """
+    Unique species near (lat,lng) within radius_km, as NumPy columns
+    (see OUTPUT_COLUMNS), nearest first. Deduplicates by scientific_name,
+    keeping the nearest occurrence. With a spatial index only rows in the
+    cells touched by the query are scanned; without one every row is.
+    """
+    with stage("species_candidates"):
+        if index is not None:
+            candidates = index.candidates(lat, lng, radius_km)
+        else:
+            candidates = np.arange(len(df))
+
+    if candidates.size == 0:
+        return _empty_columns()
+
+    # Compute precise distances for the candidate subset (in float64)
+    with stage("species_distance"):
+        dists = haversine_km(
+            lat, lng,
+            df[SCHEMA.lat].to_numpy()[candidates].astype(np.float64),
+            df[SCHEMA.lng].to_numpy()[candidates].astype(np.float64),
+        )
+        inside = np.flatnonzero(dists <= radius_km)
+    count(ROWS, "species_by_location", "scanned", amount=int(candidates.size))
+    count(ROWS, "species_by_location", "matched", amount=int(inside.size))
+    if inside.size == 0:
+        return _empty_columns()
+
+    with stage("species_dedup"):
+        # Sort nearest first
+        inside = inside[np.argsort(dists[inside], kind="stable")]
+        rows = candidates[inside]
+
+        # Deduplicate by scientific_name: keep nearest occurrence
+        names = _take(df, SCHEMA.scientific_name, rows)
+        first = ~pd.Series(names, copy=False).duplicated(keep="first").to_numpy()
+
+        # Limit output rows
+        keep = np.flatnonzero(first)[: min(max(limit, 1), 200)]
+        rows = rows[keep]
+
+    return {
+        "scientific_name": names[keep],
+        "common_name": _take(df, SCHEMA.common_name, rows),
+        "family": _take(df, SCHEMA.family, rows),
+        "latitude": _coordinates(df, SCHEMA.lat, rows),
+        "longitude": _coordinates(df, SCHEMA.lng, rows),
+        "distance_km": dists[inside[keep]],
+    }
+
+
+def nearby_species_names(
+    df: pd.DataFrame,
+    lat: float,
+    lng: float,
+    radius_km: float,
+    index: Optional[GridIndex] = None,
+) -> np.ndarray:
+    """
+    Distinct scientific names with an occurrence within radius_km of
+    (lat,lng), unordered and without a limit. Categorical names are
+    deduplicated on their codes, so only the distinct names are decoded.
+    """
+    candidates = index.candidates(lat, lng, radius_km) if index is not None else np.arange(len(df))
+    if candidates.size == 0:
+        return np.array([], dtype=object)
+
+    dists = haversine_km(
+        lat, lng,
+        df[SCHEMA.lat].to_numpy()[candidates].astype(np.float64),
+        df[SCHEMA.lng].to_numpy()[candidates].astype(np.float64),
+    )
+    rows = candidates[dists <= radius_km]
+    count(ROWS, "nearby_species", "scanned", amount=int(candidates.size))
+    count(ROWS, "nearby_species", "matched", amount=int(rows.size))
+
+    values = df[SCHEMA.scientific_name].array
+    if isinstance(values, pd.Categorical):
+        codes = np.unique(values.codes[rows])
+        codes = codes[codes >= 0]
+        return values.categories.take(codes).to_numpy(dtype=object, copy=True)
+    return pd.unique(df[SCHEMA.scientific_name].to_numpy()[rows]).astype(object)
 
 
 def query_species_by_location(
@@ -107,56 +398,12 @@ def query_species_by_location(
     lng: float,
     radius_km: float = 5.0,
     limit: int = 50,
+    index: Optional[GridIndex] = None,
 ) -> List[Dict[str, Any]]:
     """
     Returns a list of unique species near (lat,lng) within radius_km.
-    Deduplicates by scientific_name, keeping the nearest occurrence.
-    """
-    # Cheap bounding-box prefilter (reduces distance computations)
-    # 1 deg latitude ~ 110.574 km
-    delta_lat = radius_km / 110.574
-    # 1 deg longitude ~ 111.320*cos(latitude) km
-    cos_lat = np.cos(np.radians(lat))
-    delta_lng = radius_km / (111.320 * max(cos_lat, 1e-6))
-
-    lat_col = SCHEMA.lat
-    lng_col = SCHEMA.lng
-
-    sub = df[
-        (df[lat_col] >= lat - delta_lat) & (df[lat_col] <= lat + delta_lat) &
-        (df[lng_col] >= lng - delta_lng) & (df[lng_col] <= lng + delta_lng)
-    ]
-
-    if sub.empty:
-        return []
-
-    # Compute precise distances for the candidate subset
-    dists = _haversine_km(lat, lng, sub[lat_col].to_numpy(), sub[lng_col].to_numpy())
-    sub = sub.copy()
-    sub["distance_km"] = dists
-
-    # Filter within radius and sort nearest first
-    sub = sub[sub["distance_km"] <= radius_km].sort_values("distance_km", ascending=True)
-    if sub.empty:
-        return []
-
-    # Deduplicate by scientific_name: keep nearest occurrence
-    sci = SCHEMA.scientific_name
-    sub = sub.drop_duplicates(subset=[sci], keep="first")
-
-    # Limit and format output rows
-    sub = sub.head(min(max(limit, 1), 200))
-
-    out = []
-    for _, row in sub.iterrows():
-        out.append(
-            {
-                "scientific_name": row.get(SCHEMA.scientific_name, ""),
-                "common_name": row.get(SCHEMA.common_name, ""),
-                "family": row.get(SCHEMA.family, ""),
-                "latitude": float(row[SCHEMA.lat]),
-                "longitude": float(row[SCHEMA.lng]),
-                "distance_km": float(row["distance_km"]),
-            }
-        )
-    return out
+    Record-shaped view of query_species_columns.
+    """
+    columns = query_species_columns(df, lat, lng, radius_km, limit, index=index)
+    values = [columns[c].tolist() for c in OUTPUT_COLUMNS]
+    return [dict(zip(OUTPUT_COLUMNS, row)) for row in zip(*values)]
@@ -0,0 +1,329 @@
+'''
+Startup loading and hot reload of the occurrence and ML datasets
+'''
+
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import pandas as pd
+
+from app.core.config import settings
+from app.db.csv_store import (
+    build_spatial_index,
+    get_occurrences,
+    load_csv,
+    occurrence_from_arrays,
+    occurrence_to_arrays,
+    set_df,
+    unload_df,
+)
+from app.db.ml_store import (
+    MLCatalog,
+    catalog_from_arrays,
+    catalog_to_arrays,
+    get_ml_catalog,
+    load_ml_data,
+    set_ml_catalog,
+    unload_ml_catalog,
+)
+from app.db.shared_store import SharedDataset, exclusive_lock
+from app.db.spatial_index import GridIndex
+from app.ml.catalog_index import (
+    IVFIndex,
+    index_from_arrays,
+    index_to_arrays,
+    load_catalog_index,
+    set_catalog_index,
+    train_ivf,
+    unload_catalog_index,
+)
+from app.ml.risk_table import (
+    RiskTable,
+    build_risk_table,
+    risk_table_from_arrays,
+    risk_table_to_arrays,
+    set_risk_table,
+    unload_risk_table,
+)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+ROOT_DIR = os.path.dirname(BACKEND_DIR)
+
+# Note: CSV file path - update if your data is elsewhere
+OCCURRENCE_CSV_PATH = "app/db/invasive_species.csv"
+# ML data file - located at root/notebooks/vectorized_species_master.csv
+ML_DATA_PATH = os.path.join(ROOT_DIR, "notebooks", "vectorized_species_master.csv")
+
+SHARED_FORMAT = "shared/1"
+
+logger = logging.getLogger(__name__)
+
+_shared: Optional[SharedDataset] = None
+
+
+def load_occurrences(path: Optional[str] = None) -> pd.DataFrame:
+    # With OCCURRENCE_STORE=mongo the occurrences are queried in MongoDB, not held in memory
+    if settings.occurrence_store == "mongo":
+        return pd.DataFrame(columns=["latitude", "longitude", "scientific_name", "common_name", "family"])
+    # For now, using empty CSV structure (GBIF will be used for location data)
+    try:
+        return load_csv(path or OCCURRENCE_CSV_PATH)
+    except (FileNotFoundError, ValueError):
+        # If CSV doesn't exist or is empty, create empty DataFrame
+        return pd.DataFrame(columns=["latitude", "longitude", "scientific_name", "common_name", "family"])
+
+
+def _dataset_key(*paths: str) -> str:
+    """Cheap identity of the source files (path, size, mtime) plus index settings."""
+    digest = hashlib.sha1(
+        f"{SHARED_FORMAT}:{settings.spatial_index_cell_deg}:{settings.ml_catalog_sparse_min_onehot}:"
+        f"{settings.risk_scoring_space}:{settings.ml_pca_variance}:{_risk_table_step()}:"
+        f"{settings.catalog_index_enabled}:{settings.catalog_index_lists}:{settings.occurrence_store}".encode()
+    )
+    for path in paths:
+        try:
+            st = os.stat(path)
+            digest.update(f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}".encode())
+        except OSError:
+            digest.update(f"{os.path.abspath(path)}:missing".encode())
+    return digest.hexdigest()[:16]
+
+
+def _risk_table_step() -> Optional[float]:
+    return settings.risk_table_rainfall_step_mm if settings.risk_table_enabled else None
+
+
+def _build_risk_table(catalog: MLCatalog) -> Optional[RiskTable]:
+    step = _risk_table_step()
+    return build_risk_table(catalog, rainfall_step_mm=step) if step is not None else None
+
+
+def _load_catalog_index(catalog: MLCatalog) -> Optional[IVFIndex]:
+    if not settings.catalog_index_enabled:
+        return None
+    try:
+        return load_catalog_index(
+            ML_DATA_PATH, catalog, settings.catalog_index_lists, settings.ml_catalog_cache_dir or None
+        )
+    except OSError:
+        # Read-only or full filesystem: train it in memory
+        return train_ivf(catalog, settings.catalog_index_lists)
+
+
+@dataclass(frozen=True)
+class DatasetVersion:
+    """Identity and load stats of the datasets currently being served."""
+    version: str          # _dataset_key of the source files when they were read
+    loaded_at: float      # unix time the datasets went live
+    load_seconds: float
+    occurrences: int
+    species: int
+
+
+@dataclass(frozen=True)
+class _Loaded:
+    df: pd.DataFrame
+    index: GridIndex
+    catalog: MLCatalog
+    risk_table: Optional[RiskTable] = None
+    catalog_index: Optional[IVFIndex] = None
+    shared: Optional[SharedDataset] = None
+
+
+@dataclass(frozen=True)
+class LiveDatasets:
+    """The occurrence table, catalog and version of one dataset generation."""
+    occurrences: Tuple[pd.DataFrame, GridIndex]
+    catalog: MLCatalog
+    version: Optional[DatasetVersion]
+
+
+_version: Optional[DatasetVersion] = None
+_reload_lock = threading.Lock()
+# Held while the stores are swapped, so get_live_datasets never sees two generations
+_swap_lock = threading.Lock()
+
+
+def _publish_shared(name: str) -> SharedDataset:
+    df = load_occurrences()
+    index = build_spatial_index(df)
+    catalog = load_ml_data(ML_DATA_PATH)
+    groups = {
+        "occurrences": occurrence_to_arrays(df),
+        "spatial_index": index.to_arrays(),
+        "ml_catalog": catalog_to_arrays(catalog),
+    }
+    risk_table = _build_risk_table(catalog)
+    if risk_table is not None:
+        groups["risk_table"] = risk_table_to_arrays(risk_table)
+    catalog_index = _load_catalog_index(catalog)
+    if catalog_index is not None:
+        groups["catalog_index"] = index_to_arrays(catalog_index)
+    return SharedDataset.publish(name, groups)
+
+
+def _load_shared(key: str) -> _Loaded:
+    """
+    Attach to the datasets published by another worker, or load and publish
+    them if this worker is first. Either way the stores get zero-copy views.
+    """
+    name = f"{settings.shared_memory_prefix}-{key}"
+    with exclusive_lock(settings.shared_memory_lock_path):
+        reaped = SharedDataset.reap_orphans(settings.shared_memory_prefix)
+        shared = SharedDataset.attach(name) or _publish_shared(name)
+    if reaped:
+        logger.info("Unlinked shared datasets left by dead workers: %s", ", ".join(reaped))
+
+    return _Loaded(
+        df=occurrence_from_arrays(*shared.group("occurrences")),
+        index=GridIndex.from_arrays(*shared.group("spatial_index")),
+        catalog=catalog_from_arrays(*shared.group("ml_catalog")),
+        risk_table=risk_table_from_arrays(*shared.group("risk_table")) if _risk_table_step() is not None else None,
+        catalog_index=index_from_arrays(*shared.group("catalog_index")) if settings.catalog_index_enabled else None,
+        shared=shared,
+    )
+
+
+def _load(key: str) -> _Loaded:
+    """Load both datasets and build their indexes without touching the stores."""
+    if settings.shared_memory_enabled:
+        return _load_shared(key)
+
+    df = load_occurrences()
+    catalog = load_ml_data(ML_DATA_PATH)
+    return _Loaded(
+        df=df,
+        index=build_spatial_index(df),
+        catalog=catalog,
+        risk_table=_build_risk_table(catalog),
+        catalog_index=_load_catalog_index(catalog),
+    )
+
+
+def _release_shared(shared: Optional[SharedDataset]) -> None:
+    # Views still held by in-flight requests keep the old mapping alive until they finish
+    if shared is not None:
+        with exclusive_lock(settings.shared_memory_lock_path):
+            shared.release()
+
+
+def _activate(key: str) -> DatasetVersion:
+    """Load a new version and swap it into the stores; the old one is released after."""
+    global _shared, _version
+    start = time.perf_counter()
+    loaded = _load(key)
+    version = DatasetVersion(
+        version=key,
+        loaded_at=time.time(),
+        load_seconds=time.perf_counter() - start,
+        occurrences=len(loaded.df),
+        species=len(loaded.catalog),
+    )
+
+    with _swap_lock:
+        set_df(loaded.df, index=loaded.index)
+        set_ml_catalog(loaded.catalog)
+        set_risk_table(loaded.catalog, loaded.risk_table)
+        set_catalog_index(loaded.catalog, loaded.catalog_index)
+        previous, _shared = _shared, loaded.shared
+        _version = version
+    _release_shared(previous)
+    logger.info("Datasets %s live: %d occurrences, %d species, loaded in %.2fs",
+                key, _version.occurrences, _version.species, _version.load_seconds)
+    return _version
+
+
+def load_datasets() -> None:
+    """Load the occurrence table (plus spatial index) and the ML catalog into their stores."""
+    with _reload_lock:
+        _activate(_dataset_key(OCCURRENCE_CSV_PATH, ML_DATA_PATH))
+
+
+class ReloadInProgress(RuntimeError):
+    pass
+
+
+def reload_datasets(force: bool = False) -> Tuple[DatasetVersion, bool]:
+    """
+    Rebuild the datasets from their source files and atomically swap them in.
+    Requests already running keep the objects they fetched and finish on
+    the old version. Unless `force`, nothing is rebuilt when the source
+    files are unchanged. Returns the live version and whether it changed;
+    raises ReloadInProgress if another reload is running. Blocking: run it
+    in a worker thread from async code.
+    """
+    if not _reload_lock.acquire(blocking=False):
+        raise ReloadInProgress("A dataset reload is already running")
+    try:
+        key = _dataset_key(OCCURRENCE_CSV_PATH, ML_DATA_PATH)
+        if not force and _version is not None and _version.version == key:
+            return _version, False
+        return _activate(key), True
+    finally:
+        _reload_lock.release()
+
+
+def get_dataset_version() -> Optional[DatasetVersion]:
+    return _version
+
+
+def get_live_datasets() -> LiveDatasets:
+    """
+    FastAPI dependency: occurrences, catalog and version of one generation,
+    for requests that use more than one of them.
+    """
+    with _swap_lock:
+        return LiveDatasets(occurrences=get_occurrences(), catalog=get_ml_catalog(), version=_version)
+
+
+def _poll_sources(pending: Optional[str]) -> Tuple[Optional[str], bool]:
+    """
+    One watcher poll. Returns the changed source key to compare on the next
+    poll (None if the sources match the live version) and whether that key
+    was already seen last time, i.e. the change has settled.
+    """
+    key = _dataset_key(OCCURRENCE_CSV_PATH, ML_DATA_PATH)
+    if _version is not None and key == _version.version:
+        return None, False
+    return key, key == pending
+
+
+async def watch_datasets(interval_s: float) -> None:
+    """
+    Poll the source files every `interval_s` and reload when they change.
+    A change is only loaded once the files look the same on two polls in a
+    row, so a file still being written is not read half-way. Run one per
+    worker: in shared memory mode the first worker to notice publishes the
+    new segment and the others attach to it.
+    """
+    pending = None
+    while True:
+        await asyncio.sleep(interval_s)
+        pending, settled = _poll_sources(pending)
+        if not settled:
+            continue
+        try:
+            await asyncio.to_thread(reload_datasets)
+        except ReloadInProgress:
+            pass
+        except Exception:
+            # Keep serving the current version; retry on the next tick
+            logger.exception("Dataset reload failed")
+
+
+def unload_datasets() -> None:
+    global _shared, _version
+    with _swap_lock:
+        unload_df()
+        unload_ml_catalog()
+        unload_risk_table()
+        unload_catalog_index()
+        previous, _shared = _shared, None
+        _version = None
+    _release_shared(previous)
@@ -0,0 +1,185 @@
+'''
+Ingest of GBIF occurrence downloads into the local occurrence store.
+
+Accepts a Darwin Core Archive (.zip with meta.xml and a core occurrence
+file) or a GBIF occurrence export (tab- or comma-separated, Darwin Core
+column names, e.g. the "simple CSV" download). Rows are streamed in chunks,
+mapped onto the csv_store schema and written to a new occurrence CSV that
+replaces the target atomically, ready for load_csv / a dataset reload.
+'''
+
+import csv
+import io
+import os
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+import zipfile
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.core.config import settings
+from app.db.csv_store import SCHEMA
+
+# Darwin Core terms read from the export (by local name)
+DWC_TERMS = ("decimalLatitude", "decimalLongitude", "species", "scientificName", "vernacularName", "family", "occurrenceStatus")
+OUTPUT_COLUMNS = [SCHEMA.lat, SCHEMA.lng, SCHEMA.scientific_name, SCHEMA.common_name, SCHEMA.family]
+
+
+@dataclass(frozen=True)
+class IngestStats:
+    rows_read: int
+    rows_written: int
+    species: int
+    seconds: float
+
+
+@dataclass(frozen=True)
+class _Layout:
+    """Where the DwC terms live in a delimited occurrence file."""
+    sep: str
+    skip_rows: int
+    quoting: int
+    columns: Optional[Dict[str, int]] = None  # term -> column index when there is no usable header
+
+
+def _local_name(term: str) -> str:
+    return term.rsplit("/", 1)[-1].split("}")[-1]
+
+
+def _read_meta(archive: zipfile.ZipFile) -> tuple:
+    """Core file name and layout from a DwC-A meta.xml."""
+    root = ET.fromstring(archive.read("meta.xml"))
+    core = next(el for el in root.iter() if _local_name(el.tag) == "core")
+    location = next(el for el in core.iter() if _local_name(el.tag) == "location").text.strip()
+
+    sep = core.get("fieldsTerminatedBy", ",").encode().decode("unicode_escape")
+    enclosed = core.get("fieldsEnclosedBy", '"')
+    columns = {}
+    for field in core.iter():
+        if _local_name(field.tag) == "field" and field.get("index") is not None:
+            columns[_local_name(field.get("term", ""))] = int(field.get("index"))
+
+    layout = _Layout(
+        sep=sep,
+        skip_rows=int(core.get("ignoreHeaderLines", "0")),
+        quoting=csv.QUOTE_MINIMAL if enclosed else csv.QUOTE_NONE,
+        columns={t: columns[t] for t in DWC_TERMS if t in columns},
+    )
+    return location, layout
+
+
+def _sniff_layout(first_line: str) -> _Layout:
+    # GBIF downloads are tab-separated and unquoted even when named .csv
+    if "\t" in first_line:
+        return _Layout(sep="\t", skip_rows=0, quoting=csv.QUOTE_NONE)
+    return _Layout(sep=",", skip_rows=0, quoting=csv.QUOTE_MINIMAL)
+
+
+@contextmanager
+def _open_source(path: str) -> Iterator[tuple]:
+    """Text stream of the occurrence rows and their layout."""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            location, layout = _read_meta(archive)
+            with archive.open(location) as raw:
+                yield io.TextIOWrapper(raw, encoding="utf-8", newline=""), layout
+        return
+
+    with open(path, encoding="utf-8", newline="") as f:
+        layout = _sniff_layout(f.readline())
+        f.seek(0)
+        yield f, layout
+
+
+def _iter_chunks(stream, layout: _Layout, chunksize: int) -> Iterator[pd.DataFrame]:
+    """Chunks holding the available DWC_TERMS columns (as strings)."""
+    kwargs = dict(sep=layout.sep, quoting=layout.quoting, dtype=str, keep_default_na=False,
+                  chunksize=chunksize, on_bad_lines="skip", engine="c")
+    if layout.columns is not None:
+        by_index = {i: term for term, i in layout.columns.items()}
+        reader = pd.read_csv(stream, header=None, skiprows=layout.skip_rows,
+                             usecols=sorted(by_index), **kwargs)
+        for chunk in reader:
+            yield chunk.rename(columns=by_index)
+        return
+
+    reader = pd.read_csv(stream, usecols=lambda c: c.strip() in DWC_TERMS, **kwargs)
+    for chunk in reader:
+        yield chunk.rename(columns=str.strip)
+
+
+def normalize_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+    """
+    Map Darwin Core columns onto the occurrence store schema. Keeps present
+    (not ABSENT) records with in-range coordinates and a name: per row
+    `species`, else `scientificName`, like the live GBIF fetcher.
+    """
+    missing = {"decimalLatitude", "decimalLongitude"} - set(chunk.columns)
+    if missing or not {"species", "scientificName"} & set(chunk.columns):
+        raise ValueError(f"Not a GBIF occurrence export: missing {sorted(missing) or ['species / scientificName']}")
+
+    def column(term: str) -> pd.Series:
+        if term in chunk.columns:
+            return chunk[term].fillna("").astype(str).str.strip()
+        return pd.Series("", index=chunk.index, dtype=object)
+
+    lat = pd.to_numeric(column("decimalLatitude"), errors="coerce")
+    lng = pd.to_numeric(column("decimalLongitude"), errors="coerce")
+    species = column("species")
+    names = species.where(species.str.len() > 0, column("scientificName"))
+
+    keep = (
+        lat.between(-90, 90) & lng.between(-180, 180)
+        & (names.str.len() > 0)
+        & (column("occurrenceStatus").str.upper() != "ABSENT")
+    )
+    return pd.DataFrame({
+        SCHEMA.lat: lat[keep],
+        SCHEMA.lng: lng[keep],
+        SCHEMA.scientific_name: names[keep],
+        SCHEMA.common_name: column("vernacularName")[keep],
+        SCHEMA.family: column("family")[keep],
+    }, columns=OUTPUT_COLUMNS)
+
+
+def ingest_gbif_export(source: str, out_path: str, chunksize: Optional[int] = None) -> IngestStats:
+    """
+    Convert a GBIF DwC-A / occurrence export into an occurrence store CSV
+    at `out_path`. The file is written beside the target and renamed over
+    it, so a running service never reads a partial file.
+    """
+    start = time.perf_counter()
+    chunksize = chunksize or settings.csv_chunk_rows
+    out_dir = os.path.dirname(os.path.abspath(out_path))
+    os.makedirs(out_dir, exist_ok=True)
+
+    rows_read = rows_written = 0
+    species = set()
+    fd, tmp_path = tempfile.mkstemp(dir=out_dir, prefix=".ingest-", suffix=".csv")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as out:
+            pd.DataFrame(columns=OUTPUT_COLUMNS).to_csv(out, index=False)
+            with _open_source(source) as (stream, layout):
+                for chunk in _iter_chunks(stream, layout, chunksize):
+                    rows_read += len(chunk)
+                    normalized = normalize_chunk(chunk)
+                    rows_written += len(normalized)
+                    species.update(np.unique(normalized[SCHEMA.scientific_name].to_numpy(dtype=str)))
+                    normalized.to_csv(out, index=False, header=False)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+    return IngestStats(
+        rows_read=rows_read,
+        rows_written=rows_written,
+        species=len(species),
+        seconds=time.perf_counter() - start,
+    )
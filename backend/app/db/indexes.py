@@ -1,22 +1,19 @@
-# '''
-# DB index creation
-# '''
+'''
+DB index creation
+'''
 
-# from motor.motor_asyncio import AsyncIOMotorDatabase
-# from pymongo import ASCENDING, DESCENDING
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, GEOSPHERE
 
-# async def ensure_indexes(db: AsyncIOMotorDatabase):
-#     '''
-#     Create required MongoDB indexes.
-#     Safe to run multiple times (MongoDB will skip if index already exists).
-#     '''
-    
-    # tbd
-    # await db["species"].create_index([("name", ASCENDING)], unique=True)
-    # await db["species"].create_index([("scientific_name", ASCENDING)], unique=True)
-    # await db["species"].create_index([("common_name", ASCENDING)], unique=True)
-    # await db["species"].create_index([("category", ASCENDING)])
-    # await db["species"].create_index([("order", ASCENDING)])
-    # await db["species"].create_index([("family", ASCENDING)], unique=True)
-    # await db["species"].create_index([("genus", ASCENDING)], unique=True)
-    # await db["species"].create_index([("species", ASCENDING)], unique=True)
\ No newline at end of file
+from app.core.config import settings
+
+
+async def ensure_indexes(db: AsyncIOMotorDatabase) -> None:
+    '''
+    Create required MongoDB indexes.
+    Safe to run multiple times (MongoDB will skip if index already exists).
+    '''
+    occurrences = db[settings.mongo_occurrences_collection]
+    # $geoNear needs exactly one 2dsphere index to run against
+    await occurrences.create_index([("location", GEOSPHERE)], name="location_2dsphere")
+    await occurrences.create_index([("scientific_name", ASCENDING)], name="scientific_name")
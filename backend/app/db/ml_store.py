@@ -1,21 +1,286 @@
 import pandas as pd
-from typing import Optional
+import numpy as np
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Iterable, Tuple
+from scipy import sparse
 
-_ml_df: Optional[pd.DataFrame] = None
+from app.core.config import settings
+from app.db import binary_cache
+from app.ml.projection import PCAProjection, fit_projection, projection_from_arrays, projection_to_arrays
 
-def load_ml_data(path: str) -> pd.DataFrame:
-    df = pd.read_csv(path)
-    return df
+METADATA_COLS = ['scientific_name', 'is_invasive', 'common_name', 'image_url']
 
-def set_ml_df(df: pd.DataFrame) -> None:
-    global _ml_df
-    _ml_df = df
 
-def get_ml_df() -> pd.DataFrame:
-    if _ml_df is None:
+def normalize_scientific_name(name: str) -> str:
+    """Normalize scientific name for matching: remove author info, lowercase, trim."""
+    if not name:
+        return ""
+    # Remove author info in parentheses: "Genus species (Author)" -> "Genus species"
+    return name.split('(')[0].strip().lower()
+
+
+@dataclass(frozen=True)
+class MLCatalog:
+    """
+    Scoring-ready view of the vectorized species catalog.
+    Built once at startup so requests never touch the raw DataFrame.
+    """
+    feature_names: List[str]
+    feature_index: Dict[str, int]
+    features: np.ndarray          # (n_species, n_features) float32, C-contiguous
+    norms: np.ndarray             # (n_species,) float32 row L2 norms
+    scientific_name: np.ndarray   # (n_species,) fixed-width unicode
+    is_invasive: np.ndarray       # (n_species,) int64
+    name_index: Dict[str, Tuple[int, ...]]  # normalized scientific name -> row positions
+    common_name: Optional[np.ndarray] = None
+    # Sparse layout (wide one-hot groups): `features` then holds only the
+    # continuous columns at `dense_columns`, and the boolean one-hot columns
+    # at `onehot_columns` live in `onehot` as CSR. None: `features` is full width.
+    onehot: Optional[sparse.csr_matrix] = None
+    dense_columns: Optional[np.ndarray] = None
+    onehot_columns: Optional[np.ndarray] = None
+    # PCA-reduced scoring space, built when RISK_SCORING_SPACE=pca
+    projection: Optional[PCAProjection] = None
+
+    def __len__(self) -> int:
+        return self.features.shape[0]
+
+    @property
+    def feature_bytes(self) -> int:
+        """Memory held by the feature arrays."""
+        total = self.features.nbytes + self.norms.nbytes
+        if self.onehot is not None:
+            total += self.onehot.data.nbytes + self.onehot.indices.nbytes + self.onehot.indptr.nbytes
+        return total
+
+    def dot(self, targets: np.ndarray, rows: Optional[np.ndarray] = None, reduced: bool = False) -> np.ndarray:
+        """
+        Feature rows (all, or `rows`) dotted with a target vector
+        (n_features,) or target matrix (n_targets, n_features). In the sparse
+        layout this is a dense product over the continuous columns plus a
+        sparse product over the one-hots. With `reduced` (and a projection)
+        it is the approximate product in the PCA space.
+        """
+        if reduced and self.projection is not None:
+            return self.projection.dot(targets, rows)
+        features = self.features if rows is None else self.features[rows]
+        if self.onehot is None:
+            return features @ targets.T
+        onehot = self.onehot if rows is None else self.onehot[rows]
+        return features @ targets[..., self.dense_columns].T + onehot @ targets[..., self.onehot_columns].T
+
+    def dense_features(self, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Full-width float32 feature rows, whatever the layout."""
+        features = self.features if rows is None else self.features[rows]
+        if self.onehot is None:
+            return features
+        onehot = self.onehot if rows is None else self.onehot[rows]
+        out = np.zeros((features.shape[0], len(self.feature_names)), dtype=np.float32)
+        out[:, self.dense_columns] = features
+        out[:, self.onehot_columns] = onehot.toarray()
+        return out
+
+    def match_species(self, normalized_names: Iterable[str]) -> np.ndarray:
+        """
+        Return sorted catalog row positions for the given normalized names.
+        Cost scales with the number of names, not the catalog size.
+        """
+        rows = []
+        for name in normalized_names:
+            rows.extend(self.name_index.get(name, ()))
+        return np.array(sorted(rows), dtype=np.intp)
+
+
+def build_name_index(scientific_names: Iterable[str]) -> Dict[str, Tuple[int, ...]]:
+    """Map each normalized scientific name to the catalog rows that carry it."""
+    index: Dict[str, List[int]] = {}
+    for row, name in enumerate(scientific_names):
+        index.setdefault(normalize_scientific_name(name), []).append(row)
+    return {name: tuple(rows) for name, rows in index.items()}
+
+
+_ml_catalog: Optional[MLCatalog] = None
+
+
+def _onehot_csr(df: pd.DataFrame, columns: List[str]) -> sparse.csr_matrix:
+    """CSR matrix of boolean columns, built column by column (no dense copy)."""
+    row_parts, col_parts = [], []
+    for j, name in enumerate(columns):
+        rows = np.flatnonzero(df[name].to_numpy(dtype=bool))
+        row_parts.append(rows)
+        col_parts.append(np.full(rows.size, j, dtype=np.int32))
+    rows = np.concatenate(row_parts) if row_parts else np.array([], dtype=np.intp)
+    cols = np.concatenate(col_parts) if col_parts else np.array([], dtype=np.int32)
+    data = np.ones(rows.size, dtype=np.float32)
+    return sparse.csr_matrix((data, (rows, cols)), shape=(len(df), len(columns)), dtype=np.float32)
+
+
+def _pca_variance() -> float:
+    return settings.ml_pca_variance if settings.risk_scoring_space == "pca" else 0.0
+
+
+def compile_catalog(
+    df: pd.DataFrame,
+    sparse_min_onehot: Optional[int] = None,
+    pca_variance: Optional[float] = None,
+) -> MLCatalog:
+    """
+    Compile the vectorized species DataFrame into an MLCatalog.
+    Every non-metadata column is treated as a numeric feature. When there
+    are at least `sparse_min_onehot` boolean (one-hot) columns (default
+    ML_CATALOG_SPARSE_MIN_ONEHOT; 0 never), they are stored as CSR. A
+    `pca_variance` > 0 (default ML_PCA_VARIANCE with RISK_SCORING_SPACE=pca)
+    also fits the PCA projection keeping that share of the variance.
+    """
+    feature_names = [c for c in df.columns if c not in METADATA_COLS]
+    if sparse_min_onehot is None:
+        sparse_min_onehot = settings.ml_catalog_sparse_min_onehot
+    if pca_variance is None:
+        pca_variance = _pca_variance()
+
+    onehot_names = [c for c in feature_names if pd.api.types.is_bool_dtype(df[c])]
+    onehot = dense_columns = onehot_columns = None
+    if 0 < sparse_min_onehot <= len(onehot_names):
+        is_onehot = np.isin(feature_names, onehot_names)
+        dense_columns = np.flatnonzero(~is_onehot)
+        onehot_columns = np.flatnonzero(is_onehot)
+        features = np.ascontiguousarray(
+            df[[feature_names[i] for i in dense_columns]].to_numpy(dtype=np.float32).reshape(len(df), -1)
+        )
+        onehot = _onehot_csr(df, onehot_names)
+        # One-hot entries are 1, so each contributes 1 to the squared norm
+        squared = np.einsum('ij,ij->i', features, features) + np.diff(onehot.indptr).astype(np.float32)
+        norms = np.sqrt(squared).astype(np.float32)
+    else:
+        features = np.ascontiguousarray(df[feature_names].to_numpy(dtype=np.float32))
+        norms = np.linalg.norm(features, axis=1).astype(np.float32)
+
+    common_name = None
+    if 'common_name' in df.columns:
+        common_name = df['common_name'].fillna('').astype(str).to_numpy(dtype=str)
+
+    scientific_name = df['scientific_name'].astype(str).to_numpy(dtype=str)
+
+    projection = None
+    if pca_variance > 0:
+        dense = features if onehot is None else df[feature_names].to_numpy(dtype=np.float32)
+        projection = fit_projection(dense, pca_variance)
+
+    return MLCatalog(
+        feature_names=feature_names,
+        feature_index={name: i for i, name in enumerate(feature_names)},
+        features=features,
+        norms=norms,
+        scientific_name=scientific_name,
+        is_invasive=df['is_invasive'].to_numpy(dtype=np.int64),
+        name_index=build_name_index(scientific_name),
+        common_name=common_name,
+        onehot=onehot,
+        dense_columns=dense_columns,
+        onehot_columns=onehot_columns,
+        projection=projection,
+    )
+
+
+CATALOG_FORMAT = "ml-catalog/1"
+
+
+def catalog_to_arrays(catalog: MLCatalog) -> Tuple[dict, Dict[str, np.ndarray]]:
+    """Split a catalog into a JSON manifest and the arrays of its binary build."""
+    arrays = {
+        'features': catalog.features,
+        'norms': catalog.norms,
+        'scientific_name': catalog.scientific_name,
+        'is_invasive': catalog.is_invasive,
+    }
+    if catalog.common_name is not None:
+        arrays['common_name'] = catalog.common_name
+    if catalog.onehot is not None:
+        arrays['onehot_indptr'] = catalog.onehot.indptr
+        arrays['onehot_indices'] = catalog.onehot.indices
+        arrays['dense_columns'] = catalog.dense_columns
+        arrays['onehot_columns'] = catalog.onehot_columns
+    manifest = {'feature_names': list(catalog.feature_names)}
+    if catalog.projection is not None:
+        pca_manifest, pca_arrays = projection_to_arrays(catalog.projection)
+        manifest.update(pca_manifest)
+        arrays.update(pca_arrays)
+    return manifest, arrays
+
+
+def catalog_from_arrays(manifest: dict, arrays: Dict[str, np.ndarray]) -> MLCatalog:
+    """Rebuild a catalog over (possibly memory-mapped) arrays of a binary build."""
+    feature_names = manifest['feature_names']
+    onehot = None
+    if 'onehot_indptr' in arrays:
+        indices, indptr = arrays['onehot_indices'], arrays['onehot_indptr']
+        data = np.ones(indices.shape[0], dtype=np.float32)
+        shape = (indptr.shape[0] - 1, arrays['onehot_columns'].shape[0])
+        onehot = sparse.csr_matrix((data, indices, indptr), shape=shape, copy=False)
+    return MLCatalog(
+        feature_names=feature_names,
+        feature_index={name: i for i, name in enumerate(feature_names)},
+        features=arrays['features'],
+        norms=arrays['norms'],
+        scientific_name=arrays['scientific_name'],
+        is_invasive=arrays['is_invasive'],
+        name_index=build_name_index(arrays['scientific_name']),
+        common_name=arrays.get('common_name'),
+        onehot=onehot,
+        dense_columns=arrays.get('dense_columns'),
+        onehot_columns=arrays.get('onehot_columns'),
+        projection=projection_from_arrays(manifest, arrays),
+    )
+
+
+def build_catalog(path: str, cache_dir: Optional[str] = None) -> str:
+    """
+    Convert a vectorized species CSV into its binary build (one .npy per
+    array plus a manifest) and return the build directory. The build is
+    keyed by the CSV's SHA-256, so an up-to-date build is left untouched.
+    """
+    source_hash = binary_cache.file_sha256(path)
+    directory = binary_cache.build_directory(path, source_hash, cache_dir)
+    options = {'sparse_min_onehot': settings.ml_catalog_sparse_min_onehot, 'pca_variance': _pca_variance()}
+    existing = binary_cache.read_manifest(directory, CATALOG_FORMAT, source_hash)
+    # The layout depends on the sparse / PCA settings too: rebuild when they changed
+    if existing is None or existing.get('options') != options:
+        manifest, arrays = catalog_to_arrays(compile_catalog(pd.read_csv(path), **options))
+        manifest['options'] = options
+        if existing is not None:
+            binary_cache.remove_build(directory)
+        binary_cache.write_build(directory, CATALOG_FORMAT, source_hash, manifest, arrays)
+    return directory
+
+
+def load_ml_data(path: str) -> MLCatalog:
+    """
+    Load the catalog for a vectorized species CSV.
+    With the binary cache enabled, the build keyed by the CSV's hash is
+    memory-mapped (and rebuilt first if the CSV changed), so startup skips
+    CSV parsing and workers share the arrays through the page cache.
+    """
+    if not settings.ml_catalog_cache_enabled:
+        return compile_catalog(pd.read_csv(path))
+
+    try:
+        directory = build_catalog(path, settings.ml_catalog_cache_dir or None)
+    except OSError:
+        # Read-only or full filesystem: fall back to parsing the CSV
+        return compile_catalog(pd.read_csv(path))
+
+    manifest, arrays = binary_cache.open_build(directory)
+    return catalog_from_arrays(manifest, arrays)
+
+def set_ml_catalog(catalog: MLCatalog) -> None:
+    global _ml_catalog
+    _ml_catalog = catalog
+
+def get_ml_catalog() -> MLCatalog:
+    if _ml_catalog is None:
         raise RuntimeError("ML Data not loaded. Check lifespan in main.py")
-    return _ml_df
+    return _ml_catalog
 
-def unload_ml_df() -> None:
-    global _ml_df
-    _ml_df = None
\ No newline at end of file
+def unload_ml_catalog() -> None:
+    global _ml_catalog
+    _ml_catalog = None
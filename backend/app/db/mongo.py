@@ -1,25 +1,54 @@
-# '''
-# MongoDB client and database initialization
-# '''
-
-# from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
-# from app.core.config import settings
-
-# _client: AsyncIOMotorClient | None = None
-
-# def get_client() -> AsyncIOMotorClient:
-#     global _client
-#     if _client is None:
-#         _client = AsyncIOMotorClient(settings.mongo_uri)
-#     return _client
-
-# def get_db() -> AsyncIOMotorDatabase:
-#     client = get_client()
-#     print(f"Connected to MongoDB: {settings.mongo_uri}")
-#     return client[settings.mongo_db]
-
-# async def close_client() -> None:
-#     global _client
-#     if _client is not None:
-#         _client.close()
-#         _client = None
\ No newline at end of file
+'''
+MongoDB client and database initialization
+'''
+
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+
+from app.core.config import settings
+
+_client: Optional[AsyncIOMotorClient] = None
+_db: Optional[AsyncIOMotorDatabase] = None
+
+
+def open_db() -> AsyncIOMotorDatabase:
+    """
+    Create the pooled client and select the database. Call once in the app
+    lifespan; no connection is made until the first operation. A few warm
+    connections are kept, and a request waiting on a full pool fails after
+    MONGO_WAIT_QUEUE_TIMEOUT_MS instead of queueing without bound.
+    """
+    global _client, _db
+    if _db is None:
+        _client = AsyncIOMotorClient(
+            settings.mongo_uri,
+            maxPoolSize=settings.mongo_max_pool_size,
+            minPoolSize=settings.mongo_min_pool_size,
+            maxIdleTimeMS=settings.mongo_max_idle_time_ms,
+            waitQueueTimeoutMS=settings.mongo_wait_queue_timeout_ms,
+            serverSelectionTimeoutMS=settings.mongo_server_selection_timeout_ms,
+            appname=settings.app_name,
+        )
+        _db = _client[settings.mongo_db]
+    return _db
+
+
+def get_db() -> AsyncIOMotorDatabase:
+    if _db is None:
+        raise RuntimeError("MongoDB not open. Check lifespan in main.py")
+    return _db
+
+
+def set_db(db: Optional[AsyncIOMotorDatabase]) -> None:
+    """Serve queries from `db` (any Motor-compatible database), e.g. a test stand-in."""
+    global _db
+    _db = db
+
+
+def close_db() -> None:
+    global _client, _db
+    if _client is not None:
+        _client.close()
+        _client = None
+    _db = None
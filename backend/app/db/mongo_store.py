@@ -0,0 +1,130 @@
+'''
+Occurrence store on MongoDB (OCCURRENCE_STORE=mongo)
+
+Occurrences are documents {scientific_name, common_name, family, location}
+with `location` a GeoJSON point under a 2dsphere index (see indexes.py), so
+the table no longer has to fit in every worker's memory. A radius query is
+one aggregation: $geoNear streams the occurrences within the radius nearest
+first and $group keeps each species' first (nearest) one, so only one
+document per species leaves the server.
+'''
+
+from typing import List
+
+import numpy as np
+import pandas as pd
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.core.config import settings
+from app.core.metrics import ROWS, count, stage
+from app.db.csv_store import COORDINATE_DECIMALS, SCHEMA, SpeciesColumns
+
+INSERT_BATCH_ROWS = 10_000
+
+
+def _geo_near(lat: float, lng: float, radius_km: float) -> dict:
+    return {
+        "$geoNear": {
+            "near": {"type": "Point", "coordinates": [lng, lat]},
+            "distanceField": "distance_m",
+            "maxDistance": radius_km * 1000.0,
+            "spherical": True,
+            "key": "location",
+        }
+    }
+
+
+def species_near_pipeline(lat: float, lng: float, radius_km: float, limit: int) -> List[dict]:
+    """Unique species within radius_km, nearest first, deduplicated on the server."""
+    return [
+        _geo_near(lat, lng, radius_km),
+        # $geoNear emits nearest first, so $first is each species' nearest occurrence
+        {"$group": {
+            "_id": "$scientific_name",
+            "common_name": {"$first": "$common_name"},
+            "family": {"$first": "$family"},
+            "location": {"$first": "$location"},
+            "distance_m": {"$first": "$distance_m"},
+        }},
+        {"$sort": {"distance_m": 1, "_id": 1}},
+        {"$limit": limit},
+        {"$project": {"_id": 0, "scientific_name": "$_id", "common_name": 1, "family": 1, "location": 1, "distance_m": 1}},
+    ]
+
+
+def nearby_names_pipeline(lat: float, lng: float, radius_km: float) -> List[dict]:
+    """Distinct scientific names within radius_km."""
+    return [_geo_near(lat, lng, radius_km), {"$group": {"_id": "$scientific_name"}}]
+
+
+async def query_species_columns(
+    db: AsyncIOMotorDatabase,
+    lat: float,
+    lng: float,
+    radius_km: float = 5.0,
+    limit: int = 50,
+) -> SpeciesColumns:
+    """Same columns and order as csv_store.query_species_columns, from MongoDB."""
+    limit = min(max(limit, 1), 200)
+    with stage("species_mongo"):
+        cursor = db[settings.mongo_occurrences_collection].aggregate(species_near_pipeline(lat, lng, radius_km, limit))
+        docs = await cursor.to_list(length=limit)
+    count(ROWS, "species_by_location", "matched", amount=len(docs))
+
+    coordinates = np.array([d["location"]["coordinates"] for d in docs], dtype=np.float64).reshape(-1, 2)
+    return {
+        "scientific_name": np.array([d["scientific_name"] for d in docs], dtype=object),
+        "common_name": np.array([d.get("common_name") or "" for d in docs], dtype=object),
+        "family": np.array([d.get("family") or "" for d in docs], dtype=object),
+        "latitude": coordinates[:, 1],
+        "longitude": coordinates[:, 0],
+        "distance_km": np.array([d["distance_m"] for d in docs], dtype=np.float64) / 1000.0,
+    }
+
+
+async def nearby_species_names(db: AsyncIOMotorDatabase, lat: float, lng: float, radius_km: float) -> np.ndarray:
+    """Distinct scientific names with an occurrence within radius_km, unordered."""
+    with stage("local_occurrences"):
+        cursor = db[settings.mongo_occurrences_collection].aggregate(nearby_names_pipeline(lat, lng, radius_km))
+        docs = await cursor.to_list(length=None)
+    count(ROWS, "nearby_species", "matched", amount=len(docs))
+    return np.array([d["_id"] for d in docs if d["_id"]], dtype=object)
+
+
+def _strings(df: pd.DataFrame, col: str) -> np.ndarray:
+    if col not in df.columns:
+        return np.full(len(df), "", dtype=object)
+    return df[col].to_numpy(dtype=object)
+
+
+async def insert_occurrences(db: AsyncIOMotorDatabase, df: pd.DataFrame, batch_rows: int = INSERT_BATCH_ROWS) -> int:
+    """
+    Insert a loaded occurrence table (see csv_store.load_csv) in unordered
+    batches. Rows a 2dsphere index would reject (coordinates out of range)
+    are skipped. Returns the number of documents inserted.
+    """
+    collection = db[settings.mongo_occurrences_collection]
+    lat = df[SCHEMA.lat].to_numpy().astype(np.float64)
+    lng = df[SCHEMA.lng].to_numpy().astype(np.float64)
+    if df[SCHEMA.lat].dtype == np.float32:
+        lat, lng = np.round(lat, COORDINATE_DECIMALS), np.round(lng, COORDINATE_DECIMALS)
+    valid = np.flatnonzero((np.abs(lat) <= 90.0) & (np.abs(lng) <= 180.0))
+    names = _strings(df, SCHEMA.scientific_name)
+    common_names = _strings(df, SCHEMA.common_name)
+    families = _strings(df, SCHEMA.family)
+
+    inserted = 0
+    for start in range(0, valid.size, batch_rows):
+        rows = valid[start:start + batch_rows]
+        documents = [
+            {
+                "scientific_name": names[i],
+                "common_name": common_names[i],
+                "family": families[i],
+                "location": {"type": "Point", "coordinates": [float(lng[i]), float(lat[i])]},
+            }
+            for i in rows
+        ]
+        await collection.insert_many(documents, ordered=False)
+        inserted += len(documents)
+    return inserted
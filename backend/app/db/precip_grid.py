@@ -0,0 +1,151 @@
+'''
+Gridded annual precipitation (climatology) layer.
+
+A global (or regional) annual precipitation raster in ESRI ASCII grid
+format, e.g. WorldClim BIO12 exported to .asc, is converted once into a
+hash-keyed binary build (see binary_cache) and memory-mapped at startup.
+Lookups are bilinear interpolation between the four surrounding cell
+centers: a few index computations and four array reads, no I/O.
+'''
+
+import math
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.core.config import settings
+from app.db import binary_cache
+
+PRECIP_GRID_FORMAT = "precip-grid/1"
+ASCII_HEADER_KEYS = ("ncols", "nrows", "xllcorner", "yllcorner", "xllcenter", "yllcenter", "cellsize", "nodata_value")
+
+
+@dataclass(frozen=True)
+class PrecipGrid:
+    """Annual precipitation (mm) on a regular lat/lng grid; row 0 is the northern edge."""
+    values: np.ndarray   # (nrows, ncols) float32, NaN where there is no data
+    top: float           # latitude of the grid's northern edge
+    left: float          # longitude of the grid's western edge
+    cellsize: float
+
+    @property
+    def wraps(self) -> bool:
+        """True when the grid spans all longitudes, so columns wrap around."""
+        return math.isclose(self.values.shape[1] * self.cellsize, 360.0, abs_tol=self.cellsize / 2)
+
+    def value(self, lat: float, lng: float) -> Optional[float]:
+        """
+        Precipitation at a point, bilinear between cell centers. Neighbors
+        without data are left out (weights renormalized), so coasts still
+        get a value. None outside the grid or when no neighbor has data.
+        """
+        nrows, ncols = self.values.shape
+        fr = (self.top - lat) / self.cellsize - 0.5
+        fc = (lng - self.left) / self.cellsize - 0.5
+        if not -0.5 <= fr <= nrows - 0.5:
+            return None
+        if not self.wraps and not -0.5 <= fc <= ncols - 0.5:
+            return None
+
+        r0 = min(max(math.floor(fr), 0), nrows - 1)
+        r1 = min(r0 + 1, nrows - 1)
+        wr = min(max(fr - r0, 0.0), 1.0)
+        c0 = math.floor(fc)
+        wc = fc - c0
+        if self.wraps:
+            c0, c1 = c0 % ncols, (c0 + 1) % ncols
+        else:
+            c0 = min(max(c0, 0), ncols - 1)
+            c1 = min(c0 + 1, ncols - 1)
+            wc = min(max(fc - c0, 0.0), 1.0)
+
+        total = weight = 0.0
+        for r, c, w in (
+            (r0, c0, (1 - wr) * (1 - wc)),
+            (r0, c1, (1 - wr) * wc),
+            (r1, c0, wr * (1 - wc)),
+            (r1, c1, wr * wc),
+        ):
+            v = float(self.values[r, c])
+            if w > 0 and not math.isnan(v):
+                total += w * v
+                weight += w
+        return total / weight if weight > 0 else None
+
+
+def read_ascii_grid(path: str) -> Tuple[dict, np.ndarray]:
+    """Header (lower-cased keys) and float32 values of an ESRI ASCII grid; nodata becomes NaN."""
+    header: Dict[str, float] = {}
+    with open(path) as f:
+        while True:
+            pos = f.tell()
+            parts = f.readline().split()
+            if len(parts) != 2 or parts[0].lower() not in ASCII_HEADER_KEYS:
+                f.seek(pos)
+                break
+            header[parts[0].lower()] = float(parts[1])
+        values = pd.read_csv(f, sep=r"\s+", header=None, dtype=np.float32, engine="c").to_numpy()
+
+    nrows, ncols = int(header["nrows"]), int(header["ncols"])
+    if values.shape != (nrows, ncols):
+        raise ValueError(f"{path}: expected {nrows}x{ncols} values, got {values.shape[0]}x{values.shape[1]}")
+    if "nodata_value" in header:
+        values[values == np.float32(header["nodata_value"])] = np.nan
+    return header, np.ascontiguousarray(values)
+
+
+def grid_from_ascii(header: dict, values: np.ndarray) -> PrecipGrid:
+    cellsize = header["cellsize"]
+    if "xllcenter" in header:
+        left, bottom = header["xllcenter"] - cellsize / 2, header["yllcenter"] - cellsize / 2
+    else:
+        left, bottom = header["xllcorner"], header["yllcorner"]
+    return PrecipGrid(values=values, top=bottom + values.shape[0] * cellsize, left=left, cellsize=cellsize)
+
+
+def build_precip_grid(path: str, cache_dir: Optional[str] = None) -> str:
+    """
+    Convert an ASCII grid into its binary build (keyed by the file's SHA-256)
+    and return the build directory; an up-to-date build is left untouched.
+    """
+    source_hash = binary_cache.file_sha256(path)
+    directory = binary_cache.build_directory(path, source_hash, cache_dir)
+    if binary_cache.read_manifest(directory, PRECIP_GRID_FORMAT, source_hash) is None:
+        grid = grid_from_ascii(*read_ascii_grid(path))
+        manifest = {"top": grid.top, "left": grid.left, "cellsize": grid.cellsize}
+        binary_cache.write_build(directory, PRECIP_GRID_FORMAT, source_hash, manifest, {"values": grid.values})
+    return directory
+
+
+def load_precip_grid(path: str, cache_dir: Optional[str] = None) -> PrecipGrid:
+    """Memory-mapped grid for an ASCII grid file, building it first if needed."""
+    manifest, arrays = binary_cache.open_build(build_precip_grid(path, cache_dir))
+    return PrecipGrid(values=arrays["values"], top=manifest["top"], left=manifest["left"], cellsize=manifest["cellsize"])
+
+
+_precip_grid: Optional[PrecipGrid] = None
+
+
+def open_precip_grid() -> Optional[PrecipGrid]:
+    """Load the grid configured by PRECIP_GRID_PATH, if any. Call once in the app lifespan."""
+    global _precip_grid
+    if settings.precip_grid_path and _precip_grid is None:
+        _precip_grid = load_precip_grid(settings.precip_grid_path, settings.precip_grid_cache_dir or None)
+    return _precip_grid
+
+
+def get_precip_grid() -> Optional[PrecipGrid]:
+    """Returns the precipitation grid, or None when none is configured / opened."""
+    return _precip_grid
+
+
+def set_precip_grid(grid: Optional[PrecipGrid]) -> None:
+    global _precip_grid
+    _precip_grid = grid
+
+
+def close_precip_grid() -> None:
+    global _precip_grid
+    _precip_grid = None
@@ -0,0 +1,234 @@
+'''
+Named shared-memory hosting of loaded datasets across worker processes.
+
+One worker (whichever takes the file lock first) loads the datasets and
+publishes their arrays into a single named shared memory segment. Every
+other worker attaches to that segment and wraps read-only NumPy views
+around it, so N workers hold one copy of the data instead of N.
+
+References are held per process: the segment header lists the PID of
+every holder, and holders that no longer exist (a worker killed by a
+signal or the OOM killer never releases) are dropped whenever the list is
+read, so the last live process out still unlinks the segment. Segments
+whose holders have all died are reaped when datasets are next loaded.
+
+Segment layout:
+    [0:8)    int64 manifest length
+    [8:16)   reserved
+    [16:H)   int64 PID per held reference (0: free slot), guarded by the lock
+    [H:..)   manifest JSON: per group, a JSON "meta" and array offsets
+    aligned  raw array bytes
+'''
+
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import sys
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+HOLDER_SLOTS = 256  # references held at once, across all workers
+HEADER_SIZE = 16 + 8 * HOLDER_SLOTS
+ALIGNMENT = 64
+SHM_DIR = "/dev/shm"
+
+ArrayGroup = Tuple[dict, Dict[str, np.ndarray]]  # (JSON-able meta, arrays)
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _open_segment(name: str, create: bool = False, size: int = 0) -> shared_memory.SharedMemory:
+    """
+    Open a segment without handing it to multiprocessing's resource tracker,
+    which would otherwise unlink it when the first worker exits.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, create=create, size=size, track=False)
+    shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, owned by another user
+    return True
+
+
+def _holders(shm: shared_memory.SharedMemory) -> np.ndarray:
+    return np.ndarray((HOLDER_SLOTS,), dtype=np.int64, buffer=shm.buf, offset=16)
+
+
+def _drop_dead(holders: np.ndarray) -> None:
+    for slot in np.flatnonzero(holders):
+        if not _pid_alive(int(holders[slot])):
+            holders[slot] = 0
+
+
+def _hold(shm: shared_memory.SharedMemory) -> None:
+    """Record a reference of this process in the segment header."""
+    holders = _holders(shm)
+    _drop_dead(holders)
+    free = np.flatnonzero(holders == 0)
+    if free.size == 0:
+        del holders
+        raise RuntimeError(f"Shared segment {shm.name} has no free holder slot")
+    holders[free[0]] = os.getpid()
+    del holders
+
+
+@contextmanager
+def exclusive_lock(path: str) -> Iterator[None]:
+    """Cross-process lock serializing publish / attach / release."""
+    with open(path, "a+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class SharedDataset:
+    """A published (or attached) segment and the array groups it holds."""
+
+    def __init__(self, shm: shared_memory.SharedMemory, manifest: dict, owner: bool):
+        self.shm = shm
+        self.manifest = manifest
+        self.owner = owner  # True in the process that published the segment
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def nbytes(self) -> int:
+        return self.shm.size
+
+    def holders(self) -> List[int]:
+        """PIDs holding a reference, one entry per reference (dead ones included until dropped)."""
+        holders = _holders(self.shm)
+        pids = [int(pid) for pid in holders if pid]
+        del holders
+        return pids
+
+    @classmethod
+    def publish(cls, name: str, groups: Dict[str, ArrayGroup]) -> "SharedDataset":
+        """Copy the array groups into a new segment named `name`, held by this process."""
+        layout: Dict[str, dict] = {}
+        placed = []
+        offset = 0
+        for group, (meta, arrays) in groups.items():
+            entries = {}
+            for key, array in arrays.items():
+                array = np.ascontiguousarray(array)
+                offset = _align(offset)
+                entries[key] = {"offset": offset, "dtype": array.dtype.str, "shape": list(array.shape)}
+                placed.append((offset, array))
+                offset += array.nbytes
+            layout[group] = {"meta": meta, "arrays": entries}
+
+        manifest = json.dumps({"groups": layout}).encode("utf-8")
+        data_start = _align(HEADER_SIZE + len(manifest))
+        shm = _open_segment(name, create=True, size=max(data_start + offset, 1))
+
+        header = np.ndarray((1,), dtype=np.int64, buffer=shm.buf, offset=0)
+        header[0] = len(manifest)
+        del header
+        _hold(shm)
+        shm.buf[HEADER_SIZE:HEADER_SIZE + len(manifest)] = manifest
+        for array_offset, array in placed:
+            start = data_start + array_offset
+            shm.buf[start:start + array.nbytes] = array.reshape(-1).view(np.uint8)
+
+        return cls(shm, {"groups": layout, "data_start": data_start}, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> Optional["SharedDataset"]:
+        """Attach to an existing segment and take a reference, or None if it does not exist."""
+        try:
+            shm = _open_segment(name)
+        except FileNotFoundError:
+            return None
+        header = np.ndarray((1,), dtype=np.int64, buffer=shm.buf, offset=0)
+        manifest_len = int(header[0])
+        del header
+        _hold(shm)
+        layout = json.loads(bytes(shm.buf[HEADER_SIZE:HEADER_SIZE + manifest_len]))
+        data_start = _align(HEADER_SIZE + manifest_len)
+        return cls(shm, {"groups": layout["groups"], "data_start": data_start}, owner=False)
+
+    def group(self, group: str) -> ArrayGroup:
+        """Meta and read-only zero-copy views of one array group."""
+        entry = self.manifest["groups"][group]
+        arrays = {}
+        for key, spec in entry["arrays"].items():
+            view = np.ndarray(
+                tuple(spec["shape"]),
+                dtype=np.dtype(spec["dtype"]),
+                buffer=self.shm.buf,
+                offset=self.manifest["data_start"] + spec["offset"],
+            )
+            view.setflags(write=False)
+            arrays[key] = view
+        return entry["meta"], arrays
+
+    def release(self) -> bool:
+        """
+        Drop this process's reference; the last live holder out unlinks the
+        segment. Call under exclusive_lock. Returns True if it was unlinked.
+        """
+        holders = _holders(self.shm)
+        mine = np.flatnonzero(holders == os.getpid())
+        if mine.size:
+            holders[mine[0]] = 0
+        _drop_dead(holders)
+        last = not holders.any()
+        del holders
+        if last:
+            self.shm.unlink()
+        try:
+            self.shm.close()
+        except BufferError:
+            # Views are still referenced; the mapping goes away with the process
+            pass
+        return last
+
+    @staticmethod
+    def reap_orphans(prefix: str) -> List[str]:
+        """
+        Unlink the segments named `prefix`-* whose holders have all died,
+        e.g. after every worker was killed. Call under exclusive_lock.
+        Returns the names unlinked; a no-op where segments are not listed
+        in SHM_DIR.
+        """
+        try:
+            names = sorted(n for n in os.listdir(SHM_DIR) if n.startswith(f"{prefix}-"))
+        except OSError:
+            return []
+        reaped = []
+        for name in names:
+            try:
+                shm = _open_segment(name)
+            except (FileNotFoundError, ValueError):
+                continue
+            if shm.size >= HEADER_SIZE:
+                holders = _holders(shm)
+                _drop_dead(holders)
+                orphaned = not holders.any()
+                del holders
+                if orphaned:
+                    shm.unlink()
+                    reaped.append(name)
+            shm.close()
+        return reaped
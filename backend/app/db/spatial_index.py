@@ -0,0 +1,118 @@
+'''
+Uniform lat/lng grid index over occurrence coordinates
+'''
+
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+import numpy as np
+
+from app.core.geo import radius_to_deltas
+
+
+def _smallest_int_dtype(max_value: int) -> np.dtype:
+    return np.dtype(np.int32) if max_value < np.iinfo(np.int32).max else np.dtype(np.int64)
+
+
+@dataclass(frozen=True)
+class GridIndex:
+    """
+    Bucket index over fixed-size lat/lng cells.
+
+    Rows are sorted by cell key (lat_cell * n_lng + lng_cell), so the cells
+    of one latitude band covering a longitude interval form a contiguous key
+    range. A radius query therefore costs one binary search pair per band
+    (two where the interval wraps the antimeridian) plus the candidate rows.
+    """
+    cell_deg: float
+    n_lat: int
+    n_lng: int
+    keys: np.ndarray   # sorted cell keys
+    order: np.ndarray  # row positions in key order
+
+    def __len__(self) -> int:
+        return self.order.shape[0]
+
+    def to_arrays(self) -> Tuple[dict, Dict[str, np.ndarray]]:
+        """JSON-able meta and arrays, e.g. for publishing into shared memory."""
+        meta = {"cell_deg": self.cell_deg, "n_lat": self.n_lat, "n_lng": self.n_lng}
+        return meta, {"keys": self.keys, "order": self.order}
+
+    @classmethod
+    def from_arrays(cls, meta: dict, arrays: Dict[str, np.ndarray]) -> "GridIndex":
+        return cls(keys=arrays["keys"], order=arrays["order"], **meta)
+
+    def _lat_cell(self, lat: float) -> int:
+        return min(max(int(math.floor((lat + 90.0) / self.cell_deg)), 0), self.n_lat - 1)
+
+    def _lng_cell(self, lng: float) -> int:
+        return int(math.floor((lng + 180.0) / self.cell_deg)) % self.n_lng
+
+    def candidates(self, lat: float, lng: float, radius_km: float) -> np.ndarray:
+        """
+        Row positions of every point in the cells touched by the circle's
+        bounding box. A superset of the rows within radius_km; callers
+        still filter by exact distance.
+        """
+        if len(self) == 0:
+            return self.order[:0]
+
+        delta_lat, delta_lng = radius_to_deltas(lat, radius_km)
+        rows = np.arange(self._lat_cell(lat - delta_lat), self._lat_cell(lat + delta_lat) + 1)
+
+        if delta_lng >= 180.0 or 2 * delta_lng + self.cell_deg >= 360.0:
+            spans = [(0, self.n_lng - 1)]
+        else:
+            j0 = self._lng_cell(lng - delta_lng)
+            j1 = self._lng_cell(lng + delta_lng)
+            spans = [(j0, j1)] if j0 <= j1 else [(j0, self.n_lng - 1), (0, j1)]
+        return self._gather(rows, spans)
+
+    def box_candidates(self, min_lat: float, min_lng: float, max_lat: float, max_lng: float) -> np.ndarray:
+        """
+        Row positions of every point in the cells overlapping a lat/lng box
+        that does not cross the antimeridian. A superset of the rows inside.
+        """
+        if len(self) == 0:
+            return self.order[:0]
+        rows = np.arange(self._lat_cell(min_lat), self._lat_cell(max_lat) + 1)
+        j0 = self._lng_cell(min_lng)
+        # 180 is the eastern edge of the last column, not the first one again
+        j1 = min(int(math.floor((max_lng + 180.0) / self.cell_deg)), self.n_lng - 1)
+        return self._gather(rows, [(j0, max(j0, j1))])
+
+    def _gather(self, rows: np.ndarray, spans: list) -> np.ndarray:
+        """Rows of the cells in latitude bands `rows` and longitude cell spans [(j0, j1)]."""
+        starts = np.concatenate([rows * self.n_lng + j0 for j0, _ in spans])
+        ends = np.concatenate([rows * self.n_lng + j1 + 1 for _, j1 in spans])
+
+        lo = np.searchsorted(self.keys, starts, side="left")
+        hi = np.searchsorted(self.keys, ends, side="left")
+        slices = [self.order[a:b] for a, b in zip(lo, hi) if b > a]
+        if not slices:
+            return self.order[:0]
+        return np.concatenate(slices)
+
+
+def build_grid_index(lats: np.ndarray, lngs: np.ndarray, cell_deg: float) -> GridIndex:
+    """Bucket points into cell_deg x cell_deg cells. O(N log N), done once at load."""
+    n_lat = int(math.ceil(180.0 / cell_deg))
+    n_lng = int(math.ceil(360.0 / cell_deg))
+
+    lat_cells = np.clip(np.floor((np.asarray(lats, dtype=np.float64) + 90.0) / cell_deg), 0, n_lat - 1)
+    lng_cells = np.mod(np.floor((np.asarray(lngs, dtype=np.float64) + 180.0) / cell_deg), n_lng)
+
+    key_dtype = _smallest_int_dtype(n_lat * n_lng)
+    keys = (lat_cells.astype(np.int64) * n_lng + lng_cells.astype(np.int64)).astype(key_dtype)
+
+    order = np.argsort(keys, kind="stable").astype(_smallest_int_dtype(len(keys)))
+    return GridIndex(
+        cell_deg=cell_deg,
+        n_lat=n_lat,
+        n_lng=n_lng,
+        keys=keys[order],
+        order=order,
+    )
@@ -2,46 +2,63 @@
 FastAPI application for the Invasive Species Tracker
 '''
 
+import asyncio
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from app.core.config import settings
 from app.api.v1.api import router as api_router
-# from app.db.mongo import close_client, get_db
-# from app.db.indexes import ensure_indexes
-from app.db.csv_store import load_csv, set_df, unload_df
-from app.db.ml_store import load_ml_data, set_ml_df, unload_ml_df
+from app.api.v1.endpoints import metrics
+from app.core.metrics import ServerTimingMiddleware
+from app.core.http_client import open_http_client, close_http_client
+from app.core.rainfall_cache import open_rainfall_cache, close_rainfall_cache
+from app.core.gbif_cache import open_gbif_tile_cache, close_gbif_tile_cache
+from app.core.gbif_facets import open_species_names, close_species_names
+from app.core.risk_cache import open_risk_cache, close_risk_cache
+from app.core.tile_cache import open_tile_cache, close_tile_cache
+from app.db.mongo import open_db, close_db
+from app.db.indexes import ensure_indexes
+from app.db.precip_grid import open_precip_grid, close_precip_grid
+from app.db.datasets import load_datasets, unload_datasets, watch_datasets
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # db = get_db()
-    # await ensure_indexes(db)
-    # Note: CSV file path - update if your data is elsewhere
-    # For now, using empty CSV structure (GBIF will be used for location data)
-    try:
-        df = load_csv("app/db/invasive_species.csv")
-        set_df(df)
-    except (FileNotFoundError, ValueError):
-        # If CSV doesn't exist or is empty, create empty DataFrame
-        import pandas as pd
-        df = pd.DataFrame(columns=["latitude", "longitude", "scientific_name", "common_name", "family"])
-        set_df(df)
-    
-    # ML data file - located at root/notebooks/vectorized_species_master.csv
-    # From backend/app/main.py, go up to root: ../../notebooks/vectorized_species_master.csv
-    import os
-    backend_dir = os.path.dirname(os.path.dirname(__file__))  # backend/
-    root_dir = os.path.dirname(backend_dir)  # root/
-    ml_data_path = os.path.join(root_dir, "notebooks", "vectorized_species_master.csv")
-    ml_df = load_ml_data(ml_data_path)
-    set_ml_df(ml_df)
+    if settings.occurrence_store == "mongo":
+        # Pooled Motor client; the occurrence collection's 2dsphere index serves radius queries
+        await ensure_indexes(open_db())
+    # Occurrence CSV + spatial index and the ML catalog; with SHARED_MEMORY_ENABLED
+    # they are attached from (or published to) a segment shared by all workers
+    load_datasets()
+    # Optional file watcher: rebuild in the background and swap when the sources change
+    watcher = None
+    if settings.dataset_reload_interval_s > 0:
+        watcher = asyncio.create_task(watch_datasets(settings.dataset_reload_interval_s))
+
+    # Pooled keep-alive client shared by the GBIF / Open-Meteo fetchers
+    open_http_client()
+    open_rainfall_cache()
+    # Optional local climatology: rainfall lookups only fall back to Open-Meteo off-grid
+    open_precip_grid()
+    open_gbif_tile_cache()
+    open_species_names()
+    open_risk_cache()
+    open_tile_cache()
     yield
 
-    # await close_client()
-    unload_df()
-    unload_ml_df()
+    close_db()
+    if watcher is not None:
+        watcher.cancel()
+    await close_http_client()
+    close_rainfall_cache()
+    close_precip_grid()
+    close_gbif_tile_cache()
+    close_species_names()
+    close_risk_cache()
+    close_tile_cache()
+    unload_datasets()
 
 # Create FastAPI app
 app = FastAPI(title=settings.app_name, 
@@ -59,4 +76,9 @@ if settings.cors_origins:
         allow_headers=["*"],
     )
 
-app.include_router(api_router, prefix=settings.api_v1_prefix)
\ No newline at end of file
+# Per-stage Server-Timing header (passes straight through unless METRICS_ENABLED)
+app.add_middleware(ServerTimingMiddleware)
+
+app.include_router(api_router, prefix=settings.api_v1_prefix)
+# Prometheus scrapes /metrics at the root, outside the versioned API
+app.include_router(metrics.router)
\ No newline at end of file
@@ -0,0 +1,271 @@
+'''
+Nearest-profile index over the whole ML catalog (IVF with cluster bounds).
+
+Catalog rows are unit-normalized and clustered with spherical k-means; each
+cluster keeps an inverted list of its rows and its angular radius (the
+widest member's angle to the centroid). No row of a list can score above
+cos(max(0, angle(target, centroid) - radius)), so a search visits lists in
+order of that bound, scores their rows exactly, and stops as soon as the
+next bound cannot beat the k-th best score found: the result is then exact
+while most lists are never touched. `nprobe` caps the lists visited, which
+trades recall for latency on hard queries.
+
+The index is a hash-keyed binary build beside the ML dataset (see
+binary_cache), built on first use or with `python -m app.cli build-catalog-index`.
+'''
+
+import math
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from app.db import binary_cache
+from app.db.ml_store import MLCatalog
+from app.ml.risk_engine import cosine_scores
+
+CATALOG_INDEX_FORMAT = "ivf/1"
+CATALOG_INDEX_KIND = "ivf"
+TRAIN_ROWS_PER_LIST = 64
+ASSIGN_CHUNK_ROWS = 65_536
+PROBE_WAVE_LISTS = 8  # lists scored by the first step of a search; later steps double
+
+
+@dataclass(frozen=True)
+class IVFIndex:
+    centroids: np.ndarray     # (n_lists, n_features) float32 unit vectors
+    list_offsets: np.ndarray  # (n_lists + 1,) int64: list i holds list_rows[offsets[i]:offsets[i + 1]]
+    list_rows: np.ndarray     # (n_species,) int64 catalog rows grouped by list
+    list_radius: np.ndarray   # (n_lists,) float32 angle (radians) of each list's widest member
+    # (n_species, n_features) float32 unit rows in list order, so a list is one contiguous
+    # block; None for sparse-layout catalogs, whose rows are gathered from the catalog instead
+    vectors: Optional[np.ndarray] = None
+
+    @property
+    def n_lists(self) -> int:
+        return self.centroids.shape[0]
+
+    def bounds(self, unit_target: np.ndarray) -> np.ndarray:
+        """Upper bound of the cosine score of any row in each list."""
+        angles = np.arccos(np.clip(self.centroids @ unit_target, -1.0, 1.0))
+        return np.cos(np.maximum(angles - self.list_radius, 0.0))
+
+    def list_members(self, lists: np.ndarray) -> np.ndarray:
+        return np.concatenate([self.list_rows[self.list_offsets[i]:self.list_offsets[i + 1]] for i in lists])
+
+    def score_lists(self, catalog: MLCatalog, target_vec: np.ndarray, lists: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Catalog rows of `lists` and their exact cosine scores against the target."""
+        rows = self.list_members(lists)
+        if self.vectors is None:
+            return rows, cosine_scores(catalog, target_vec, rows, reduced=False)
+        norm = np.linalg.norm(target_vec)
+        unit = (target_vec / norm if norm > 0 else target_vec).astype(np.float32)
+        scores = [self.vectors[self.list_offsets[i]:self.list_offsets[i + 1]] @ unit for i in lists]
+        return rows, np.concatenate(scores)
+
+
+def _unit_rows(catalog: MLCatalog, rows: np.ndarray) -> np.ndarray:
+    features = catalog.dense_features(rows).astype(np.float32)
+    norms = catalog.norms[rows]
+    return features / np.where(norms > 0, norms, 1)[:, None]
+
+
+def train_ivf(catalog: MLCatalog, n_lists: int = 0, iterations: int = 10, seed: int = 0) -> IVFIndex:
+    """
+    Spherical k-means on a sample of the unit-normalized catalog rows, then
+    every row is filed under its closest centroid. `n_lists` 0 picks sqrt(n).
+    """
+    n = len(catalog)
+    if n_lists <= 0:
+        n_lists = int(round(math.sqrt(n)))
+    n_lists = max(1, min(n_lists, n))
+
+    rng = np.random.default_rng(seed)
+    sample = np.sort(rng.choice(n, size=min(n, n_lists * TRAIN_ROWS_PER_LIST), replace=False))
+    sample = sample[catalog.norms[sample] > 0]
+    if sample.size == 0:
+        sample = np.arange(n)
+    points = _unit_rows(catalog, sample)
+
+    centroids = points[rng.choice(points.shape[0], size=n_lists, replace=points.shape[0] < n_lists)]
+    for _ in range(iterations):
+        assignment = np.argmax(points @ centroids.T, axis=1)
+        membership = sparse.csr_matrix(
+            (np.ones(points.shape[0], dtype=np.float32), (assignment, np.arange(points.shape[0]))),
+            shape=(n_lists, points.shape[0]),
+        )
+        sums = np.asarray(membership @ points)
+        lengths = np.linalg.norm(sums, axis=1)
+        # Empty (or degenerate) clusters keep their previous centroid
+        filled = lengths > 0
+        centroids[filled] = sums[filled] / lengths[filled, None]
+    centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+
+    # File every row under its closest centroid, tracking each list's widest member
+    assignment = np.empty(n, dtype=np.int64)
+    min_cos = np.ones(n_lists, dtype=np.float32)
+    for start in range(0, n, ASSIGN_CHUNK_ROWS):
+        rows = np.arange(start, min(start + ASSIGN_CHUNK_ROWS, n))
+        cos = catalog.dot(centroids, rows) / np.where(catalog.norms[rows] > 0, catalog.norms[rows], 1)[:, None]
+        best = np.argmax(cos, axis=1)
+        assignment[rows] = best
+        # Zero-norm rows score 0 against anything; they do not widen the bound
+        live = catalog.norms[rows] > 0
+        np.minimum.at(min_cos, best[live], cos[live, best[live]])
+
+    list_rows = np.argsort(assignment, kind="stable").astype(np.int64)
+    list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=n_lists))]).astype(np.int64)
+    # A little slack absorbs float32 rounding so the bound stays an upper bound
+    list_radius = (np.arccos(np.clip(min_cos, -1.0, 1.0)) + 1e-3).astype(np.float32)
+
+    vectors = None
+    if catalog.onehot is None:
+        vectors = np.empty((n, len(catalog.feature_names)), dtype=np.float32)
+        for start in range(0, n, ASSIGN_CHUNK_ROWS):
+            vectors[start:start + ASSIGN_CHUNK_ROWS] = _unit_rows(catalog, list_rows[start:start + ASSIGN_CHUNK_ROWS])
+    return IVFIndex(
+        centroids=centroids,
+        list_offsets=list_offsets,
+        list_rows=list_rows,
+        list_radius=list_radius,
+        vectors=vectors,
+    )
+
+
+@dataclass(frozen=True)
+class CatalogSearch:
+    rows: np.ndarray     # sorted catalog rows that can appear in the top `need`
+    scores: np.ndarray   # their exact cosine scores
+    lists_probed: int    # 0: brute force over the whole catalog
+    candidates: int      # rows scored
+    exact: bool          # rows are guaranteed to hold the exact top `need`
+
+
+def search_catalog(
+    catalog: MLCatalog,
+    index: Optional[IVFIndex],
+    target_vec: np.ndarray,
+    need: int,
+    nprobe: int,
+    min_score: Optional[float] = None,
+) -> CatalogSearch:
+    """
+    Rows holding the `need` best matches for the target. Without an index
+    every row is scored (and returned). With one, at most `nprobe` lists
+    are probed in bound order and only rows scoring at least the need-th
+    best are returned; the search is exact when every list left out was
+    bounded below that score (or `min_score`).
+    """
+    if index is None:
+        rows = np.arange(len(catalog))
+        return CatalogSearch(rows, cosine_scores(catalog, target_vec, reduced=False), 0, len(catalog), True)
+
+    norm = np.linalg.norm(target_vec)
+    bounds = index.bounds(target_vec / norm if norm > 0 else target_vec)
+    order = np.argsort(-bounds, kind="stable")
+    floor = -np.inf if min_score is None else min_score
+    limit = max(1, min(nprobe, index.n_lists))
+
+    row_parts, score_parts, best = [], [], np.empty(0, dtype=np.float32)
+
+    def threshold() -> float:
+        # No list bounded below the need-th best score so far (or min_score) can change the top `need`
+        kth = best[0] if best.size >= need > 0 else -np.inf
+        return max(kth, floor)
+
+    probed = 0
+    while probed < limit and bounds[order[probed]] >= threshold():
+        wave = order[probed:min(probed + max(PROBE_WAVE_LISTS, probed), limit)]
+        rows, scores = index.score_lists(catalog, target_vec, wave)
+        row_parts.append(rows)
+        score_parts.append(scores)
+        best = np.concatenate([best, scores])
+        if best.size > need:
+            best = np.partition(best, best.size - need)[best.size - need:]
+        best = best[np.argsort(best)]  # ascending: best[0] is the need-th best
+        probed += wave.size
+
+    exact = probed == index.n_lists or bounds[order[probed]] < threshold()
+    if not row_parts:
+        return CatalogSearch(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), probed, 0, exact)
+
+    rows = np.concatenate(row_parts)
+    scores = np.concatenate(score_parts)
+    candidates = int(rows.size)
+    # Only rows tied with or above the need-th best can be ranked: sort just those
+    keep = scores >= threshold() if best.size >= need else np.ones(rows.size, dtype=bool)
+    rows, scores = rows[keep], scores[keep]
+    ordered = np.argsort(rows, kind="stable")
+    return CatalogSearch(rows[ordered], scores[ordered], probed, candidates, exact)
+
+
+def index_to_arrays(index: IVFIndex) -> Tuple[dict, Dict[str, np.ndarray]]:
+    arrays = {
+        'centroids': index.centroids,
+        'list_offsets': index.list_offsets,
+        'list_rows': index.list_rows,
+        'list_radius': index.list_radius,
+    }
+    if index.vectors is not None:
+        arrays['vectors'] = index.vectors
+    return {'n_lists': index.n_lists}, arrays
+
+
+def index_from_arrays(manifest: dict, arrays: Dict[str, np.ndarray]) -> IVFIndex:
+    return IVFIndex(
+        centroids=arrays['centroids'],
+        list_offsets=arrays['list_offsets'],
+        list_rows=arrays['list_rows'],
+        list_radius=arrays['list_radius'],
+        vectors=arrays.get('vectors'),
+    )
+
+
+def build_catalog_index(path: str, catalog: MLCatalog, n_lists: int = 0, cache_dir: Optional[str] = None) -> str:
+    """
+    Train the index for the catalog compiled from `path` and store it as a
+    binary build keyed by the CSV's SHA-256 (and `n_lists`); an up-to-date
+    build is left untouched. Returns the build directory.
+    """
+    source_hash = binary_cache.file_sha256(path)
+    directory = binary_cache.build_directory(path, source_hash, cache_dir, kind=CATALOG_INDEX_KIND)
+    existing = binary_cache.read_manifest(directory, CATALOG_INDEX_FORMAT, source_hash)
+    if existing is None or existing.get('requested_lists') != n_lists:
+        manifest, arrays = index_to_arrays(train_ivf(catalog, n_lists))
+        manifest['requested_lists'] = n_lists
+        if existing is not None:
+            binary_cache.remove_build(directory)
+        binary_cache.write_build(directory, CATALOG_INDEX_FORMAT, source_hash, manifest, arrays)
+    return directory
+
+
+def load_catalog_index(path: str, catalog: MLCatalog, n_lists: int = 0, cache_dir: Optional[str] = None) -> IVFIndex:
+    """Memory-mapped index for the catalog of `path`, building it first if needed."""
+    manifest, arrays = binary_cache.open_build(build_catalog_index(path, catalog, n_lists, cache_dir))
+    index = index_from_arrays(manifest, arrays)
+    if index.list_rows.shape[0] != len(catalog):
+        raise ValueError(f"Catalog index of {path} does not match the catalog ({len(catalog)} rows)")
+    return index
+
+
+# (catalog, index built from it): a reload swaps both in one assignment
+_catalog_index: Optional[Tuple[MLCatalog, IVFIndex]] = None
+
+
+def set_catalog_index(catalog: MLCatalog, index: Optional[IVFIndex]) -> None:
+    global _catalog_index
+    _catalog_index = (catalog, index) if index is not None else None
+
+
+def get_catalog_index(catalog: MLCatalog) -> Optional[IVFIndex]:
+    """The index built from `catalog`, or None (brute-force search)."""
+    current = _catalog_index
+    if current is None or current[0] is not catalog:
+        return None
+    return current[1]
+
+
+def unload_catalog_index() -> None:
+    global _catalog_index
+    _catalog_index = None
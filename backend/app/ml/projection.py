@@ -0,0 +1,100 @@
+'''
+PCA-reduced scoring space (productionized from notebooks/PCA.ipynb).
+
+The catalog build fits a PCA (centering plus projection onto the leading
+components) and stores the catalog pre-projected. A target profile is then
+projected once per request and dotted with the reduced rows; adding back
+the mean's contribution gives the dot product with each row's PCA
+reconstruction, which the cosine score divides by the norms of those
+reconstructions (precomputed here), so reduced scores stay within [-1, 1].
+'''
+
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from sklearn.decomposition import PCA
+
+
+@dataclass(frozen=True)
+class PCAProjection:
+    mean: np.ndarray         # (n_features,) float32 feature means
+    components: np.ndarray   # (n_components, n_features) float32 principal axes
+    reduced: np.ndarray      # (n_species, n_components) float32 centered, projected catalog rows
+    explained_variance: float
+    norms: np.ndarray        # (n_species,) float32 L2 norms of the reconstructed rows (reduced @ components + mean)
+
+    @property
+    def n_components(self) -> int:
+        return self.components.shape[0]
+
+    def dot(self, targets: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Approximate feature rows dotted with a target vector (n_features,) or
+        matrix (n_targets, n_features): reduced @ (P t) + mean . t.
+        """
+        reduced = self.reduced if rows is None else self.reduced[rows]
+        return reduced @ (targets @ self.components.T).T + targets @ self.mean
+
+
+def reconstruction_norms(mean: np.ndarray, components: np.ndarray, reduced: np.ndarray) -> np.ndarray:
+    """
+    ||reduced @ components + mean|| per row without materializing the
+    reconstruction: the components are orthonormal, so it is
+    ||z||^2 + 2 z . (components mean) + ||mean||^2.
+    """
+    z = reduced.astype(np.float64)
+    mean = mean.astype(np.float64)
+    squared = np.einsum('ij,ij->i', z, z) + 2.0 * (z @ (components.astype(np.float64) @ mean)) + mean @ mean
+    return np.sqrt(np.maximum(squared, 0.0)).astype(np.float32)
+
+
+def fit_projection(features: np.ndarray, variance: float) -> PCAProjection:
+    """Fit a PCA keeping the fewest components that explain `variance` of the features."""
+    n_components = None if variance >= 1.0 else variance
+    pca = PCA(n_components=n_components, svd_solver="full")
+    reduced = np.ascontiguousarray(pca.fit_transform(features), dtype=np.float32)
+    mean = pca.mean_.astype(np.float32)
+    components = np.ascontiguousarray(pca.components_, dtype=np.float32)
+    return PCAProjection(
+        mean=mean,
+        components=components,
+        reduced=reduced,
+        explained_variance=float(pca.explained_variance_ratio_.sum()),
+        norms=reconstruction_norms(mean, components, reduced),
+    )
+
+
+def projection_to_arrays(projection: PCAProjection) -> Tuple[dict, Dict[str, np.ndarray]]:
+    arrays = {
+        'pca_mean': projection.mean,
+        'pca_components': projection.components,
+        'pca_reduced': projection.reduced,
+        'pca_norms': projection.norms,
+    }
+    return {'pca_explained_variance': projection.explained_variance}, arrays
+
+
+def projection_from_arrays(manifest: dict, arrays: Dict[str, np.ndarray]) -> Optional[PCAProjection]:
+    if 'pca_reduced' not in arrays:
+        return None
+    norms = arrays.get('pca_norms')
+    if norms is None:  # builds made before the reconstruction norms were stored
+        norms = reconstruction_norms(arrays['pca_mean'], arrays['pca_components'], arrays['pca_reduced'])
+    return PCAProjection(
+        mean=arrays['pca_mean'],
+        components=arrays['pca_components'],
+        reduced=arrays['pca_reduced'],
+        explained_variance=manifest['pca_explained_variance'],
+        norms=norms,
+    )
+
+
+def top_k_overlap(exact: np.ndarray, approx: np.ndarray, k: int = 50) -> float:
+    """Share of the exact top-k rows that the approximate scores also rank in their top k."""
+    k = min(k, exact.shape[0])
+    if k == 0:
+        return 1.0
+    exact_top = np.argpartition(-exact, k - 1)[:k]
+    approx_top = np.argpartition(-approx, k - 1)[:k]
+    return np.intersect1d(exact_top, approx_top).size / k
@@ -1,27 +1,229 @@
-import pandas as pd
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from typing import List, Dict, Any
-
-def calculate_risk(ml_df: pd.DataFrame, dynamic_profile: Dict[str, float]) -> List[Dict[str, Any]]:
-    metadata_cols = ['scientific_name', 'is_invasive', 'common_name', 'image_url']
-    feature_cols = [c for c in ml_df.columns if c not in metadata_cols]
-    
-    matrix = ml_df[feature_cols].copy()
-    
-    target_vec = np.zeros((1, len(feature_cols)))
+from typing import List, Dict, Any, Optional, Tuple
+
+from app.core.config import settings
+from app.db.ml_store import MLCatalog
+
+HIGH_RISK_THRESHOLD = 0.65
+MODERATE_RISK_THRESHOLD = 0.45
+DEFAULT_TOP_K = 50
+
+
+def build_site_profile(is_urban: bool, biome_context: str, soil_ph: float, rainfall: float) -> Dict[str, float]:
+    """Translate site conditions into the dynamic target profile used for scoring."""
+    dynamic_profile = {}
+
+    dynamic_profile['native_region_count'] = 1.0 if is_urban else 0.5
+
+    norm_ph = np.clip((soil_ph - 3.0) / 6.0, 0, 1)
+    dynamic_profile['growth_ph_minimum'] = norm_ph
+    dynamic_profile['growth_ph_maximum'] = norm_ph
+
+    norm_rain = np.clip(rainfall / 3000.0, 0, 1)
+    dynamic_profile['growth_minimum_precipitation_mm'] = norm_rain
+
+    if biome_context == 'Grassland':
+        dynamic_profile['habit_Graminoid'] = 1.0
+    elif biome_context == 'Forest':
+        dynamic_profile['habit_Shrub'] = 1.0
+
+    return dynamic_profile
+
+
+def build_target_vector(catalog: MLCatalog, dynamic_profile: Dict[str, float]) -> np.ndarray:
+    """Place profile values into a dense vector aligned with the catalog features."""
+    target_vec = np.zeros(len(catalog.feature_names), dtype=np.float32)
     for feature, value in dynamic_profile.items():
-        if feature in feature_cols:
-            idx = feature_cols.index(feature)
-            target_vec[0, idx] = value
-            
-    scores = cosine_similarity(matrix, target_vec).flatten()
-    
-    results = ml_df[['scientific_name', 'is_invasive']].copy()
-    if 'common_name' in ml_df.columns:
-        results['common_name'] = ml_df['common_name']
-    
-    results['risk_score'] = scores
-    
-    top_risks = results.sort_values('risk_score', ascending=False).head(50)
-    return top_risks.to_dict(orient='records')
\ No newline at end of file
+        idx = catalog.feature_index.get(feature)
+        if idx is not None:
+            target_vec[idx] = value
+    return target_vec
+
+
+def build_target_matrix(catalog: MLCatalog, dynamic_profiles: List[Dict[str, float]]) -> np.ndarray:
+    """Stack one target vector per profile into an (n_profiles, n_features) matrix."""
+    if not dynamic_profiles:
+        return np.zeros((0, len(catalog.feature_names)), dtype=np.float32)
+    return np.stack([build_target_vector(catalog, p) for p in dynamic_profiles])
+
+
+def _use_reduced(catalog: MLCatalog, reduced: Optional[bool]) -> bool:
+    """Score in the PCA space? Defaults to RISK_SCORING_SPACE; needs a catalog built with a projection."""
+    if reduced is None:
+        reduced = settings.risk_scoring_space == "pca"
+    return reduced and catalog.projection is not None
+
+
+def _row_norms(catalog: MLCatalog, rows: Optional[np.ndarray], reduced: bool) -> np.ndarray:
+    """
+    Norms matching catalog.dot: of the PCA reconstructions in the reduced
+    space, with rows whose exact norm is 0 kept at 0 so they still score 0.
+    """
+    norms = catalog.norms if rows is None else catalog.norms[rows]
+    if not reduced:
+        return norms
+    projected = catalog.projection.norms if rows is None else catalog.projection.norms[rows]
+    return np.where(norms > 0, projected, np.float32(0))
+
+
+def cosine_scores(
+    catalog: MLCatalog,
+    target_vec: np.ndarray,
+    rows: Optional[np.ndarray] = None,
+    reduced: Optional[bool] = None,
+) -> np.ndarray:
+    """
+    Cosine similarity of catalog rows against the target vector.
+    Zero-norm rows (or a zero target) score 0, matching sklearn's cosine_similarity.
+    In the reduced (PCA) space this is the cosine with each row's PCA
+    reconstruction: approximate, but still within [-1, 1].
+    """
+    reduced = _use_reduced(catalog, reduced)
+    norms = _row_norms(catalog, rows, reduced)
+
+    dots = catalog.dot(target_vec, rows, reduced=reduced)
+    denom = norms * np.float32(np.linalg.norm(target_vec))
+    scores = np.zeros_like(dots)
+    np.divide(dots, denom, out=scores, where=denom > 0)
+    return scores
+
+
+def cosine_score_matrix(
+    catalog: MLCatalog,
+    targets: np.ndarray,
+    rows: Optional[np.ndarray] = None,
+    reduced: Optional[bool] = None,
+) -> np.ndarray:
+    """
+    Cosine similarity of catalog rows against every target at once:
+    one (n_rows, n_features) x (n_features, n_targets) product.
+    """
+    reduced = _use_reduced(catalog, reduced)
+    norms = _row_norms(catalog, rows, reduced)
+
+    dots = catalog.dot(targets, rows, reduced=reduced)
+    denom = np.outer(norms, np.linalg.norm(targets, axis=1).astype(np.float32))
+    scores = np.zeros_like(dots)
+    np.divide(dots, denom, out=scores, where=denom > 0)
+    return scores
+
+
+def risk_labels(scores: np.ndarray) -> np.ndarray:
+    """Vectorized High / Moderate / Low risk labelling of scores."""
+    return np.select(
+        [scores >= HIGH_RISK_THRESHOLD, scores >= MODERATE_RISK_THRESHOLD],
+        ["High Risk", "Moderate Risk"],
+        default="Low Risk",
+    ).astype(object)
+
+
+def top_k_indices(
+    scores: np.ndarray,
+    k: int = DEFAULT_TOP_K,
+    offset: int = 0,
+    min_score: Optional[float] = None,
+) -> Tuple[np.ndarray, int]:
+    """
+    Positions of the ranks [offset, offset + k) of `scores`, best first, plus
+    the number of eligible scores (those >= min_score, or all).
+
+    Selection is O(n) expected via a partition on the (offset + k)-th best
+    score; only the winners are sorted. Ties break by position, so pages
+    are consistent with a stable descending sort.
+    """
+    eligible = np.arange(scores.shape[0]) if min_score is None else np.flatnonzero(scores >= min_score)
+    total = int(eligible.size)
+    need = offset + k
+    if need <= 0 or offset >= total:
+        return eligible[:0], total
+
+    if need < total:
+        neg = -scores[eligible]
+        kth = np.partition(neg, need - 1)[need - 1]
+        better = np.flatnonzero(neg < kth)
+        ties = np.flatnonzero(neg == kth)[: need - better.size]
+        eligible = eligible[np.concatenate([better, ties])]
+
+    order = np.lexsort((eligible, -scores[eligible]))
+    return eligible[order][offset:need], total
+
+
+def rank_risk(
+    catalog: MLCatalog,
+    dynamic_profile: Dict[str, float],
+    rows: Optional[np.ndarray] = None,
+    k: int = DEFAULT_TOP_K,
+    offset: int = 0,
+    min_score: Optional[float] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Score catalog species (optionally only `rows`) against the profile and
+    return ranks [offset, offset + k) as columns: scientific_name,
+    common_name (None when the catalog has none), is_invasive, risk_score,
+    risk_label. See rank_scores for `total`.
+    """
+    if rows is None:
+        rows = np.arange(len(catalog))
+
+    target_vec = build_target_vector(catalog, dynamic_profile)
+    scores = cosine_scores(catalog, target_vec, rows)
+    return rank_scores(catalog, rows, scores, k=k, offset=offset, min_score=min_score)
+
+
+def rank_scores(
+    catalog: MLCatalog,
+    rows: np.ndarray,
+    scores: np.ndarray,
+    k: int = DEFAULT_TOP_K,
+    offset: int = 0,
+    min_score: Optional[float] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Page of precomputed `scores` for catalog `rows`, as rank_risk columns.
+    The extra 'total' entry holds the number of species eligible for ranking.
+    """
+    top, total = top_k_indices(scores, k=k, offset=offset, min_score=min_score)
+    top_rows = rows[top]
+    top_scores = scores[top].astype(np.float64)
+
+    if catalog.common_name is not None:
+        common_name = catalog.common_name[top_rows]
+    else:
+        common_name = np.full(top_rows.shape[0], None, dtype=object)
+
+    return {
+        'scientific_name': catalog.scientific_name[top_rows],
+        'common_name': common_name,
+        'is_invasive': catalog.is_invasive[top_rows],
+        'risk_score': top_scores,
+        'risk_label': risk_labels(top_scores),
+        'total': total,
+    }
+
+
+def calculate_risk(
+    catalog: MLCatalog,
+    dynamic_profile: Dict[str, float],
+    rows: Optional[np.ndarray] = None,
+    k: int = DEFAULT_TOP_K,
+    offset: int = 0,
+    min_score: Optional[float] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Score catalog species (optionally only `rows`) against the profile
+    and return ranks [offset, offset + k) by risk score as records.
+    """
+    ranked = rank_risk(catalog, dynamic_profile, rows, k=k, offset=offset, min_score=min_score)
+    has_common_name = catalog.common_name is not None
+
+    results = []
+    for i in range(ranked['risk_score'].shape[0]):
+        item = {
+            'scientific_name': ranked['scientific_name'][i],
+            'is_invasive': int(ranked['is_invasive'][i]),
+            'risk_score': float(ranked['risk_score'][i]),
+        }
+        if has_common_name:
+            item['common_name'] = ranked['common_name'][i]
+        results.append(item)
+    return results
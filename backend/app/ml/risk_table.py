@@ -0,0 +1,190 @@
+'''
+Profile-space lookup table of catalog-wide risk scores.
+
+A site profile depends on only three inputs: the biome (through soil pH and
+habit flags), the urban flag and the rainfall. The table holds the score of
+every catalog species for every (biome, urban, rainfall bucket), as one
+compact float16 array computed with a single matrix-matrix product when the
+datasets load. A scan then gathers its matched rows from the two buckets
+around the site's rainfall and interpolates between them; rainfall outside
+the table's range falls back to exact scoring. The build also measures the
+worst interpolation error (float16 rounding included), and lookup_scores
+rescores exactly the species within that margin of a risk label threshold,
+so labels always match exact scoring.
+'''
+
+import math
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from app.core.utils import estimate_soil_ph
+from app.db.ml_store import MLCatalog
+from app.ml.risk_engine import (
+    HIGH_RISK_THRESHOLD,
+    MODERATE_RISK_THRESHOLD,
+    build_site_profile,
+    build_target_matrix,
+    build_target_vector,
+    cosine_score_matrix,
+    cosine_scores,
+)
+
+# Biomes with their own soil pH / habit flags; any other biome scores like OTHER_BIOME
+TABLE_BIOMES = ("Desert", "Grassland", "Forest", "Rainforest", "Wetland", "Chaparral")
+OTHER_BIOME = "Other"
+# build_site_profile saturates rainfall here, so higher values share the last bucket
+RAINFALL_SATURATION_MM = 3000.0
+
+
+@dataclass(frozen=True)
+class RiskTable:
+    """Scores of all catalog rows per (biome, urban, rainfall bucket)."""
+    scores: np.ndarray      # (n_biomes, 2, n_buckets, n_species) float16
+    biomes: Tuple[str, ...]
+    rainfall_step_mm: float
+    rainfall_max_mm: float  # rainfall of the last bucket
+    label_margin: float = 0.0  # bound on |lookup - exact score|, measured at build
+
+    @property
+    def n_species(self) -> int:
+        return self.scores.shape[3]
+
+    def biome_position(self, biome: str) -> int:
+        try:
+            return self.biomes.index(biome)
+        except ValueError:
+            return self.biomes.index(OTHER_BIOME)
+
+    def lookup(self, biome: str, is_urban: bool, rainfall: float, rows: np.ndarray) -> Optional[np.ndarray]:
+        """
+        float32 scores of catalog `rows`, linearly interpolated between the
+        rainfall buckets around `rainfall`. None when the rainfall is off
+        the grid, so the caller computes exact scores instead.
+        """
+        if rainfall >= RAINFALL_SATURATION_MM and self.rainfall_max_mm >= RAINFALL_SATURATION_MM:
+            rainfall = RAINFALL_SATURATION_MM
+        if math.isnan(rainfall) or not 0.0 <= rainfall <= self.rainfall_max_mm:
+            return None
+
+        position = rainfall / self.rainfall_step_mm
+        b0 = min(int(position), self.scores.shape[2] - 1)
+        weight = np.float32(position - b0)
+        plane = self.scores[self.biome_position(biome), int(bool(is_urban))]
+
+        scores = plane[b0, rows].astype(np.float32)
+        if weight > 0 and b0 + 1 < plane.shape[0]:
+            scores += weight * (plane[b0 + 1, rows].astype(np.float32) - scores)
+        return scores
+
+    def near_thresholds(self, scores: np.ndarray) -> np.ndarray:
+        """Mask of scores whose risk label could differ from the exact score's."""
+        near = np.zeros(scores.shape, dtype=bool)
+        for threshold in (HIGH_RISK_THRESHOLD, MODERATE_RISK_THRESHOLD):
+            near |= np.abs(scores - np.float32(threshold)) <= self.label_margin
+        return near
+
+
+def lookup_scores(
+    table: RiskTable, catalog: MLCatalog, biome: str, is_urban: bool, rainfall: float, rows: np.ndarray,
+) -> Optional[np.ndarray]:
+    """
+    RiskTable.lookup, with the rows near a label threshold rescored exactly
+    against the site profile. None when the rainfall is off the grid.
+    """
+    scores = table.lookup(biome, is_urban, rainfall, rows)
+    if scores is None:
+        return None
+    near = np.flatnonzero(table.near_thresholds(scores))
+    if near.size:
+        profile = build_site_profile(is_urban, biome, estimate_soil_ph(biome), rainfall)
+        scores[near] = cosine_scores(catalog, build_target_vector(catalog, profile), rows[near])
+    return scores
+
+
+def build_risk_table(
+    catalog: MLCatalog,
+    rainfall_step_mm: float = 50.0,
+    rainfall_max_mm: float = RAINFALL_SATURATION_MM,
+) -> RiskTable:
+    """Score the whole catalog against every profile on the grid."""
+    biomes = TABLE_BIOMES + (OTHER_BIOME,)
+    n_buckets = int(math.floor(rainfall_max_mm / rainfall_step_mm + 1e-9)) + 1
+    rainfalls = np.arange(n_buckets) * rainfall_step_mm
+
+    def score_grid(grid: np.ndarray) -> np.ndarray:
+        profiles = [
+            build_site_profile(is_urban, biome, estimate_soil_ph(biome), float(rainfall))
+            for biome in biomes
+            for is_urban in (False, True)
+            for rainfall in grid
+        ]
+        scores = cosine_score_matrix(catalog, build_target_matrix(catalog, profiles))
+        # (n_species, profiles) -> (biome, urban, bucket, species): each bucket's row is contiguous
+        return scores.T.reshape(len(biomes), 2, len(grid), len(catalog))
+
+    table = score_grid(rainfalls).astype(np.float16)
+
+    # Interpolation error peaks between buckets: measure it at the midpoints
+    margin = 0.0
+    if n_buckets > 1:
+        stored = table.astype(np.float32)
+        midpoints = score_grid(rainfalls[:-1] + rainfall_step_mm / 2)
+        error = np.abs((stored[:, :, :-1] + stored[:, :, 1:]) / 2 - midpoints)
+        margin = float(np.nanmax(error)) if error.size else 0.0
+    # Headroom for error off the midpoints, plus one float16 step near 1
+    label_margin = 2.0 * margin + float(np.finfo(np.float16).eps)
+
+    return RiskTable(
+        scores=np.ascontiguousarray(table),
+        biomes=biomes,
+        rainfall_step_mm=float(rainfall_step_mm),
+        rainfall_max_mm=float(rainfalls[-1]),
+        label_margin=label_margin,
+    )
+
+
+def risk_table_to_arrays(table: RiskTable) -> Tuple[dict, Dict[str, np.ndarray]]:
+    manifest = {
+        'biomes': list(table.biomes),
+        'rainfall_step_mm': table.rainfall_step_mm,
+        'rainfall_max_mm': table.rainfall_max_mm,
+        'label_margin': table.label_margin,
+    }
+    return manifest, {'scores': table.scores}
+
+
+def risk_table_from_arrays(manifest: dict, arrays: Dict[str, np.ndarray]) -> RiskTable:
+    return RiskTable(
+        scores=arrays['scores'],
+        biomes=tuple(manifest['biomes']),
+        rainfall_step_mm=manifest['rainfall_step_mm'],
+        rainfall_max_mm=manifest['rainfall_max_mm'],
+        label_margin=manifest['label_margin'],
+    )
+
+
+# (catalog, table built from it): a reload swaps both in one assignment
+_risk_table: Optional[Tuple[MLCatalog, RiskTable]] = None
+
+
+def set_risk_table(catalog: MLCatalog, table: Optional[RiskTable]) -> None:
+    global _risk_table
+    _risk_table = (catalog, table) if table is not None else None
+
+
+def get_risk_table(catalog: MLCatalog) -> Optional[RiskTable]:
+    """
+    The lookup table built from `catalog`, or None when disabled. A request
+    still holding the catalog of a previous version gets None (exact scoring).
+    """
+    current = _risk_table
+    if current is None or current[0] is not catalog:
+        return None
+    return current[1]
+
+
+def unload_risk_table() -> None:
+    global _risk_table
+    _risk_table = None
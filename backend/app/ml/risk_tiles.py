@@ -0,0 +1,297 @@
+'''
+Gridded risk tiles for map overlays.
+
+An XYZ (Web Mercator) tile is split into grid x grid cells. Occurrences of
+the local store inside the tile are binned into cells, their names matched
+to catalog rows once per distinct name, and every distinct (cell, species)
+pair is scored against the profile of its cell in one matrix product over
+the distinct species and rainfalls. Rainfall is taken per cell from the
+precipitation grid where it covers the cell, else from the tile center.
+Each cell reports the max and mean risk of its species and their number.
+'''
+
+import asyncio
+import json
+import math
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.core.geo import MAX_TILE_LAT, tile_bounds
+from app.core.metrics import ROWS, UPSTREAM_FALLBACKS, count, stage
+from app.core.utils import RAINFALL_FALLBACK_MM, estimate_soil_ph, lookup_rainfall_async
+from app.db.csv_store import SCHEMA
+from app.db.ml_store import MLCatalog, normalize_scientific_name
+from app.db.precip_grid import PrecipGrid, get_precip_grid
+from app.db.spatial_index import GridIndex
+from app.ml.risk_engine import build_site_profile, build_target_matrix, cosine_score_matrix
+
+SCORE_DECIMALS = 4
+
+
+@dataclass(frozen=True)
+class TileSpecies:
+    """Distinct (cell, catalog row) pairs observed in a tile, sorted by cell."""
+    cells: np.ndarray  # (n_pairs,) int64 cell ids: row * grid + column, row 0 at the northern edge
+    rows: np.ndarray   # (n_pairs,) int64 catalog rows
+    occurrences: int   # occurrences inside the tile, matched to the catalog or not
+
+
+@dataclass(frozen=True)
+class RiskTile:
+    max: np.ndarray      # (grid, grid) float32 highest risk per cell, NaN where nothing matched
+    mean: np.ndarray     # (grid, grid) float32 mean risk per cell, NaN where nothing matched
+    species: np.ndarray  # (grid, grid) int32 distinct catalog species per cell
+
+
+def tile_extent(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """Tile bounds, stretched to the poles for the first/last tile row."""
+    min_lat, min_lng, max_lat, max_lng = tile_bounds(z, x, y)
+    if y == 0:
+        max_lat = 90.0
+    if y == (1 << z) - 1:
+        min_lat = -90.0
+    return min_lat, min_lng, max_lat, max_lng
+
+
+def tile_coordinates(lats: np.ndarray, lngs: np.ndarray, z: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fractional global tile coordinates (x, y) of points at zoom z; the
+    integer parts are the tile. Latitudes beyond the Mercator limit clamp
+    to the first/last tile row.
+    """
+    n = 1 << z
+    lat = np.radians(np.clip(np.asarray(lats, dtype=np.float64), -MAX_TILE_LAT, MAX_TILE_LAT))
+    xf = np.mod((np.asarray(lngs, dtype=np.float64) + 180.0) / 360.0 * n, n)
+    yf = (1.0 - np.arcsinh(np.tan(lat)) / math.pi) / 2.0 * n
+    return xf, np.clip(yf, 0.0, np.nextafter(n, 0))
+
+
+def cell_centers(z: int, x: int, y: int, grid: int, cells: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Latitude and longitude of the centers of `cells` (ids as in TileSpecies)."""
+    n = 1 << z
+    row, col = np.divmod(np.asarray(cells, dtype=np.int64), grid)
+    lngs = (x + (col + 0.5) / grid) / n * 360.0 - 180.0
+    lats = np.degrees(np.arctan(np.sinh(math.pi * (1.0 - 2.0 * (y + (row + 0.5) / grid) / n))))
+    return lats, lngs
+
+
+def _distinct(values: np.ndarray, is_sorted: bool = False) -> np.ndarray:
+    """Sorted distinct values (a sort and a mask: cheaper than np.unique's hashing here)."""
+    values = values if is_sorted else np.sort(values)
+    if values.size == 0:
+        return values
+    return values[np.concatenate([[True], values[1:] != values[:-1]])]
+
+
+def tile_species(df: pd.DataFrame, index: GridIndex, catalog: MLCatalog, z: int, x: int, y: int, grid: int) -> TileSpecies:
+    """Bin the tile's occurrences into cells and match their names to the catalog."""
+    candidates = index.box_candidates(*tile_extent(z, x, y))
+    xf, yf = tile_coordinates(
+        df[SCHEMA.lat].to_numpy()[candidates],
+        df[SCHEMA.lng].to_numpy()[candidates],
+        z,
+    )
+    inside = (np.floor(xf) == x) & (np.floor(yf) == y)
+    rows = candidates[inside]
+    count(ROWS, "risk_tile", "scanned", amount=int(candidates.size))
+    empty = np.empty(0, dtype=np.int64)
+    if rows.size == 0:
+        return TileSpecies(empty, empty, 0)
+
+    cells = (
+        np.minimum(((yf[inside] - y) * grid).astype(np.int64), grid - 1) * grid
+        + np.minimum(((xf[inside] - x) * grid).astype(np.int64), grid - 1)
+    )
+    # Name codes shifted by one, so 0 stands for a missing name
+    values = df[SCHEMA.scientific_name].array
+    if isinstance(values, pd.Categorical):
+        codes, categories = values.codes[rows].astype(np.int64) + 1, values.categories
+    else:
+        codes, categories = pd.factorize(df[SCHEMA.scientific_name].to_numpy()[rows])
+        codes = codes.astype(np.int64) + 1
+    space = len(categories) + 1
+
+    # Distinct (cell, name) pairs, sorted by cell
+    pair_cells, pair_codes = np.divmod(_distinct(cells * space + codes), space)
+
+    # Catalog rows of each distinct name, as a CSR-like (offsets, flat rows) pair
+    used = _distinct(pair_codes)
+    names = np.asarray(categories.take(np.maximum(used - 1, 0)), dtype=object)
+    matched = [
+        catalog.name_index.get(normalize_scientific_name(name), ()) if code > 0 else ()
+        for code, name in zip(used, names)
+    ]
+    lengths = np.array([len(m) for m in matched], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    flat = np.fromiter((r for m in matched for r in m), dtype=np.int64, count=int(offsets[-1]))
+
+    # One pair per catalog row of the name
+    position = np.searchsorted(used, pair_codes)
+    repeats = lengths[position]
+    within = np.arange(int(repeats.sum())) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+    count(ROWS, "risk_tile", "matched", amount=int(within.size))
+    return TileSpecies(
+        cells=np.repeat(pair_cells, repeats),
+        rows=flat[np.repeat(offsets[position], repeats) + within],
+        occurrences=int(rows.size),
+    )
+
+
+def cell_rainfall(
+    z: int, x: int, y: int, grid: int, cells: np.ndarray, fallback: float, precip: Optional[PrecipGrid] = None,
+) -> np.ndarray:
+    """Rainfall of each cell: the grid value at its center where covered, else `fallback`."""
+    rainfall = np.full(cells.shape[0], fallback, dtype=np.float64)
+    if precip is not None:
+        for i, (lat, lng) in enumerate(zip(*cell_centers(z, x, y, grid, cells))):
+            value = precip.value(float(lat), float(lng))
+            if value is not None:
+                rainfall[i] = value
+    return rainfall
+
+
+def score_tile(
+    catalog: MLCatalog,
+    found: TileSpecies,
+    grid: int,
+    biome: str,
+    is_urban: bool,
+    cells: np.ndarray,
+    rainfall: np.ndarray,
+) -> RiskTile:
+    """
+    Per-cell max / mean risk of the tile's species. `cells` are the distinct
+    cells of `found` and `rainfall` theirs; rainfall is rounded to whole mm
+    so neighboring cells share a profile.
+    """
+    out_max = np.full(grid * grid, np.nan, dtype=np.float32)
+    out_mean = np.full(grid * grid, np.nan, dtype=np.float32)
+    out_species = np.zeros(grid * grid, dtype=np.int32)
+    if found.rows.size == 0:
+        return RiskTile(out_max.reshape(grid, grid), out_mean.reshape(grid, grid), out_species.reshape(grid, grid))
+
+    soil_ph = estimate_soil_ph(biome)
+    rain_values, cell_profile = np.unique(np.round(rainfall), return_inverse=True)
+    targets = build_target_matrix(
+        catalog, [build_site_profile(is_urban, biome, soil_ph, float(r)) for r in rain_values]
+    )
+    species_rows = _distinct(found.rows)
+    # (distinct species, distinct profiles): every pair is one lookup into it
+    matrix = cosine_score_matrix(catalog, targets, rows=species_rows)
+    scores = matrix[np.searchsorted(species_rows, found.rows), cell_profile[np.searchsorted(cells, found.cells)]]
+
+    # Pairs are sorted by cell, so each cell is one contiguous run
+    starts = np.searchsorted(found.cells, cells)
+    sizes = np.diff(np.append(starts, found.cells.size))
+    out_max[cells] = np.maximum.reduceat(scores, starts)
+    out_mean[cells] = np.add.reduceat(scores.astype(np.float64), starts) / sizes
+    out_species[cells] = sizes
+    return RiskTile(out_max.reshape(grid, grid), out_mean.reshape(grid, grid), out_species.reshape(grid, grid))
+
+
+def _grid_json(values: np.ndarray) -> list:
+    rounded = np.round(values.astype(np.float64), SCORE_DECIMALS).astype(object)
+    rounded[np.isnan(values)] = None
+    return rounded.tolist()
+
+
+def tile_json(meta: dict, tile: RiskTile) -> bytes:
+    """Tile body: meta plus the max / mean / species grids, row 0 at the northern edge."""
+    return json.dumps(
+        {"meta": meta, "max": _grid_json(tile.max), "mean": _grid_json(tile.mean), "species": tile.species.tolist()},
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def _bin_tile(
+    df: pd.DataFrame, index: GridIndex, catalog: MLCatalog, z: int, x: int, y: int, grid: int,
+) -> Tuple[TileSpecies, np.ndarray, int]:
+    """tile_species plus its distinct cells and number of distinct species."""
+    with stage("tile_bin"):
+        found = tile_species(df, index, catalog, z, x, y, grid)
+    return found, _distinct(found.cells, is_sorted=True), int(_distinct(found.rows).size)
+
+
+def _finish_tile(
+    catalog: MLCatalog,
+    found: TileSpecies,
+    cells: np.ndarray,
+    z: int, x: int, y: int,
+    grid: int,
+    biome: str,
+    is_urban: bool,
+    center: Optional[float],
+    precip: Optional[PrecipGrid],
+    meta: dict,
+) -> bytes:
+    """Per-cell rainfall, scores and the serialized tile, once the center rainfall is known."""
+    rainfall = np.empty(0, dtype=np.float64)
+    if center is not None:
+        with stage("tile_rainfall"):
+            rainfall = cell_rainfall(z, x, y, grid, cells, center, precip)
+    with stage("score"):
+        tile = score_tile(catalog, found, grid, biome, is_urban, cells, rainfall)
+    with stage("serialize"):
+        return tile_json(meta, tile)
+
+
+async def render_tile(
+    df: pd.DataFrame,
+    index: GridIndex,
+    catalog: MLCatalog,
+    z: int, x: int, y: int,
+    grid: int,
+    biome: str,
+    is_urban: bool,
+) -> Tuple[bytes, bool]:
+    """
+    Serialized risk tile, and whether it may be cached: not when the
+    rainfall lookup failed and the tile was scored with the fallback
+    rainfall. Rainfall is only looked up for tiles with matched species:
+    once at the tile center, plus per cell from the precipitation grid when
+    one is loaded. Binning and scoring run in a worker thread (a low-zoom
+    tile covers most of the occurrence table); only the rainfall lookup
+    runs on the event loop.
+    """
+    found, cells, n_species = await asyncio.to_thread(_bin_tile, df, index, catalog, z, x, y, grid)
+
+    meta = {
+        "z": z, "x": x, "y": y, "grid": grid,
+        "biome": biome,
+        "is_urban": is_urban,
+        "occurrences": found.occurrences,
+        "species": n_species,
+        "rainfall_used": None,
+        "rainfall_source": None,
+    }
+    center = None
+    cacheable = True
+    precip = get_precip_grid()
+    if cells.size > 0:
+        min_lat, min_lng, max_lat, max_lng = tile_bounds(z, x, y)
+        center = await lookup_rainfall_async((min_lat + max_lat) / 2, (min_lng + max_lng) / 2)
+        meta["rainfall_source"] = "precip_grid" if precip is not None else "tile_center"
+        if center is None:
+            count(UPSTREAM_FALLBACKS, "open_meteo")
+            center, cacheable = RAINFALL_FALLBACK_MM, False
+            meta["rainfall_source"] = "fallback"
+        meta["rainfall_used"] = center
+
+    body = await asyncio.to_thread(
+        _finish_tile, catalog, found, cells, z, x, y, grid, biome, is_urban, center, precip, meta
+    )
+    return body, cacheable
+
+
+def popular_tiles(df: pd.DataFrame, z: int, limit: int) -> List[Tuple[int, int]]:
+    """The `limit` tiles of zoom z holding the most occurrences, busiest first."""
+    if len(df) == 0:
+        return []
+    xf, yf = tile_coordinates(df[SCHEMA.lat].to_numpy(), df[SCHEMA.lng].to_numpy(), z)
+    n = 1 << z
+    keys, counts = np.unique(np.floor(yf).astype(np.int64) * n + np.floor(xf).astype(np.int64), return_counts=True)
+    busiest = keys[np.argsort(-counts, kind="stable")[:limit]]
+    return [(int(key % n), int(key // n)) for key in busiest]
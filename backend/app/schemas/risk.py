@@ -1,5 +1,5 @@
 from typing import Optional, List
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class RiskAnalysisRequest(BaseModel):
@@ -7,7 +7,21 @@ class RiskAnalysisRequest(BaseModel):
     lng: float
     biome_context: str
     is_urban: bool = False
-    radius_km: float = 50.0
+    radius_km: float = Field(50.0, gt=0, description="Search radius in km")
+    k: int = Field(50, ge=1, le=1000, description="Number of ranked species to return")
+    offset: int = Field(0, ge=0, description="Rank of the first returned species (for paging)")
+    min_score: Optional[float] = Field(None, ge=-1, le=1, description="Only rank species scoring at least this")
+
+class CatalogRiskRequest(BaseModel):
+    lat: float
+    lng: float
+    biome_context: str
+    is_urban: bool = False
+    k: int = Field(50, ge=1, le=1000, description="Number of ranked species to return")
+    offset: int = Field(0, ge=0, description="Rank of the first returned species (for paging)")
+    min_score: Optional[float] = Field(None, ge=-1, le=1, description="Only rank species scoring at least this")
+    nprobe: Optional[int] = Field(None, ge=1, description="Index lists to search (recall vs latency); default CATALOG_INDEX_NPROBE")
+    exact: bool = Field(False, description="Brute-force search over the whole catalog")
 
 class RiskResultItem(BaseModel):
     scientific_name: str
@@ -18,4 +32,7 @@ class RiskResultItem(BaseModel):
 
 class RiskAnalysisResponse(BaseModel):
     meta: dict
-    results: List[RiskResultItem]
\ No newline at end of file
+    results: List[RiskResultItem]
+
+class RiskBatchResponse(BaseModel):
+    sites: List[RiskAnalysisResponse]
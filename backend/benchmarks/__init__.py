@@ -0,0 +1,4 @@
+'''
+Offline benchmark suite: synthetic datasets, local upstream stand-ins and
+a runner that writes comparable JSON results. See benchmarks/run.py.
+'''
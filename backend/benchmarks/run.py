@@ -0,0 +1,480 @@
+'''
+Offline benchmark runner
+
+    python -m benchmarks.run run --occurrences 1e3,1e5 --species 1e2,1e4 --out bench.json
+    python -m benchmarks.run compare before.json after.json
+    python -m benchmarks.run record benchmarks/payloads   # needs network, once
+
+Each benchmark reports throughput and p50/p95/p99 latency. HTTP benchmarks
+drive the ASGI app in-process through httpx, with GBIF and Open-Meteo
+served by a local UpstreamStub, so results measure this service only.
+'''
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Awaitable, Callable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.core.config import settings
+from benchmarks.stubs import (
+    GBIF_PAYLOAD_FILE,
+    OPEN_METEO_PAYLOAD_FILE,
+    UpstreamStub,
+    synthetic_gbif_payload,
+    synthetic_rainfall_payload,
+)
+from benchmarks.synthetic import make_catalog, make_occurrences, species_names
+
+BIOMES = ["Grassland", "Forest", "Desert", "Rainforest", "Wetland", "Chaparral"]
+CENTER = (37.77, -122.42)
+
+
+def summarize(benchmark: str, params: dict, samples_s: List[float], wall_s: float) -> dict:
+    """Throughput over the wall time plus latency percentiles of the samples."""
+    ms = np.asarray(samples_s) * 1000.0
+    return {
+        "benchmark": benchmark,
+        "params": params,
+        "n": int(ms.size),
+        "throughput_per_s": ms.size / wall_s if wall_s > 0 else None,
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+    }
+
+
+def _time_calls(fn: Callable[[], object], n: int) -> tuple:
+    samples = []
+    start = time.perf_counter()
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return samples, time.perf_counter() - start
+
+
+async def _time_requests(send: Callable[[int], Awaitable[object]], n: int, concurrency: int) -> tuple:
+    """Run `send(i)` for i < n with at most `concurrency` in flight."""
+    samples: List[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> None:
+        async with semaphore:
+            t0 = time.perf_counter()
+            await send(i)
+            samples.append(time.perf_counter() - t0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(n)])
+    return samples, time.perf_counter() - start
+
+
+def bench_load_csv(path: str, repeats: int) -> tuple:
+    from app.db.csv_store import load_csv
+
+    return _time_calls(lambda: load_csv(path), repeats)
+
+
+def bench_calculate_risk(catalog, n: int, seed: int = 0) -> tuple:
+    from app.ml.risk_engine import build_site_profile, calculate_risk
+
+    rng = np.random.default_rng(seed)
+    profiles = [
+        build_site_profile(bool(rng.integers(0, 2)), BIOMES[i % len(BIOMES)], rng.uniform(4, 8), rng.uniform(0, 3000))
+        for i in range(n)
+    ]
+    it = iter(profiles)
+    return _time_calls(lambda: calculate_risk(catalog, next(it)), n)
+
+
+def bench_catalog_layouts(n_species: int, onehot_columns: int, n: int, seed: int = 0) -> List[dict]:
+    """calculate_risk latency and feature memory of the dense vs sparse one-hot layouts."""
+    from app.db.ml_store import compile_catalog
+
+    catalog_df = make_catalog(n_species, seed=seed, extra_onehot=onehot_columns)
+    results = []
+    for layout, sparse_min_onehot in (("dense", 0), ("sparse", 1)):
+        catalog = compile_catalog(catalog_df, sparse_min_onehot=sparse_min_onehot)
+        samples, wall = bench_calculate_risk(catalog, n, seed=seed)
+        params = {"species": n_species, "onehot_columns": onehot_columns, "layout": layout}
+        result = summarize("catalog_layout", params, samples, wall)
+        result["feature_mb"] = catalog.feature_bytes / 2**20
+        results.append(result)
+    return results
+
+
+def bench_pca_scoring(catalog_df: pd.DataFrame, variance: float, n: int, seed: int = 0) -> List[dict]:
+    """Full-catalog scoring latency, exact vs PCA space, and the top-50 overlap of the two rankings."""
+    from app.db.ml_store import compile_catalog
+    from app.ml.projection import top_k_overlap
+    from app.ml.risk_engine import build_site_profile, build_target_vector, cosine_scores
+
+    n_species = len(catalog_df)
+    catalog = compile_catalog(catalog_df, pca_variance=variance)
+    rng = np.random.default_rng(seed)
+    targets = [
+        build_target_vector(catalog, build_site_profile(
+            bool(rng.integers(0, 2)), BIOMES[i % len(BIOMES)], rng.uniform(4, 8), rng.uniform(0, 3000)
+        ))
+        for i in range(n)
+    ]
+
+    results = []
+    for space, reduced in (("exact", False), ("pca", True)):
+        it = iter(targets)
+        samples, wall = _time_calls(lambda: cosine_scores(catalog, next(it), reduced=reduced), n)
+        params = {"species": n_species, "pca_variance": variance, "space": space}
+        results.append(summarize("pca_scoring", params, samples, wall))
+
+    results[1]["components"] = catalog.projection.n_components
+    results[1]["top50_overlap"] = float(np.mean([
+        top_k_overlap(cosine_scores(catalog, t, reduced=False), cosine_scores(catalog, t, reduced=True))
+        for t in targets
+    ]))
+    return results
+
+
+def bench_catalog_search(n_species: int, nprobes: List[int], n: int, seed: int = 0) -> List[dict]:
+    """Catalog-wide top-50 search: brute force vs the IVF index at each nprobe, with recall@50."""
+    from app.db.ml_store import compile_catalog
+    from app.ml.catalog_index import search_catalog, train_ivf
+    from app.ml.risk_engine import build_site_profile, build_target_vector, top_k_indices
+
+    catalog = compile_catalog(make_catalog(n_species, seed=seed))
+    index = train_ivf(catalog, seed=seed)
+    rng = np.random.default_rng(seed)
+    targets = [
+        build_target_vector(catalog, build_site_profile(
+            bool(rng.integers(0, 2)), BIOMES[i % len(BIOMES)], rng.uniform(4, 8), rng.uniform(0, 3000)
+        ))
+        for i in range(n)
+    ]
+
+    def top50(found) -> set:
+        return set(found.rows[top_k_indices(found.scores, 50)[0]].tolist())
+
+    exact = [top50(search_catalog(catalog, None, t, need=50, nprobe=0)) for t in targets]
+    results = []
+    for nprobe in [0, *nprobes]:
+        used = None if nprobe == 0 else index
+        it = iter(targets)
+        samples, wall = _time_calls(lambda: search_catalog(catalog, used, next(it), need=50, nprobe=nprobe), n)
+        result = summarize("catalog_search", {"species": n_species, "nprobe": nprobe or "brute_force"}, samples, wall)
+        found = [top50(search_catalog(catalog, used, t, need=50, nprobe=nprobe)) for t in targets]
+        result["recall_at_50"] = float(np.mean([len(f & e) / 50 for f, e in zip(found, exact)]))
+        result["lists"] = index.n_lists
+        results.append(result)
+    return results
+
+
+def bench_risk_tiles(df: pd.DataFrame, catalog, zooms: List[int], n: int, grid: int = 32) -> List[dict]:
+    """Render the n busiest heatmap tiles of each zoom (binning, matching and scoring; no cache)."""
+    from app.db.csv_store import build_spatial_index
+    from app.ml.risk_tiles import popular_tiles, score_tile, tile_species
+
+    index = build_spatial_index(df)
+    results = []
+    for z in zooms:
+        tiles = popular_tiles(df, z, n)
+        if not tiles:
+            continue
+        occurrences = []
+
+        def render(tile) -> None:
+            found = tile_species(df, index, catalog, z, *tile, grid)
+            cells = np.unique(found.cells)
+            score_tile(catalog, found, grid, "Forest", False, cells, np.full(cells.size, 800.0))
+            occurrences.append(found.occurrences)
+
+        it = iter(tiles)
+        samples, wall = _time_calls(lambda: render(next(it)), len(tiles))
+        result = summarize("risk_tile", {"rows": len(df), "species": len(catalog), "zoom": z, "grid": grid}, samples, wall)
+        result["occurrences_per_tile"] = float(np.mean(occurrences))
+        results.append(result)
+    return results
+
+
+async def bench_http(app, method: str, url: str, bodies: List[dict], n: int, concurrency: int) -> tuple:
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def send(i: int) -> None:
+            body = bodies[i % len(bodies)]
+            if method == "GET":
+                response = await client.get(url, params=body)
+            else:
+                response = await client.post(url, json=body)
+            response.raise_for_status()
+
+        await send(0)  # warm-up: imports, first-request setup
+        return await _time_requests(send, n, concurrency)
+
+
+def _scan_bodies(n: int, seed: int = 0) -> List[dict]:
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            "lat": CENTER[0] + float(rng.normal(0, 0.5)),
+            "lng": CENTER[1] + float(rng.normal(0, 0.5)),
+            "biome_context": BIOMES[i % len(BIOMES)],
+            "is_urban": bool(i % 2),
+            "radius_km": 50.0,
+        }
+        for i in range(n)
+    ]
+
+
+def _species_queries(n: int, seed: int = 0) -> List[dict]:
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            "latitude": CENTER[0] + float(rng.normal(0, 1.0)),
+            "longitude": CENTER[1] + float(rng.normal(0, 1.0)),
+            "radius_km": 25.0,
+            "limit": 50,
+        }
+        for _ in range(n)
+    ]
+
+
+def _configure_offline(stub_url: str) -> None:
+    """Point the fetchers at the stub and disable caches that would turn the runs into hits."""
+    settings.gbif_api_url = f"{stub_url}/gbif"
+    settings.open_meteo_archive_url = f"{stub_url}/archive"
+    settings.risk_cache_enabled = False
+    settings.gbif_tile_cache_enabled = False
+    settings.ml_catalog_cache_enabled = False
+
+
+async def run_suite(args, workdir: str) -> List[dict]:
+    from app.core.http_client import close_http_client, open_http_client
+    from app.db.csv_store import load_csv, set_df, unload_df
+    from app.db.ml_store import compile_catalog, set_ml_catalog, unload_ml_catalog
+    from app.main import app
+
+    results = []
+    wanted = set(args.benchmarks)
+
+    for n_species in args.species:
+        catalog_df = make_catalog(n_species, seed=args.seed)
+        catalog = compile_catalog(catalog_df)
+
+        if "calculate_risk" in wanted:
+            samples, wall = bench_calculate_risk(catalog, args.iterations, seed=args.seed)
+            results.append(summarize("calculate_risk", {"species": n_species}, samples, wall))
+
+        if "catalog_layout" in wanted:
+            results.extend(bench_catalog_layouts(n_species, args.onehot_columns, args.iterations, seed=args.seed))
+
+        if "pca_scoring" in wanted and not args.catalog:
+            results.extend(bench_pca_scoring(catalog_df, args.pca_variance, args.iterations, seed=args.seed))
+
+        if "catalog_search" in wanted:
+            results.extend(bench_catalog_search(n_species, args.nprobe, args.iterations, seed=args.seed))
+
+        if "risk_scan" in wanted:
+            stub = UpstreamStub.from_directory(args.payloads, args.latency_ms) if args.payloads else None
+            if stub is None:
+                stub = UpstreamStub(
+                    synthetic_gbif_payload(species_names(n_species), seed=args.seed, center=CENTER),
+                    synthetic_rainfall_payload(seed=args.seed),
+                    latency_ms=args.latency_ms,
+                )
+            with stub:
+                _configure_offline(stub.url)
+                set_ml_catalog(catalog)
+                # Nearby species come from the GBIF stub; the occurrence store is loaded but empty
+                set_df(pd.DataFrame(columns=["latitude", "longitude", "scientific_name", "common_name", "family"]))
+                open_http_client()
+                try:
+                    samples, wall = await bench_http(
+                        app, "POST", "/api/v1/risk/scan", _scan_bodies(args.requests, args.seed),
+                        args.requests, args.concurrency,
+                    )
+                finally:
+                    await close_http_client()
+                    unload_df()
+                    unload_ml_catalog()
+            params = {"species": n_species, "latency_ms": args.latency_ms, "concurrency": args.concurrency}
+            results.append(summarize("risk_scan", params, samples, wall))
+
+    if "pca_scoring" in wanted and args.catalog:
+        results.extend(bench_pca_scoring(pd.read_csv(args.catalog), args.pca_variance, args.iterations, seed=args.seed))
+
+    for n_rows in args.occurrences:
+        path = os.path.join(workdir, f"occurrences_{n_rows}.csv")
+        make_occurrences(n_rows, n_species=max(args.species), seed=args.seed, center=CENTER).to_csv(path, index=False)
+
+        if "load_csv" in wanted:
+            samples, wall = bench_load_csv(path, args.load_repeats)
+            results.append(summarize("load_csv", {"rows": n_rows}, samples, wall))
+
+        if "risk_tile" in wanted:
+            tile_catalog = compile_catalog(make_catalog(max(args.species), seed=args.seed))
+            results.extend(bench_risk_tiles(load_csv(path), tile_catalog, args.tile_zooms, args.iterations))
+
+        if "species_by_location" in wanted:
+            set_df(load_csv(path))
+            try:
+                samples, wall = await bench_http(
+                    app, "GET", "/api/v1/species/by-location", _species_queries(args.requests, args.seed),
+                    args.requests, args.concurrency,
+                )
+            finally:
+                unload_df()
+            params = {"rows": n_rows, "concurrency": args.concurrency}
+            results.append(summarize("species_by_location", params, samples, wall))
+
+    return results
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> dict:
+    return {
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+
+
+def _sizes(value: str) -> List[int]:
+    return [int(float(v)) for v in value.split(",") if v]
+
+
+def cmd_run(args) -> int:
+    with tempfile.TemporaryDirectory(prefix="invtracker-bench-") as workdir:
+        results = asyncio.run(run_suite(args, workdir))
+
+    report = {
+        "environment": environment(),
+        "config": {k: v for k, v in vars(args).items() if k != "func"},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    print_table(results)
+    return 0
+
+
+def print_table(results: List[dict]) -> None:
+    print(f"{'benchmark':<22}{'params':<44}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for r in results:
+        params = ",".join(f"{k}={v}" for k, v in r["params"].items())
+        print(f"{r['benchmark']:<22}{params:<44}{r['throughput_per_s'] or 0:>10.1f}"
+              f"{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}")
+
+
+def _key(result: dict) -> tuple:
+    return result["benchmark"], tuple(sorted(result["params"].items()))
+
+
+def cmd_compare(args) -> int:
+    """Print p50/p95/throughput ratios (new / old) for benchmarks present in both files."""
+    with open(args.old) as f:
+        old = {_key(r): r for r in json.load(f)["results"]}
+    with open(args.new) as f:
+        new = {_key(r): r for r in json.load(f)["results"]}
+
+    print(f"{'benchmark':<22}{'params':<44}{'p50 x':>8}{'p95 x':>8}{'ops/s x':>9}")
+    for key in sorted(old.keys() & new.keys(), key=str):
+        o, n = old[key], new[key]
+        params = ",".join(f"{k}={v}" for k, v in key[1])
+        ops = (n["throughput_per_s"] or 0) / o["throughput_per_s"] if o["throughput_per_s"] else float("nan")
+        print(f"{key[0]:<22}{params:<44}{n['p50_ms'] / o['p50_ms']:>8.2f}{n['p95_ms'] / o['p95_ms']:>8.2f}{ops:>9.2f}")
+    return 0
+
+
+def cmd_record(args) -> int:
+    """Save one live GBIF search and one Open-Meteo archive response for replay."""
+    import requests
+
+    from app.core.utils import _gbif_params, _rainfall_params
+
+    os.makedirs(args.directory, exist_ok=True)
+    gbif = requests.get(f"{settings.gbif_api_url}/occurrence/search",
+                        params=_gbif_params(*CENTER, 50000), timeout=30)
+    rain = requests.get(settings.open_meteo_archive_url, params=_rainfall_params(*CENTER), timeout=30)
+    gbif.raise_for_status()
+    rain.raise_for_status()
+    for name, response in ((GBIF_PAYLOAD_FILE, gbif), (OPEN_METEO_PAYLOAD_FILE, rain)):
+        with open(os.path.join(args.directory, name), "w") as f:
+            json.dump(response.json(), f)
+    print(f"Recorded payloads in {args.directory}")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="Run the benchmarks and write JSON results")
+    run.add_argument("--benchmarks", nargs="+",
+                     default=["load_csv", "calculate_risk", "risk_scan", "species_by_location"],
+                     choices=["load_csv", "calculate_risk", "risk_scan", "species_by_location", "catalog_layout",
+                              "pca_scoring", "catalog_search", "risk_tile"])
+    run.add_argument("--occurrences", type=_sizes, default=_sizes("1e3,1e5"),
+                     help="Comma-separated occurrence table sizes (up to 1e7)")
+    run.add_argument("--species", type=_sizes, default=_sizes("1e2,1e4"),
+                     help="Comma-separated ML catalog sizes (up to 1e5)")
+    run.add_argument("--requests", type=int, default=200, help="Requests per HTTP benchmark")
+    run.add_argument("--concurrency", type=int, default=8)
+    run.add_argument("--iterations", type=int, default=200, help="calculate_risk calls per catalog size")
+    run.add_argument("--onehot-columns", type=int, default=2000,
+                     help="Width of the extra one-hot trait group for catalog_layout")
+    run.add_argument("--pca-variance", type=float, default=0.95, help="Variance kept for pca_scoring")
+    run.add_argument("--nprobe", type=_sizes, default=_sizes("8,32,128"),
+                     help="Comma-separated index lists to probe for catalog_search")
+    run.add_argument("--tile-zooms", type=_sizes, default=_sizes("4,7,10"),
+                     help="Comma-separated zoom levels for risk_tile (busiest tiles, up to --iterations each)")
+    run.add_argument("--catalog", default=None,
+                     help="Vectorized species CSV for pca_scoring instead of synthetic catalogs")
+    run.add_argument("--load-repeats", type=int, default=3)
+    run.add_argument("--latency-ms", type=float, default=0.0, help="Stub upstream latency")
+    run.add_argument("--payloads", default=None,
+                     help="Directory of recorded payloads (see `record`); synthetic if omitted")
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--out", default=None, help="Write the JSON report here")
+    run.set_defaults(func=cmd_run)
+
+    compare = sub.add_parser("compare", help="Compare two JSON reports")
+    compare.add_argument("old")
+    compare.add_argument("new")
+    compare.set_defaults(func=cmd_compare)
+
+    record = sub.add_parser("record", help="Record live upstream payloads for replay")
+    record.add_argument("directory")
+    record.set_defaults(func=cmd_record)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+'''
+Local stand-ins for the GBIF and Open-Meteo APIs
+
+Replays recorded JSON payloads (or synthesizes ones naming catalog species)
+after a configurable latency, so benchmarks never touch the network.
+'''
+
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+import numpy as np
+
+# Recorded payload file names looked up in --payloads
+GBIF_PAYLOAD_FILE = "gbif_occurrence_search.json"
+OPEN_METEO_PAYLOAD_FILE = "open_meteo_archive.json"
+
+
+def synthetic_gbif_payload(names: List[str], n_records: int = 300, seed: int = 0,
+                           center: tuple = (37.77, -122.42)) -> dict:
+    """An occurrence search page naming `names` (with repeats), like GBIF's last page."""
+    rng = np.random.default_rng(seed)
+    picked = rng.integers(0, len(names), n_records)
+    return {
+        "offset": 0,
+        "limit": n_records,
+        "endOfRecords": True,
+        "results": [
+            {
+                "species": names[i],
+                "scientificName": f"{names[i]} (Author)",
+                "decimalLatitude": round(center[0] + float(rng.normal(0, 0.1)), 5),
+                "decimalLongitude": round(center[1] + float(rng.normal(0, 0.1)), 5),
+                "vernacularName": "",
+            }
+            for i in picked
+        ],
+    }
+
+
+def synthetic_rainfall_payload(seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    return {"daily": {"precipitation_sum": rng.gamma(0.5, 4.0, 365).round(1).tolist()}}
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 512
+
+
+class UpstreamStub:
+    """
+    Threaded HTTP server answering /gbif/... and /archive... with fixed
+    payloads after `latency_ms`. Payload bytes are encoded once.
+    """
+
+    def __init__(self, gbif_payload: dict, rainfall_payload: dict, latency_ms: float = 0.0):
+        self.latency_s = latency_ms / 1000.0
+        self.requests = 0
+        self._bodies = {
+            "/gbif": json.dumps(gbif_payload).encode(),
+            "/archive": json.dumps(rainfall_payload).encode(),
+        }
+        self._lock = threading.Lock()
+        self._server = _Server(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @classmethod
+    def from_directory(cls, directory: str, latency_ms: float = 0.0) -> Optional["UpstreamStub"]:
+        """Stub replaying payloads recorded into `directory`, or None if they are missing."""
+        gbif_path = os.path.join(directory, GBIF_PAYLOAD_FILE)
+        rain_path = os.path.join(directory, OPEN_METEO_PAYLOAD_FILE)
+        if not (os.path.exists(gbif_path) and os.path.exists(rain_path)):
+            return None
+        with open(gbif_path) as g, open(rain_path) as r:
+            return cls(json.load(g), json.load(r), latency_ms=latency_ms)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                if stub.latency_s:
+                    time.sleep(stub.latency_s)
+                body = next((b for prefix, b in stub._bodies.items() if self.path.startswith(prefix)), None)
+                if body is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self) -> "UpstreamStub":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
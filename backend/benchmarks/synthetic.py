@@ -0,0 +1,73 @@
+'''
+Synthetic occurrence tables and ML catalogs shaped like the real datasets
+'''
+
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+HABITS = [
+    "Forb/herb", "Forb/herb, Subshrub", "Forb/herb, Vine", "Graminoid", "Nonvascular", "Shrub",
+    "Shrub, Subshrub", "Shrub, Tree", "Subshrub", "Subshrub, Forb/herb", "Subshrub, Shrub",
+    "Subshrub, Shrub, Graminoid", "Subshrub, Vine, Forb/herb", "Tree", "Tree, Shrub", "Unknown",
+    "Vine", "Vine, Forb/herb", "Vine, Shrub", "Vine, Subshrub",
+]
+LIGHTS = ["3.0", "4.0", "5.0", "6.0", "7.0", "8.0", "9.0", "Unknown"]
+FAMILIES = ["Poaceae", "Asteraceae", "Fabaceae", "Rosaceae", "Euphorbiaceae", "Aizoaceae"]
+
+
+def species_names(n_species: int) -> List[str]:
+    """Deterministic, unique binomial-looking names."""
+    return [f"Genus{i // 10} species{i}" for i in range(n_species)]
+
+
+def make_catalog(n_species: int, seed: int = 0, extra_onehot: int = 0) -> pd.DataFrame:
+    """
+    Vectorized species table with the columns of vectorized_species_master.csv
+    (numeric traits plus one-hot habit and light groups). `extra_onehot`
+    adds a one-hot trait group that wide: the full-coverage catalog shape.
+    """
+    rng = np.random.default_rng(seed)
+    data = {
+        "scientific_name": species_names(n_species),
+        "is_invasive": (rng.random(n_species) < 0.25).astype(np.int64),
+        "native_region_count": rng.random(n_species).round(6),
+        "growth_ph_minimum": rng.uniform(0.2, 0.8, n_species).round(6),
+        "growth_ph_maximum": rng.uniform(0.4, 1.0, n_species).round(6),
+        "growth_minimum_precipitation_mm": rng.random(n_species).round(6),
+    }
+    habit = rng.integers(0, len(HABITS), n_species)
+    for i, name in enumerate(HABITS):
+        data[f"habit_{name}"] = habit == i
+    light = rng.integers(0, len(LIGHTS), n_species)
+    for i, name in enumerate(LIGHTS):
+        data[f"light_{name}"] = light == i
+    if extra_onehot:
+        trait = rng.integers(0, extra_onehot, n_species)
+        for i in range(extra_onehot):
+            data[f"trait_{i}"] = trait == i
+    return pd.DataFrame(data)
+
+
+def make_occurrences(
+    n_rows: int,
+    n_species: int,
+    seed: int = 0,
+    center: tuple = (37.77, -122.42),
+    spread_deg: float = 2.0,
+) -> pd.DataFrame:
+    """
+    Occurrence table in the invasive_species.csv schema, clustered around
+    `center` so radius queries there hit a realistic share of rows.
+    """
+    rng = np.random.default_rng(seed)
+    names = np.array(species_names(n_species), dtype=object)
+    picked = rng.integers(0, n_species, n_rows)
+    return pd.DataFrame({
+        "latitude": np.clip(center[0] + rng.normal(0, spread_deg, n_rows), -90, 90).round(5),
+        "longitude": ((center[1] + rng.normal(0, spread_deg, n_rows) + 180) % 360 - 180).round(5),
+        "scientific_name": names[picked],
+        "common_name": np.char.add("Common ", picked.astype(str)),
+        "family": np.array(FAMILIES, dtype=object)[picked % len(FAMILIES)],
+    })
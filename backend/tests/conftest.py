@@ -0,0 +1,281 @@
+"""
+Shared pytest fixtures: import path setup and local stand-ins for the
+GBIF / Open-Meteo upstream APIs and MongoDB so tests never touch the network.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+import pytest
+import pytest_asyncio
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+ML_DATA_PATH = os.path.join(BACKEND_DIR, "..", "notebooks", "vectorized_species_master.csv")
+
+DEFAULT_GBIF_PAYLOAD = {
+    "results": [
+        {"species": "Urtica dioica", "decimalLatitude": 37.77, "decimalLongitude": -122.41},
+        {"species": "Quercus rotundifolia", "decimalLatitude": 37.78, "decimalLongitude": -122.42},
+        {"species": "Urtica dioica", "decimalLatitude": 37.79, "decimalLongitude": -122.43},
+    ]
+}
+DEFAULT_RAINFALL_PAYLOAD = {"daily": {"precipitation_sum": [2.0] * 365}}
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # default of 5 drops bursts of concurrent connects
+
+
+class StubUpstream:
+    """
+    Threaded HTTP server that answers GBIF occurrence searches, GBIF species
+    lookups and Open-Meteo archive queries with canned payloads after a
+    fixed delay.
+    """
+
+    def __init__(self):
+        self.delay_s = 0.0
+        self.gbif_payload = DEFAULT_GBIF_PAYLOAD
+        self.rainfall_payload = DEFAULT_RAINFALL_PAYLOAD
+        self.species_payload = {}  # GBIF /species/{key} lookups by key
+        self.requests = []
+        self._lock = threading.Lock()
+        self._server = _StubServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                with stub._lock:
+                    stub.requests.append((parsed.path, parse_qs(parsed.query)))
+                time.sleep(stub.delay_s)
+
+                if parsed.path.startswith("/gbif/species/"):
+                    payload = stub.species_payload.get(parsed.path.rsplit("/", 1)[1])
+                    if payload is None:
+                        self.send_error(404)
+                        return
+                elif parsed.path.startswith("/gbif"):
+                    payload = stub.gbif_payload
+                elif parsed.path.startswith("/archive"):
+                    payload = stub.rainfall_payload
+                else:
+                    self.send_error(404)
+                    return
+
+                body = json.dumps(payload(parse_qs(parsed.query)) if callable(payload) else payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class _FakeCursor:
+    def __init__(self, documents):
+        self._documents = documents
+
+    async def to_list(self, length=None):
+        return self._documents if length is None else self._documents[:length]
+
+    def __aiter__(self):
+        async def iterate():
+            for document in self._documents:
+                yield document
+        return iterate()
+
+
+def _resolve(document, expression):
+    """Value of a "$field.path" expression in a document (literals pass through)."""
+    if not isinstance(expression, str) or not expression.startswith("$"):
+        return expression
+    value = document
+    for part in expression[1:].split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+class FakeMongoCollection:
+    """
+    In-memory stand-in for a Motor collection: inserts, index bookkeeping and
+    the aggregation stages the app uses ($geoNear, $group with $first,
+    $sort, $limit, $project). Like the server, $geoNear needs a 2dsphere
+    index on its key.
+    """
+
+    def __init__(self):
+        self.documents = []
+        self.indexes = {"_id_": [("_id", 1)]}
+        self.pipelines = []
+
+    async def insert_many(self, documents, ordered=True):
+        for document in documents:
+            self.documents.append({"_id": len(self.documents), **document})
+
+    async def create_index(self, keys, name=None, **kwargs):
+        name = name or "_".join(f"{field}_{kind}" for field, kind in keys)
+        self.indexes[name] = list(keys)
+        return name
+
+    async def index_information(self):
+        return {name: {"key": keys} for name, keys in self.indexes.items()}
+
+    async def drop(self):
+        self.documents = []
+        self.indexes = {"_id_": [("_id", 1)]}
+
+    def aggregate(self, pipeline, **kwargs):
+        self.pipelines.append(pipeline)
+        documents = list(self.documents)
+        for stage in pipeline:
+            (op, spec), = stage.items()
+            documents = getattr(self, "_" + op[1:].lower())(documents, spec)
+        return _FakeCursor(documents)
+
+    def _geonear(self, documents, spec):
+        from pymongo.errors import OperationFailure
+
+        from app.core.geo import haversine_km
+
+        if not any((spec["key"], "2dsphere") in keys for keys in self.indexes.values()):
+            raise OperationFailure(f"$geoNear requires a 2dsphere index on {spec['key']}")
+        if not documents:
+            return []
+        lng, lat = spec["near"]["coordinates"]
+        points = np.array([_resolve(d, "$" + spec["key"])["coordinates"] for d in documents], dtype=np.float64)
+        meters = haversine_km(lat, lng, points[:, 1], points[:, 0]) * 1000.0
+        order = np.argsort(meters, kind="stable")
+        return [
+            {**documents[i], spec["distanceField"]: float(meters[i])}
+            for i in order if meters[i] <= spec.get("maxDistance", np.inf)
+        ]
+
+    def _group(self, documents, spec):
+        groups = {}
+        for document in documents:
+            key = _resolve(document, spec["_id"])
+            if key not in groups:
+                groups[key] = {"_id": key, **{
+                    field: _resolve(document, accumulator["$first"])
+                    for field, accumulator in spec.items() if field != "_id"
+                }}
+        return list(groups.values())
+
+    def _sort(self, documents, spec):
+        for field, direction in reversed(list(spec.items())):
+            documents = sorted(documents, key=lambda d: _resolve(d, "$" + field), reverse=direction < 0)
+        return documents
+
+    def _limit(self, documents, spec):
+        return documents[:spec]
+
+    def _project(self, documents, spec):
+        keep_id = spec.get("_id", 1) != 0
+        fields = {k: v for k, v in spec.items() if k != "_id"}
+        return [
+            {
+                **({"_id": d["_id"]} if keep_id else {}),
+                **{k: d.get(k) if v == 1 else _resolve(d, v) for k, v in fields.items()},
+            }
+            for d in documents
+        ]
+
+
+class FakeMongoDatabase:
+    def __init__(self):
+        self.collections = {}
+
+    def __getitem__(self, name):
+        return self.collections.setdefault(name, FakeMongoCollection())
+
+
+@pytest.fixture
+def mongo_db(monkeypatch):
+    """OCCURRENCE_STORE=mongo served by an in-memory database."""
+    from app.core.config import settings
+    from app.db import mongo
+
+    db = FakeMongoDatabase()
+    monkeypatch.setattr(settings, "occurrence_store", "mongo")
+    mongo.set_db(db)
+    yield db
+    mongo.set_db(None)
+
+
+@pytest.fixture
+def stub_upstream(monkeypatch):
+    from app.core.config import settings
+
+    stub = StubUpstream()
+    stub.start()
+    monkeypatch.setattr(settings, "gbif_api_url", f"{stub.url}/gbif")
+    monkeypatch.setattr(settings, "open_meteo_archive_url", f"{stub.url}/archive")
+    yield stub
+    stub.stop()
+
+
+@pytest.fixture
+def ml_catalog():
+    from app.db.ml_store import load_ml_data, set_ml_catalog, unload_ml_catalog
+
+    catalog = load_ml_data(ML_DATA_PATH)
+    set_ml_catalog(catalog)
+    yield catalog
+    unload_ml_catalog()
+
+
+@pytest_asyncio.fixture
+async def api_client(ml_catalog):
+    """Async client against the ASGI app with the stores and HTTP client opened."""
+    import httpx
+
+    from app.core.http_client import close_http_client, open_http_client
+    from app.db import csv_store
+    from app.main import app
+
+    # Like the lifespan, serve an (empty) occurrence store unless a test loaded one
+    try:
+        csv_store.get_occurrences()
+        loaded_here = False
+    except RuntimeError:
+        csv_store.set_df(pd.DataFrame(columns=["latitude", "longitude", "scientific_name", "common_name", "family"]))
+        loaded_here = True
+    open_http_client()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    await close_http_client()
+    if loaded_here:
+        csv_store.unload_df()
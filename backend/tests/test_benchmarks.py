@@ -0,0 +1,29 @@
+"""
+Smoke test for the offline benchmark runner at tiny sizes.
+"""
+
+import json
+
+from benchmarks.run import main
+
+
+def test_benchmark_run_writes_json_report(tmp_path, monkeypatch, capsys):
+    from app.core.config import settings
+
+    # The runner repoints settings at its own stub; restore them afterwards
+    for name in ("gbif_api_url", "open_meteo_archive_url", "risk_cache_enabled", "ml_catalog_cache_enabled"):
+        monkeypatch.setattr(settings, name, getattr(settings, name))
+
+    out = tmp_path / "bench.json"
+    assert main([
+        "run", "--occurrences", "200", "--species", "50", "--requests", "5",
+        "--iterations", "5", "--load-repeats", "1", "--out", str(out),
+    ]) == 0
+
+    report = json.loads(out.read_text())
+    assert {r["benchmark"] for r in report["results"]} == {
+        "load_csv", "calculate_risk", "risk_scan", "species_by_location",
+    }
+    for result in report["results"]:
+        assert result["n"] > 0 and result["p50_ms"] <= result["p95_ms"] <= result["p99_ms"]
+    assert "python" in report["environment"]
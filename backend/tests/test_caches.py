@@ -0,0 +1,196 @@
+"""
+Tests for the upstream caches (rainfall grid cache, GBIF geotile cache).
+"""
+
+import asyncio
+
+import pytest
+import pytest_asyncio
+
+from app.core import gbif_cache, rainfall_cache
+from app.core.gbif_cache import GBIFTileCache
+from app.core.geo import tiles_for_circle
+from app.core.http_client import close_http_client, open_http_client
+from app.core.rainfall_cache import RainfallCache
+from app.core.utils import RAINFALL_FALLBACK_MM, fetch_rainfall_async, fetch_species_from_gbif_async
+
+
+def test_rainfall_cache_quantizes_to_cell_center():
+    cache = RainfallCache(grid_deg=0.1, maxsize=8)
+    assert cache.cell(37.7749, -122.4194) == (37.75, -122.45)
+    assert cache.cell(37.7001, -122.4999) == (37.75, -122.45)
+    assert cache.cell(-0.01, 0.01) == (-0.05, 0.05)
+
+
+def test_rainfall_cache_sqlite_tier_survives_restart(tmp_path):
+    db_path = str(tmp_path / "rain.sqlite3")
+    cache = RainfallCache(grid_deg=0.1, maxsize=8, db_path=db_path)
+    key = cache.cell(10.0, 20.0)
+    assert cache.get(key) is None
+    cache.put(key, 812.5)
+    cache.close()
+
+    reopened = RainfallCache(grid_deg=0.1, maxsize=8, db_path=db_path)
+    assert reopened.get(key) == 812.5
+    assert reopened.get(key) == 812.5
+    assert reopened.stats()["disk_hits"] == 1
+    assert reopened.stats()["memory_hits"] == 1
+    reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_rainfall_cache_falls_back_to_memory_on_disk_errors(tmp_path):
+    cache = RainfallCache(grid_deg=0.1, maxsize=8, db_path=str(tmp_path / "rain.sqlite3"))
+    assert cache._db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    key = cache.cell(10.0, 20.0)
+    cache._db.close()  # every statement now raises sqlite3.ProgrammingError
+
+    await cache.aput(key, 812.5)
+    assert await cache.aget(key) == 812.5
+    assert await cache.aget(cache.cell(0.0, 0.0)) is None
+    assert cache.stats()["disk_errors"] == 2
+    cache._db = None
+
+
+def test_rainfall_cache_lru_eviction():
+    cache = RainfallCache(grid_deg=1.0, maxsize=2)
+    for lat in (0.0, 1.0, 2.0):
+        cache.put(cache.cell(lat, 0.0), lat)
+    assert cache.get(cache.cell(0.0, 0.0)) is None
+    assert cache.get(cache.cell(2.0, 0.0)) == 2.0
+
+
+@pytest_asyncio.fixture
+async def open_rainfall_cache(monkeypatch, tmp_path):
+    cache = RainfallCache(grid_deg=0.1, maxsize=16, db_path=str(tmp_path / "rain.sqlite3"))
+    monkeypatch.setattr(rainfall_cache, "_rainfall_cache", cache)
+    open_http_client()
+    yield cache
+    await close_http_client()
+    cache.close()
+
+
+@pytest.mark.asyncio
+async def test_fetch_rainfall_hits_upstream_once_per_cell(stub_upstream, open_rainfall_cache):
+    first = await fetch_rainfall_async(37.7749, -122.4194)
+    second = await fetch_rainfall_async(37.7701, -122.4102)
+
+    assert first == second == pytest.approx(730.0)
+    assert len(stub_upstream.requests) == 1
+    _, query = stub_upstream.requests[0]
+    assert query["latitude"] == ["37.75"] and query["longitude"] == ["-122.45"]
+    assert open_rainfall_cache.stats()["memory_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_fetch_rainfall_does_not_cache_failures(stub_upstream, open_rainfall_cache, monkeypatch):
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "open_meteo_archive_url", f"{stub_upstream.url}/missing")
+    assert await fetch_rainfall_async(1.0, 1.0) == RAINFALL_FALLBACK_MM
+    assert len(open_rainfall_cache.memory) == 0
+
+
+OCCURRENCES = [
+    ("Urtica dioica", 37.775, -122.419),
+    ("Urtica dioica", 37.700, -122.400),
+    ("Quercus rotundifolia", 37.800, -122.450),
+    ("Arundo donax", 38.600, -122.419),  # ~92 km north
+]
+
+
+def _bbox_payload(query):
+    min_lat, max_lat = map(float, query["decimalLatitude"][0].split(","))
+    min_lng, max_lng = map(float, query["decimalLongitude"][0].split(","))
+    return {"results": [
+        {"species": name, "decimalLatitude": lat, "decimalLongitude": lng}
+        for name, lat, lng in OCCURRENCES
+        if min_lat <= lat <= max_lat and min_lng <= lng <= max_lng
+    ]}
+
+
+def test_tiles_for_circle_wraps_antimeridian():
+    tiles = list(tiles_for_circle(0.0, 179.9, 50.0, zoom=4))
+    xs = {x for _, x, _ in tiles}
+    assert xs == {0, 15}
+
+
+@pytest_asyncio.fixture
+async def open_gbif_tile_cache(monkeypatch, stub_upstream):
+    cache = GBIFTileCache(zoom=9, maxsize=64, ttl_s=60.0, max_tiles_per_query=64)
+    monkeypatch.setattr(gbif_cache, "_gbif_tile_cache", cache)
+    stub_upstream.gbif_payload = _bbox_payload
+    open_http_client()
+    yield cache
+    await close_http_client()
+
+
+@pytest.mark.asyncio
+async def test_gbif_tiles_filter_to_exact_radius(stub_upstream, open_gbif_tile_cache):
+    results = await fetch_species_from_gbif_async(37.7749, -122.4194, radius_meters=20000)
+
+    assert [r["scientific_name"] for r in results] == ["Urtica dioica", "Quercus rotundifolia"]
+    assert results[0]["latitude"] == 37.775  # nearest occurrence kept
+
+
+@pytest.mark.asyncio
+async def test_gbif_tiles_reused_by_nearby_queries(stub_upstream, open_gbif_tile_cache):
+    await fetch_species_from_gbif_async(37.7749, -122.4194, radius_meters=20000)
+    fetched = len(stub_upstream.requests)
+    assert fetched > 0
+
+    await fetch_species_from_gbif_async(37.7760, -122.4180, radius_meters=20000)
+    assert len(stub_upstream.requests) == fetched
+    assert open_gbif_tile_cache.tiles.hits >= fetched
+
+
+@pytest.mark.asyncio
+async def test_gbif_tile_fetches_are_single_flight(stub_upstream, open_gbif_tile_cache):
+    stub_upstream.delay_s = 0.2
+    await asyncio.gather(*(fetch_species_from_gbif_async(37.7749, -122.4194, radius_meters=20000) for _ in range(5)))
+
+    tiles = open_gbif_tile_cache.covering_tiles(37.7749, -122.4194, 20.0)
+    assert len(stub_upstream.requests) == len(tiles)
+
+
+def _paged_payload(total):
+    """`total` occurrences of distinct species per tile, paged like GBIF; geoDistance queries get one record."""
+    def payload(query):
+        if "geoDistance" in query:
+            return {"results": [{"species": "Circle only", "decimalLatitude": 37.7749, "decimalLongitude": -122.4194}],
+                    "endOfRecords": True}
+        offset, limit = int(query["offset"][0]), int(query["limit"][0])
+        rows = range(offset, min(offset + limit, total))
+        return {"endOfRecords": offset + limit >= total, "results": [
+            {"species": f"Species {i}", "decimalLatitude": 37.7749, "decimalLongitude": -122.4194} for i in rows
+        ]}
+    return payload
+
+
+@pytest.mark.asyncio
+async def test_gbif_tiles_are_paged_to_the_last_record(stub_upstream, open_gbif_tile_cache):
+    stub_upstream.gbif_payload = _paged_payload(700)
+    results = await fetch_species_from_gbif_async(37.7749, -122.4194, radius_meters=1000)
+
+    assert len(results) == 700
+    offsets = sorted({q["offset"][0] for _, q in stub_upstream.requests})
+    assert offsets == ["0", "300", "600"]
+
+
+@pytest.mark.asyncio
+async def test_incomplete_gbif_tiles_fall_back_to_radius_query(stub_upstream, open_gbif_tile_cache, monkeypatch):
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "gbif_tile_max_pages", 2)
+    stub_upstream.gbif_payload = _paged_payload(5000)
+    results = await fetch_species_from_gbif_async(37.7749, -122.4194, radius_meters=1000)
+    assert [r["scientific_name"] for r in results] == ["Circle only"]
+
+    assert sum("geoDistance" in q for _, q in stub_upstream.requests) == 1
+
+    # The incomplete tile and the radius search are both cached: a nearby query stays local
+    fetched = len(stub_upstream.requests)
+    again = await fetch_species_from_gbif_async(37.7751, -122.4196, radius_meters=1000)
+    assert [r["scientific_name"] for r in again] == ["Circle only"]
+    assert len(stub_upstream.requests) == fetched
+    assert open_gbif_tile_cache.stats()["circles"] == 1
@@ -0,0 +1,107 @@
+"""
+Tests for the IVF catalog index and the catalog-wide /risk/catalog search.
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from app.core.utils import estimate_soil_ph
+from app.db.ml_store import compile_catalog, load_ml_data
+from app.ml.catalog_index import (
+    build_catalog_index,
+    load_catalog_index,
+    search_catalog,
+    set_catalog_index,
+    train_ivf,
+    unload_catalog_index,
+)
+from app.ml.risk_engine import build_site_profile, build_target_vector, top_k_indices
+from benchmarks.synthetic import make_catalog
+from conftest import ML_DATA_PATH
+
+SITES = [(biome, urban, rain) for biome in ("Desert", "Grassland", "Forest", "Wetland") for urban in (False, True)
+         for rain in (150.0, 1400.0)]
+
+
+def _target(catalog, biome, is_urban, rainfall):
+    return build_target_vector(catalog, build_site_profile(is_urban, biome, estimate_soil_ph(biome), rainfall))
+
+
+def _top_scores(found, k):
+    return found.scores[top_k_indices(found.scores, k)[0]]
+
+
+@pytest.mark.parametrize("sparse_min_onehot", [0, 1])
+def test_bounded_search_is_exact_when_it_says_so(sparse_min_onehot):
+    catalog = compile_catalog(make_catalog(5000, seed=3), sparse_min_onehot=sparse_min_onehot)
+    index = train_ivf(catalog, n_lists=60)
+    assert (index.vectors is None) == (sparse_min_onehot == 1)
+    assert sorted(index.list_rows.tolist()) == list(range(len(catalog)))
+
+    exact_runs = 0
+    for site in SITES:
+        target = _target(catalog, *site)
+        expected = _top_scores(search_catalog(catalog, None, target, need=20, nprobe=0), 20)
+
+        # Probing every list is always exact
+        found = search_catalog(catalog, index, target, need=20, nprobe=index.n_lists)
+        assert found.exact and found.rows.size >= 20
+        np.testing.assert_allclose(_top_scores(found, 20), expected, atol=1e-5)
+
+        found = search_catalog(catalog, index, target, need=20, nprobe=40)
+        assert found.lists_probed <= 40
+        if found.exact:
+            exact_runs += 1
+            np.testing.assert_allclose(_top_scores(found, 20), expected, atol=1e-5)
+    assert exact_runs > 0
+
+
+def test_min_score_prunes_lists():
+    catalog = compile_catalog(make_catalog(5000, seed=3))
+    index = train_ivf(catalog, n_lists=60)
+    target = _target(catalog, "Forest", False, 800.0)
+    brute = search_catalog(catalog, None, target, need=5000, nprobe=0)
+    cut = float(np.sort(brute.scores)[-30:-28].mean())  # between two scores, clear of float noise
+
+    found = search_catalog(catalog, index, target, need=5000, nprobe=60, min_score=cut)
+    assert found.exact and found.lists_probed < 60
+    assert set(found.rows[found.scores >= cut]) == set(brute.rows[brute.scores >= cut])
+
+
+def test_index_build_is_persisted_and_memory_mapped(tmp_path):
+    catalog = load_ml_data(ML_DATA_PATH)
+    directory = build_catalog_index(ML_DATA_PATH, catalog, n_lists=10, cache_dir=str(tmp_path))
+    assert os.path.basename(directory).startswith("vectorized_species_master.csv-ivf.")
+
+    index = load_catalog_index(ML_DATA_PATH, catalog, n_lists=10, cache_dir=str(tmp_path))
+    assert index.n_lists == 10 and isinstance(index.vectors, np.memmap)
+
+    # Other options rebuild it in place
+    assert load_catalog_index(ML_DATA_PATH, catalog, n_lists=5, cache_dir=str(tmp_path)).n_lists == 5
+    assert os.listdir(tmp_path) == [os.path.basename(directory)]
+
+
+@pytest.mark.asyncio
+async def test_catalog_endpoint_searches_whole_catalog(stub_upstream, api_client, ml_catalog):
+    site = {"lat": 37.7749, "lng": -122.4194, "biome_context": "Grassland", "is_urban": True, "k": 10}
+    brute = (await api_client.post("/api/v1/risk/catalog", json=site)).json()
+    assert brute["meta"]["search"] == "brute_force" and brute["meta"]["candidates"] == len(ml_catalog)
+    assert len(brute["results"]) == 10
+
+    try:
+        set_catalog_index(ml_catalog, train_ivf(ml_catalog))
+        indexed = (await api_client.post("/api/v1/risk/catalog", json={**site, "nprobe": 1000})).json()
+        forced = (await api_client.post("/api/v1/risk/catalog", json={**site, "exact": True})).json()
+    finally:
+        unload_catalog_index()
+
+    assert indexed["meta"]["search"] == "ivf" and indexed["meta"]["exact"]
+    assert forced["meta"]["search"] == "brute_force"
+    for response in (indexed, forced):
+        assert [r["risk_score"] for r in response["results"]] == pytest.approx(
+            [r["risk_score"] for r in brute["results"]], abs=1e-5
+        )
+    # Not limited to species observed near the site: the stub's GBIF is never asked
+    assert not any(path.startswith("/gbif") for path, _ in stub_upstream.requests)
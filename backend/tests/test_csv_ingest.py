@@ -0,0 +1,92 @@
+"""
+Tests for chunked occurrence CSV ingest: results must not depend on the
+chunk size and must match a one-shot read with the same validation rules.
+"""
+
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.db import csv_store
+from app.db.csv_store import SCHEMA, build_spatial_index, load_csv_with_stats, query_species_by_location
+
+
+def _write_csv(path, n=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    species = np.array([f"Species {i}" for i in range(40)])
+    df = pd.DataFrame({
+        " latitude ": rng.uniform(-60, 60, n).round(5).astype(object),
+        "longitude": rng.uniform(-180, 180, n).round(5),
+        "scientific_name": np.char.add(" ", species[rng.integers(0, 40, n)]).astype(object),
+        "common_name": species[rng.integers(0, 40, n)],
+        "family": "Fam",
+        "unused": 1,
+    })
+    df.loc[3, " latitude "] = "n/a"         # invalid coordinate
+    df.loc[7, "scientific_name"] = "   "    # blank name
+    df.loc[11, "scientific_name"] = None    # missing name
+    df.loc[13, "common_name"] = None        # optional name may be missing
+    df.to_csv(path, index=False)
+    return df
+
+
+def _expected(raw):
+    lat = pd.to_numeric(raw[" latitude "], errors="coerce")
+    lng = pd.to_numeric(raw["longitude"], errors="coerce")
+    name = raw["scientific_name"].fillna("").astype(str).str.strip()
+    keep = lat.notna() & lng.notna() & (name.str.len() > 0)
+    return pd.DataFrame({
+        SCHEMA.lat: lat[keep].astype(np.float32).to_numpy(),
+        SCHEMA.lng: lng[keep].astype(np.float32).to_numpy(),
+        SCHEMA.scientific_name: name[keep].to_numpy(),
+        SCHEMA.common_name: raw["common_name"].fillna("").astype(str).str.strip()[keep].to_numpy(),
+        SCHEMA.family: raw["family"][keep].to_numpy(),
+    })
+
+
+@pytest.mark.parametrize("chunksize", [1, 97, 10_000])
+def test_chunked_ingest_matches_one_shot_read(tmp_path, chunksize):
+    path = tmp_path / "occurrences.csv"
+    raw = _write_csv(path)
+
+    df, stats = load_csv_with_stats(str(path), chunksize=chunksize)
+
+    expected = _expected(raw)
+    assert stats.rows_read == len(raw)
+    assert stats.rows_kept == len(df) == len(expected) == len(raw) - 3
+    assert list(df.columns) == [SCHEMA.lat, SCHEMA.lng, SCHEMA.scientific_name, SCHEMA.common_name, SCHEMA.family]
+    assert df[SCHEMA.lat].dtype == np.float32
+    for col in (SCHEMA.scientific_name, SCHEMA.common_name, SCHEMA.family):
+        assert isinstance(df[col].dtype, pd.CategoricalDtype)
+        assert df[col].astype(object).tolist() == expected[col].tolist()
+    np.testing.assert_array_equal(df[SCHEMA.lat].to_numpy(), expected[SCHEMA.lat].to_numpy())
+    np.testing.assert_array_equal(df[SCHEMA.lng].to_numpy(), expected[SCHEMA.lng].to_numpy())
+
+
+def test_ingest_requires_coordinate_and_name_columns(tmp_path):
+    path = tmp_path / "bad.csv"
+    pd.DataFrame({"latitude": [1.0], "longitude": [2.0]}).to_csv(path, index=False)
+    with pytest.raises(ValueError, match="scientific_name"):
+        load_csv_with_stats(str(path))
+
+
+def test_loaded_table_answers_location_queries(tmp_path):
+    path = tmp_path / "occurrences.csv"
+    raw = _write_csv(path)
+    df, _ = load_csv_with_stats(str(path))
+
+    lat, lng = float(df[SCHEMA.lat].iloc[0]), float(df[SCHEMA.lng].iloc[0])
+    rows = query_species_by_location(df, lat, lng, 500.0, limit=200, index=build_spatial_index(df))
+    assert rows and rows[0]["distance_km"] < 1e-3
+    assert len({r["scientific_name"] for r in rows}) == len(rows)
+    assert all(r["common_name"] in set(raw["common_name"].dropna()) | {""} for r in rows)
+
+
+@pytest.mark.parametrize("platform, ru_maxrss", [("linux", 512 * 1024), ("darwin", 512 * 2**20)])
+def test_process_peak_rss_is_reported_in_mb(monkeypatch, platform, ru_maxrss):
+    monkeypatch.setattr(sys, "platform", platform)
+    monkeypatch.setattr(csv_store.resource, "getrusage", lambda who: SimpleNamespace(ru_maxrss=ru_maxrss))
+    assert csv_store._process_peak_rss_mb() == 512.0
@@ -0,0 +1,142 @@
+"""
+Tests for hot reloading the datasets: a reload swaps in a new version
+atomically while snapshots taken before it stay usable.
+"""
+
+import os
+
+import pandas as pd
+import pytest
+
+from app.core.config import settings
+from app.db import csv_store, datasets
+from app.db.shared_store import SharedDataset
+
+
+def _write_occurrences(path, names):
+    pd.DataFrame({
+        "latitude": [1.0] * len(names),
+        "longitude": [2.0] * len(names),
+        "scientific_name": names,
+        "common_name": "",
+        "family": "",
+    }).to_csv(path, index=False)
+    # Make the change visible to the stat-based version key even on coarse clocks
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + len(names) * 1_000_000_000))
+
+
+@pytest.fixture
+def occurrence_csv(tmp_path, monkeypatch):
+    path = tmp_path / "occurrences.csv"
+    _write_occurrences(path, ["Arundo donax"])
+    monkeypatch.setattr(datasets, "OCCURRENCE_CSV_PATH", str(path))
+    datasets.load_datasets()
+    yield path
+    datasets.unload_datasets()
+
+
+def _names(df):
+    return sorted(df["scientific_name"].astype(str))
+
+
+def test_reload_swaps_version_and_keeps_old_snapshot(occurrence_csv):
+    old_df, old_index = csv_store.get_occurrences()
+    old_version = datasets.get_dataset_version()
+    assert old_version.occurrences == 1
+
+    # Unchanged sources: nothing is rebuilt
+    version, reloaded = datasets.reload_datasets()
+    assert not reloaded and version == old_version
+
+    _write_occurrences(occurrence_csv, ["Arundo donax", "Ricinus communis"])
+    version, reloaded = datasets.reload_datasets()
+    assert reloaded
+    assert version.version != old_version.version and version.occurrences == 2
+    assert datasets.get_dataset_version() == version
+
+    new_df, new_index = csv_store.get_occurrences()
+    assert _names(new_df) == ["Arundo donax", "Ricinus communis"]
+    assert len(new_index.candidates(1.0, 2.0, 1.0)) == 2
+
+    # A request holding the old snapshot finishes on the old version
+    assert _names(old_df) == ["Arundo donax"]
+    assert len(old_index.candidates(1.0, 2.0, 1.0)) == 1
+
+
+def test_failed_reload_keeps_serving_current_version(occurrence_csv, monkeypatch):
+    before = csv_store.get_occurrences()
+    monkeypatch.setattr(datasets, "load_ml_data", lambda path: (_ for _ in ()).throw(OSError("disk gone")))
+
+    with pytest.raises(OSError):
+        datasets.reload_datasets(force=True)
+    assert csv_store.get_occurrences() is before
+
+
+def test_reload_in_shared_memory_mode_releases_old_segment(tmp_path, monkeypatch):
+    path = tmp_path / "occurrences.csv"
+    _write_occurrences(path, ["Arundo donax"])
+    monkeypatch.setattr(datasets, "OCCURRENCE_CSV_PATH", str(path))
+    monkeypatch.setattr(settings, "shared_memory_enabled", True)
+    monkeypatch.setattr(settings, "shared_memory_prefix", f"ist-test-reload-{os.getpid()}")
+    monkeypatch.setattr(settings, "shared_memory_lock_path", str(tmp_path / "shm.lock"))
+
+    datasets.load_datasets()
+    try:
+        old_segment = datasets._shared.name
+        _write_occurrences(path, ["Arundo donax", "Ricinus communis"])
+        _, reloaded = datasets.reload_datasets()
+        assert reloaded
+        assert datasets._shared.name != old_segment
+        assert SharedDataset.attach(old_segment) is None
+        assert _names(csv_store.get_df()) == ["Arundo donax", "Ricinus communis"]
+    finally:
+        new_segment = datasets._shared.name
+        datasets.unload_datasets()
+    assert SharedDataset.attach(new_segment) is None
+
+
+@pytest.mark.asyncio
+async def test_admin_reload_endpoint(occurrence_csv, api_client, monkeypatch):
+    url = "/api/v1/admin/reload"
+    assert (await api_client.post(url)).status_code == 404
+
+    monkeypatch.setattr(settings, "admin_token", "s3cret")
+    assert (await api_client.post(url, headers={"X-Admin-Token": "nope"})).status_code == 403
+
+    _write_occurrences(occurrence_csv, ["Arundo donax", "Ricinus communis", "Urtica dioica"])
+    response = await api_client.post(url, headers={"X-Admin-Token": "s3cret"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["reloaded"] is True and body["dataset"]["occurrences"] == 3
+
+    health = (await api_client.get("/api/v1/health")).json()
+    assert health["dataset"] == body["dataset"]
+
+
+def test_watcher_waits_for_the_files_to_settle(occurrence_csv):
+    assert datasets._poll_sources(None) == (None, False)
+
+    # A file still being written changes between polls: not loaded yet
+    _write_occurrences(occurrence_csv, ["Arundo donax", "Ricinus communis"])
+    pending, settled = datasets._poll_sources(None)
+    assert not settled
+    _write_occurrences(occurrence_csv, ["Arundo donax", "Ricinus communis", "Urtica dioica"])
+    pending, settled = datasets._poll_sources(pending)
+    assert not settled
+
+    # Unchanged since the last poll: the watcher reloads it
+    pending, settled = datasets._poll_sources(pending)
+    assert settled and pending == datasets._dataset_key(datasets.OCCURRENCE_CSV_PATH, datasets.ML_DATA_PATH)
+
+
+def test_live_datasets_are_one_generation(occurrence_csv):
+    before = datasets.get_live_datasets()
+    _write_occurrences(occurrence_csv, ["Arundo donax", "Ricinus communis"])
+    datasets.reload_datasets()
+    after = datasets.get_live_datasets()
+
+    assert after.version != before.version and after.version == datasets.get_dataset_version()
+    assert after.occurrences is csv_store.get_occurrences() and len(after.occurrences[0]) == 2
+    assert after.catalog is not before.catalog
+    assert len(before.occurrences[0]) == 1  # the old generation stays whole
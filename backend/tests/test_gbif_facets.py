@@ -0,0 +1,127 @@
+"""
+Tests for species-facet GBIF retrieval against the local stub upstream.
+"""
+
+import pytest
+import pytest_asyncio
+
+from app.core import gbif_facets
+from app.core.config import settings
+from app.core.http_client import close_http_client, open_http_client
+from app.core.utils import fetch_species_from_gbif_async
+
+N_SPECIES = 250
+
+
+def _facet_payload(query):
+    """speciesKey facet pages over N_SPECIES keys, most observed first."""
+    offset = int(query["facetOffset"][0])
+    limit = int(query["facetLimit"][0])
+    assert query["facet"] == ["speciesKey"] and query["limit"] == ["0"]
+    counts = [{"name": str(1000 + i), "count": N_SPECIES - i} for i in range(offset, min(offset + limit, N_SPECIES))]
+    return {"count": 10_000, "results": [], "facets": [{"field": "SPECIES_KEY", "counts": counts}]}
+
+
+@pytest_asyncio.fixture
+async def facet_upstream(stub_upstream, monkeypatch):
+    monkeypatch.setattr(settings, "gbif_retrieval_mode", "facets")
+    monkeypatch.setattr(settings, "gbif_facet_page_size", 100)
+    monkeypatch.setattr(settings, "gbif_facet_concurrency", 4)
+    stub_upstream.gbif_payload = _facet_payload
+    stub_upstream.species_payload = {
+        str(1000 + i): {"key": 1000 + i, "species": f"Genus species{i}", "family": "Poaceae"}
+        for i in range(N_SPECIES)
+    }
+    gbif_facets.clear_species_names()
+    open_http_client()
+    yield stub_upstream
+    await close_http_client()
+    gbif_facets.clear_species_names()
+
+
+def _facet_offsets(stub):
+    return sorted(int(q["facetOffset"][0]) for path, q in stub.requests if path == "/gbif/occurrence/search")
+
+
+@pytest.mark.asyncio
+async def test_facets_list_every_species_across_pages(facet_upstream):
+    species = await fetch_species_from_gbif_async(37.77, -122.42, 50000)
+
+    assert len(species) == N_SPECIES
+    assert species[0] == {
+        "scientific_name": "Genus species0", "latitude": None, "longitude": None,
+        "common_name": "", "family": "Poaceae", "occurrence_count": N_SPECIES,
+    }
+    # First page, then one concurrent wave up to the default cap of 300 that finds the short last page
+    assert _facet_offsets(facet_upstream) == [0, 100, 200]
+
+
+@pytest.mark.asyncio
+async def test_species_cap_limits_pages(facet_upstream, monkeypatch):
+    monkeypatch.setattr(settings, "gbif_facet_max_species", 150)
+    species = await fetch_species_from_gbif_async(37.77, -122.42, 50000)
+
+    assert len(species) == 150
+    limits = [int(q["facetLimit"][0]) for path, q in facet_upstream.requests if path == "/gbif/occurrence/search"]
+    assert sorted(limits) == [50, 100]
+
+
+@pytest.mark.asyncio
+async def test_species_names_are_cached_and_failures_skipped(facet_upstream):
+    del facet_upstream.species_payload["1003"]
+    first = await fetch_species_from_gbif_async(37.77, -122.42, 50000)
+    assert len(first) == N_SPECIES - 1
+    assert "Genus species3" not in {s["scientific_name"] for s in first}
+
+    lookups = sum(path.startswith("/gbif/species/") for path, _ in facet_upstream.requests)
+    await fetch_species_from_gbif_async(37.77, -122.42, 50000)
+    again = sum(path.startswith("/gbif/species/") for path, _ in facet_upstream.requests) - lookups
+    assert again == 1  # only the key that failed before is retried
+
+
+@pytest.mark.asyncio
+async def test_failed_first_page_falls_back_to_empty(facet_upstream, monkeypatch):
+    monkeypatch.setattr(settings, "gbif_api_url", f"{facet_upstream.url}/missing")
+    assert await fetch_species_from_gbif_async(37.77, -122.42, 50000) == []
+
+
+@pytest.mark.asyncio
+async def test_species_names_survive_a_restart(facet_upstream, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "gbif_name_cache_path", str(tmp_path / "names.sqlite3"))
+    gbif_facets.open_species_names()
+    try:
+        first = await fetch_species_from_gbif_async(37.77, -122.42, 50000)
+        lookups = sum(path.startswith("/gbif/species/") for path, _ in facet_upstream.requests)
+        assert lookups == N_SPECIES
+
+        # A new process starts with an empty memory tier
+        gbif_facets.close_species_names()
+        gbif_facets.clear_species_names()
+        gbif_facets.open_species_names()
+        again = await fetch_species_from_gbif_async(37.77, -122.42, 50000)
+        assert again == first
+        assert sum(path.startswith("/gbif/species/") for path, _ in facet_upstream.requests) == lookups
+    finally:
+        gbif_facets.close_species_names()
+
+
+@pytest.mark.asyncio
+async def test_unresolved_name_fields_do_not_block_persistence(facet_upstream, monkeypatch, tmp_path, caplog):
+    # GBIF sends null for fields it has no value for
+    facet_upstream.species_payload["1001"].update({"species": None, "canonicalName": "Genus", "family": None})
+    facet_upstream.species_payload["1002"].update({"species": None, "vernacularName": None})
+    monkeypatch.setattr(settings, "gbif_name_cache_path", str(tmp_path / "names.sqlite3"))
+    gbif_facets.open_species_names()
+    try:
+        first = await fetch_species_from_gbif_async(37.77, -122.42, 50000)
+        assert first[1]["scientific_name"] == "Genus" and first[1]["family"] == ""
+        lookups = sum(path.startswith("/gbif/species/") for path, _ in facet_upstream.requests)
+
+        gbif_facets.close_species_names()
+        gbif_facets.clear_species_names()
+        gbif_facets.open_species_names()
+        assert await fetch_species_from_gbif_async(37.77, -122.42, 50000) == first
+        assert sum(path.startswith("/gbif/species/") for path, _ in facet_upstream.requests) == lookups
+    finally:
+        gbif_facets.close_species_names()
+    assert "Could not store" not in caplog.text
@@ -0,0 +1,117 @@
+"""
+Tests for ingesting GBIF exports into the local occurrence store and
+serving /risk/scan from that mirror without calling GBIF.
+"""
+
+import zipfile
+
+import pandas as pd
+import pytest
+
+from app.core.config import settings
+from app.db import csv_store
+from app.db.gbif_mirror import ingest_gbif_export
+
+HEADER = ["gbifID", "family", "species", "scientificName", "decimalLatitude", "decimalLongitude", "occurrenceStatus"]
+ROWS = [
+    ["1", "Poaceae", "Arundo donax", "Arundo donax L.", "37.77", "-122.42", "PRESENT"],
+    ["2", "Poaceae", "Arundo donax", "Arundo donax L.", "37.78", "-122.41", "PRESENT"],
+    ["3", "Euphorbiaceae", "Ricinus communis", 'Ricinus "castor" communis L.', "37.70", "-122.40", "PRESENT"],
+    ["4", "Poaceae", "Cortaderia selloana", "Cortaderia selloana", "37.71", "-122.44", "ABSENT"],
+    ["5", "Poaceae", "", "Poaceae", "37.72", "-122.43", "PRESENT"],   # not identified to species: scientificName
+    ["6", "Aizoaceae", "Carpobrotus edulis", "Carpobrotus edulis", "", "-122.43", "PRESENT"],
+    ["7", "Aizoaceae", "Carpobrotus edulis", "Carpobrotus edulis", "95.0", "-122.43", "PRESENT"],
+]
+EXPECTED = [("Arundo donax", 37.77), ("Arundo donax", 37.78), ("Ricinus communis", 37.70), ("Poaceae", 37.72)]
+
+
+def _tsv(header, rows):
+    return "\n".join("\t".join(r) for r in [header, *rows]) + "\n"
+
+
+def _rows(path):
+    df = pd.read_csv(path)
+    assert list(df.columns) == ["latitude", "longitude", "scientific_name", "common_name", "family"]
+    return list(zip(df["scientific_name"], df["latitude"]))
+
+
+def test_ingest_simple_csv_export(tmp_path):
+    source = tmp_path / "0001234-export.csv"
+    source.write_text(_tsv(HEADER, ROWS))
+    out = tmp_path / "store" / "occurrences.csv"
+
+    stats = ingest_gbif_export(str(source), str(out), chunksize=2)
+
+    assert _rows(out) == EXPECTED
+    assert (stats.rows_read, stats.rows_written, stats.species) == (7, 4, 3)
+    assert not [p for p in out.parent.iterdir() if p.name.startswith(".ingest-")]
+
+
+def test_ingest_darwin_core_archive(tmp_path):
+    # Core columns in a different order, described only by meta.xml
+    order = [4, 5, 0, 2, 1, 6, 3]
+    terms = {
+        "gbifID": "http://rs.gbif.org/terms/1.0/gbifID",
+        "family": "http://rs.tdwg.org/dwc/terms/family",
+        "species": "http://rs.tdwg.org/dwc/terms/species",
+        "scientificName": "http://rs.tdwg.org/dwc/terms/scientificName",
+        "decimalLatitude": "http://rs.tdwg.org/dwc/terms/decimalLatitude",
+        "decimalLongitude": "http://rs.tdwg.org/dwc/terms/decimalLongitude",
+        "occurrenceStatus": "http://rs.tdwg.org/dwc/terms/occurrenceStatus",
+    }
+    fields = "\n".join(
+        f'    <field index="{i}" term="{terms[HEADER[src]]}"/>' for i, src in enumerate(order)
+    )
+    meta = f"""<?xml version="1.0" encoding="UTF-8"?>
+<archive xmlns="http://rs.tdwg.org/dwc/text/" metadata="metadata.xml">
+  <core encoding="UTF-8" fieldsTerminatedBy="\\t" linesTerminatedBy="\\n" fieldsEnclosedBy=""
+        ignoreHeaderLines="1" rowType="http://rs.tdwg.org/dwc/terms/Occurrence">
+    <files><location>occurrence.txt</location></files>
+    <id index="2"/>
+{fields}
+  </core>
+</archive>
+"""
+    archive = tmp_path / "0001234.zip"
+    with zipfile.ZipFile(archive, "w") as z:
+        z.writestr("meta.xml", meta)
+        z.writestr("occurrence.txt", _tsv(["ignored"] * len(order), [[r[i] for i in order] for r in ROWS]))
+
+    out = tmp_path / "occurrences.csv"
+    ingest_gbif_export(str(archive), str(out))
+    assert _rows(out) == EXPECTED
+
+
+def test_ingest_rejects_non_occurrence_files(tmp_path):
+    source = tmp_path / "other.csv"
+    source.write_text("a,b\n1,2\n")
+    out = tmp_path / "occurrences.csv"
+    out.write_text("previous")
+    with pytest.raises(ValueError):
+        ingest_gbif_export(str(source), str(out))
+    assert out.read_text() == "previous"
+
+
+@pytest.mark.asyncio
+async def test_scan_uses_local_mirror_without_gbif(tmp_path, stub_upstream, api_client, ml_catalog, monkeypatch):
+    names = [str(n) for n in ml_catalog.scientific_name[:3]]
+    rows = [["1", "F", name, name, "37.77", f"{-122.42 + 0.01 * i}", "PRESENT"] for i, name in enumerate(names)]
+    rows.append(["9", "F", "Far away", "Far away", "10.0", "10.0", "PRESENT"])
+    source = tmp_path / "export.csv"
+    source.write_text(_tsv(HEADER, rows))
+    out = tmp_path / "occurrences.csv"
+    ingest_gbif_export(str(source), str(out))
+
+    csv_store.set_df(csv_store.load_csv(str(out)))
+    monkeypatch.setattr(settings, "nearby_species_source", "local")
+    try:
+        response = await api_client.post("/api/v1/risk/scan", json={
+            "lat": 37.77, "lng": -122.42, "biome_context": "Grassland", "radius_km": 10.0,
+        })
+    finally:
+        csv_store.unload_df()
+
+    meta = response.json()["meta"]
+    assert meta["species_found_nearby"] == len(set(n.lower() for n in names))
+    assert meta["species_in_ml_dataset"] >= 3
+    assert not [path for path, _ in stub_upstream.requests if path.startswith("/gbif")]
@@ -0,0 +1,73 @@
+"""
+Tests for per-stage instrumentation, /metrics and the Server-Timing header.
+"""
+
+import pytest
+
+from app.core import metrics
+from app.core.config import settings
+
+SITE = {"lat": 37.7749, "lng": -122.4194, "biome_context": "Grassland", "is_urban": True, "radius_km": 50.0}
+
+
+def test_histogram_renders_cumulative_buckets():
+    hist = metrics.Histogram("t_seconds", "Test.", ["stage"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        hist.observe(value, "a")
+
+    lines = hist.render()
+    assert 't_seconds_bucket{stage="a",le="0.1"} 1' in lines
+    assert 't_seconds_bucket{stage="a",le="1.0"} 3' in lines
+    assert 't_seconds_bucket{stage="a",le="+Inf"} 4' in lines
+    assert 't_seconds_sum{stage="a"} 4.05' in lines
+    assert 't_seconds_count{stage="a"} 4' in lines
+
+
+def test_disabled_stages_record_nothing(monkeypatch):
+    monkeypatch.setattr(settings, "metrics_enabled", False)
+    before = metrics.STAGE_SECONDS.count("test_stage")
+    with metrics.stage("test_stage"):
+        pass
+    metrics.count(metrics.UPSTREAM_ERRORS, "test")
+    assert metrics.STAGE_SECONDS.count("test_stage") == before
+    assert metrics.UPSTREAM_ERRORS.value("test") == 0
+
+
+@pytest.mark.asyncio
+async def test_disabled_metrics_endpoint_and_header(stub_upstream, api_client, monkeypatch):
+    monkeypatch.setattr(settings, "metrics_enabled", False)
+    response = await api_client.post("/api/v1/risk/scan", json=SITE)
+    assert "server-timing" not in response.headers
+    assert (await api_client.get("/metrics")).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_scan_reports_stages_in_server_timing_and_metrics(stub_upstream, api_client, monkeypatch):
+    monkeypatch.setattr(settings, "metrics_enabled", True)
+    gbif_before = metrics.STAGE_SECONDS.count("gbif")
+
+    response = await api_client.post("/api/v1/risk/scan", json=SITE)
+    assert response.status_code == 200
+    timing = response.headers["server-timing"]
+    stages = [part.split(";")[0] for part in timing.split(", ")]
+    for name in ("gbif", "open_meteo", "upstream", "match", "score", "serialize", "total"):
+        assert name in stages
+
+    assert metrics.STAGE_SECONDS.count("gbif") == gbif_before + 1
+    exposition = (await api_client.get("/metrics")).text
+    assert "# TYPE invtracker_stage_duration_seconds histogram" in exposition
+    assert 'invtracker_rows_total{query="risk_scan",kind="matched"}' in exposition
+    assert 'invtracker_risk_cache_requests_total{status="bypass"}' in exposition
+
+
+@pytest.mark.asyncio
+async def test_upstream_failures_count_errors_and_fallbacks(stub_upstream, api_client, monkeypatch):
+    monkeypatch.setattr(settings, "metrics_enabled", True)
+    monkeypatch.setattr(settings, "open_meteo_archive_url", f"{stub_upstream.url}/missing")
+    errors = metrics.UPSTREAM_ERRORS.value("open_meteo")
+    fallbacks = metrics.UPSTREAM_FALLBACKS.value("open_meteo")
+
+    response = await api_client.post("/api/v1/risk/scan", json=SITE)
+    assert response.json()["meta"]["rainfall_used"] == 500.0
+    assert metrics.UPSTREAM_ERRORS.value("open_meteo") == errors + 1
+    assert metrics.UPSTREAM_FALLBACKS.value("open_meteo") == fallbacks + 1
@@ -0,0 +1,118 @@
+"""
+Tests for the MongoDB occurrence store against the in-memory stand-in
+(conftest.FakeMongoDatabase): radius queries must return what the CSV
+store returns for the same occurrences.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from pymongo.errors import OperationFailure
+
+from app.core.config import settings
+from app.db import csv_store, mongo, mongo_store
+from app.db.indexes import ensure_indexes
+
+POINTS = [(37.77, -122.42, 25.0), (37.9, -122.1, 60.0), (0.0, 179.99, 300.0), (-45.0, 30.0, 5.0)]
+
+
+@pytest.fixture
+def occurrences():
+    rng = np.random.default_rng(4)
+    n = 20_000
+    lats = np.concatenate([37.77 + rng.normal(0, 0.5, n - 2000), rng.uniform(-3, 3, 2000)])
+    lngs = np.concatenate([-122.42 + rng.normal(0, 0.5, n - 2000), (179 + rng.uniform(0, 2, 2000) + 180) % 360 - 180])
+    df = pd.DataFrame({
+        "latitude": lats,
+        "longitude": lngs,
+        "scientific_name": [f"Species {i % 700}" for i in range(n)],
+        "common_name": [f"Common {i % 700}" for i in range(n)],
+        "family": "Poaceae",
+    })
+    # Through the loader's compact representation, as the service holds it
+    return csv_store.occurrence_from_arrays(*csv_store.occurrence_to_arrays(
+        df.astype({"latitude": np.float32, "longitude": np.float32})
+    ))
+
+
+@pytest.mark.asyncio
+async def test_ensure_indexes_creates_2dsphere_index(mongo_db):
+    collection = mongo_db[settings.mongo_occurrences_collection]
+    with pytest.raises(OperationFailure):
+        collection.aggregate(mongo_store.nearby_names_pipeline(0.0, 0.0, 1.0))
+
+    await ensure_indexes(mongo_db)
+    await ensure_indexes(mongo_db)  # idempotent
+    info = await collection.index_information()
+    assert info["location_2dsphere"]["key"] == [("location", "2dsphere")]
+
+
+@pytest.mark.asyncio
+async def test_radius_queries_match_csv_store(mongo_db, occurrences):
+    await ensure_indexes(mongo_db)
+    assert await mongo_store.insert_occurrences(mongo_db, occurrences, batch_rows=3000) == len(occurrences)
+    index = csv_store.build_spatial_index(occurrences)
+
+    for lat, lng, radius in POINTS:
+        expected = csv_store.query_species_columns(occurrences, lat, lng, radius, limit=200, index=index)
+        got = await mongo_store.query_species_columns(mongo_db, lat, lng, radius, limit=200)
+        # MongoDB holds the rounded coordinates the CSV store reports, so
+        # distances agree to ~1 m and species within 1 m may swap places
+        np.testing.assert_allclose(got["distance_km"], expected["distance_km"], atol=2e-3)
+        expected_by_name = {n: i for i, n in enumerate(expected["scientific_name"])}
+        shared = [(i, expected_by_name[n]) for i, n in enumerate(got["scientific_name"]) if n in expected_by_name]
+        assert len(shared) >= len(got["scientific_name"]) - 2
+        for i, j in shared:
+            assert got["common_name"][i] == expected["common_name"][j]
+            assert got["latitude"][i] == pytest.approx(expected["latitude"][j], abs=1e-5)
+            assert got["distance_km"][i] == pytest.approx(expected["distance_km"][j], abs=2e-3)
+
+        names = await mongo_store.nearby_species_names(mongo_db, lat, lng, radius)
+        assert set(names) == set(csv_store.nearby_species_names(occurrences, lat, lng, radius, index=index))
+
+
+@pytest.mark.asyncio
+async def test_species_are_deduplicated_in_the_pipeline(mongo_db, occurrences):
+    await ensure_indexes(mongo_db)
+    await mongo_store.insert_occurrences(mongo_db, occurrences)
+    await mongo_store.query_species_columns(mongo_db, 37.77, -122.42, 25.0, limit=10)
+
+    # One document per species leaves the server, and only `limit` of them
+    pipeline = mongo_db[settings.mongo_occurrences_collection].pipelines[-1]
+    assert [next(iter(stage)) for stage in pipeline] == ["$geoNear", "$group", "$sort", "$limit", "$project"]
+    assert pipeline[3]["$limit"] == 10
+
+
+@pytest.mark.asyncio
+async def test_by_location_endpoint_serves_mongo(mongo_db, occurrences, api_client):
+    await ensure_indexes(mongo_db)
+    await mongo_store.insert_occurrences(mongo_db, occurrences)
+    csv_store.set_df(occurrences.iloc[:0])  # nothing in memory: every row comes from MongoDB
+    try:
+        response = await api_client.get(
+            "/api/v1/species/by-location", params={"latitude": 37.77, "longitude": -122.42, "radius_km": 10, "limit": 5}
+        )
+        empty = await api_client.get("/api/v1/species/by-location", params={"latitude": -45.0, "longitude": 30.0})
+    finally:
+        csv_store.unload_df()
+
+    rows = response.json()
+    assert len(rows) == 5 and len({r["scientific_name"] for r in rows}) == 5
+    assert [r["distance_km"] for r in rows] == sorted(r["distance_km"] for r in rows)
+    assert rows[0]["id"] == rows[0]["scientific_name"].lower().replace(" ", "_")
+    assert empty.json() == []  # no mock species with a real backend
+
+
+def test_client_pool_comes_from_settings(monkeypatch):
+    monkeypatch.setattr(settings, "mongo_max_pool_size", 7)
+    monkeypatch.setattr(settings, "mongo_min_pool_size", 0)
+    monkeypatch.setattr(settings, "mongo_wait_queue_timeout_ms", 1500)
+    try:
+        db = mongo.open_db()
+        assert mongo.get_db() is db and db.name == settings.mongo_db
+        pool = db.client.options.pool_options
+        assert pool.max_pool_size == 7 and pool.wait_queue_timeout == 1.5
+    finally:
+        mongo.close_db()
+    with pytest.raises(RuntimeError):
+        mongo.get_db()
@@ -0,0 +1,92 @@
+"""
+Tests for the gridded precipitation layer and its use by rainfall lookups.
+"""
+
+import pytest
+
+from app.core.http_client import close_http_client, open_http_client
+from app.core.utils import fetch_rainfall_async
+from app.db import precip_grid
+from app.db.precip_grid import load_precip_grid
+
+# 3 rows x 4 cols of 1 degree over lat [10, 13), lng [20, 24); row 0 is the north
+ASC = """ncols 4
+nrows 3
+xllcorner 20
+yllcorner 10
+cellsize 1
+NODATA_value -9999
+100 200 300 400
+500 600 700 -9999
+900 1000 1100 1200
+"""
+
+
+@pytest.fixture
+def grid(tmp_path):
+    path = tmp_path / "bio12.asc"
+    path.write_text(ASC)
+    return load_precip_grid(str(path), str(tmp_path / "builds"))
+
+
+def test_cell_centers_are_exact(grid):
+    assert grid.value(12.5, 20.5) == pytest.approx(100)
+    assert grid.value(11.5, 22.5) == pytest.approx(700)
+    assert grid.value(10.5, 23.5) == pytest.approx(1200)
+
+
+def test_bilinear_between_centers(grid):
+    # Midway between the four centers 100, 200, 500, 600
+    assert grid.value(12.0, 21.0) == pytest.approx(350)
+    # A quarter of the way from 900 to 1000
+    assert grid.value(10.5, 20.75) == pytest.approx(925)
+    # Edges clamp to the outer cell centers
+    assert grid.value(12.95, 20.05) == pytest.approx(100)
+
+
+def test_nodata_neighbors_are_left_out(grid):
+    # Between 300, 400, 700 and nodata: renormalized over the three with data
+    assert grid.value(12.0, 23.0) == pytest.approx((300 + 400 + 700) / 3)
+    assert grid.value(11.5, 23.5) is None
+
+
+def test_outside_grid_is_none(grid):
+    assert grid.value(9.9, 21.0) is None
+    assert grid.value(11.0, 24.1) is None
+
+
+def test_build_is_memory_mapped_and_reused(tmp_path):
+    path = tmp_path / "bio12.asc"
+    path.write_text(ASC)
+    first = precip_grid.build_precip_grid(str(path), str(tmp_path / "builds"))
+    assert precip_grid.build_precip_grid(str(path), str(tmp_path / "builds")) == first
+    grid = load_precip_grid(str(path), str(tmp_path / "builds"))
+    assert not grid.values.flags.writeable
+
+
+@pytest.mark.asyncio
+async def test_rainfall_uses_grid_and_falls_back_off_grid(grid, stub_upstream):
+    precip_grid.set_precip_grid(grid)
+    open_http_client()
+    try:
+        assert await fetch_rainfall_async(12.5, 20.5) == pytest.approx(100)
+        assert stub_upstream.requests == []
+
+        # Not covered: Open-Meteo (stub: 365 days x 2 mm)
+        assert await fetch_rainfall_async(0.0, 0.0) == pytest.approx(730)
+        assert [path for path, _ in stub_upstream.requests] == ["/archive"]
+    finally:
+        await close_http_client()
+        precip_grid.close_precip_grid()
+
+
+def test_global_grid_wraps_across_the_antimeridian(tmp_path):
+    path = tmp_path / "global.asc"
+    path.write_text("ncols 4\nnrows 2\nxllcorner -180\nyllcorner -90\ncellsize 90\n"
+                    "10 20 30 40\n10 20 30 40\n")
+    grid = load_precip_grid(str(path))
+    assert grid.wraps
+    # Centers at -135 (10) and 135 (40): the antimeridian is midway between them
+    assert grid.value(0.0, 180.0) == pytest.approx(25)
+    assert grid.value(0.0, -180.0) == pytest.approx(25)
+    assert grid.value(0.0, 179.0) == grid.value(0.0, -181.0)
@@ -0,0 +1,58 @@
+"""
+Tests for POST /risk/scan/batch against the local stub upstream.
+"""
+
+import json
+
+import pytest
+
+from app.schemas.risk import RiskBatchResponse
+
+SITES = [
+    {"lat": 37.7749, "lng": -122.4194, "biome_context": "Grassland", "is_urban": True, "radius_km": 50.0},
+    {"lat": 40.7128, "lng": -74.0060, "biome_context": "Forest", "is_urban": False, "radius_km": 30.0},
+    {"lat": 37.7749, "lng": -122.4194, "biome_context": "Desert", "is_urban": False, "radius_km": 50.0},
+]
+
+
+@pytest.mark.asyncio
+async def test_batch_matches_single_scans_in_request_order(stub_upstream, api_client):
+    response = await api_client.post("/api/v1/risk/scan/batch", json=SITES)
+    assert response.status_code == 200
+    batch = RiskBatchResponse.model_validate(response.json())
+    assert [s.meta["biome"] for s in batch.sites] == ["Grassland", "Forest", "Desert"]
+
+    for site, result in zip(SITES, batch.sites):
+        single = (await api_client.post("/api/v1/risk/scan", json=site)).json()
+        assert single["meta"].pop("cache") == "bypass"
+        assert result.meta == single["meta"]
+        assert [r.scientific_name for r in result.results] == [r["scientific_name"] for r in single["results"]]
+        for got, expected in zip(result.results, single["results"]):
+            assert got.risk_score == pytest.approx(expected["risk_score"], abs=1e-6)
+
+
+@pytest.mark.asyncio
+async def test_batch_deduplicates_upstream_lookups(stub_upstream, api_client):
+    await api_client.post("/api/v1/risk/scan/batch", json=SITES)
+
+    paths = [path for path, _ in stub_upstream.requests]
+    assert paths.count("/gbif/occurrence/search") == 2
+    assert paths.count("/archive") == 2
+
+
+@pytest.mark.asyncio
+async def test_batch_streaming_emits_one_line_per_site(stub_upstream, api_client):
+    response = await api_client.post("/api/v1/risk/scan/batch", params={"stream": "true"}, json=SITES)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    lines = [json.loads(line) for line in response.text.splitlines() if line]
+    assert sorted(line["index"] for line in lines) == [0, 1, 2]
+    by_index = {line["index"]: line for line in lines}
+    assert by_index[1]["meta"]["biome"] == "Forest"
+
+
+@pytest.mark.asyncio
+async def test_batch_rejects_empty_list(api_client):
+    response = await api_client.post("/api/v1/risk/scan/batch", json=[])
+    assert response.status_code == 422
@@ -0,0 +1,108 @@
+"""
+Tests for the /risk/scan response cache and request coalescing.
+"""
+
+import asyncio
+
+import pytest
+import pytest_asyncio
+
+from app.core import risk_cache
+from app.core.cache import SingleFlight
+from app.core.config import settings
+
+SITE = {"lat": 37.7749, "lng": -122.4194, "biome_context": "Grassland", "is_urban": True, "radius_km": 50.0}
+
+
+@pytest_asyncio.fixture
+async def scan_cache(monkeypatch):
+    monkeypatch.setattr(settings, "risk_cache_enabled", True)
+    cache = risk_cache.open_risk_cache()
+    yield cache
+    risk_cache.close_risk_cache()
+
+
+def _upstream_calls(stub):
+    return len(stub.requests)
+
+
+@pytest.mark.asyncio
+async def test_repeat_scan_is_served_from_cache(stub_upstream, api_client, scan_cache):
+    first = await api_client.post("/api/v1/risk/scan", json=SITE)
+    calls = _upstream_calls(stub_upstream)
+    # A nearby point in the same grid cell maps to the same entry
+    second = await api_client.post("/api/v1/risk/scan", json={**SITE, "lat": SITE["lat"] + 0.001})
+
+    assert first.headers["X-Cache"] == "miss" and first.json()["meta"]["cache"] == "miss"
+    assert second.headers["X-Cache"] == "hit" and second.json()["meta"]["cache"] == "hit"
+    assert _upstream_calls(stub_upstream) == calls
+    assert second.json()["results"] == first.json()["results"]
+    assert len(first.json()["results"]) > 0
+
+    # Different page parameters are a different response
+    third = await api_client.post("/api/v1/risk/scan", json={**SITE, "k": 1})
+    assert third.headers["X-Cache"] == "miss"
+    assert len(third.json()["results"]) == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_misses_are_coalesced(stub_upstream, api_client, scan_cache):
+    stub_upstream.delay_s = 0.2
+    responses = await asyncio.gather(*[api_client.post("/api/v1/risk/scan", json=SITE) for _ in range(8)])
+
+    statuses = sorted(r.headers["X-Cache"] for r in responses)
+    assert statuses == ["coalesced"] * 7 + ["miss"]
+    assert _upstream_calls(stub_upstream) == 2  # one GBIF search, one rainfall lookup
+    assert len({r.text.replace('"coalesced"', '"miss"') for r in responses}) == 1
+    assert scan_cache.stats()["coalesced"] == 7
+
+
+@pytest.mark.asyncio
+async def test_empty_scans_are_not_cached(stub_upstream, api_client, scan_cache):
+    stub_upstream.gbif_payload = {"results": []}
+    await api_client.post("/api/v1/risk/scan", json=SITE)
+    second = await api_client.post("/api/v1/risk/scan", json=SITE)
+    assert second.headers["X-Cache"] == "miss"
+    assert len(scan_cache.responses) == 0
+
+
+@pytest.mark.asyncio
+async def test_requests_sharing_a_key_are_computed_with_the_key_radius(stub_upstream, api_client, scan_cache):
+    first = await api_client.post("/api/v1/risk/scan", json={**SITE, "radius_km": 50.04})
+    second = await api_client.post("/api/v1/risk/scan", json={**SITE, "radius_km": 49.96})
+
+    assert first.headers["X-Cache"] == "miss" and second.headers["X-Cache"] == "hit"
+    gbif = [query for path, query in stub_upstream.requests if path.startswith("/gbif")]
+    assert [q["geoDistance"][0].rsplit(",", 1)[1] for q in gbif] == ["50000m"]
+
+
+@pytest.mark.asyncio
+async def test_small_radii_are_keyed_to_one_step_not_zero(stub_upstream, api_client, scan_cache):
+    assert (await api_client.post("/api/v1/risk/scan", json={**SITE, "radius_km": 0})).status_code == 422
+
+    first = await api_client.post("/api/v1/risk/scan", json={**SITE, "radius_km": 0.01})
+    second = await api_client.post("/api/v1/risk/scan", json={**SITE, "radius_km": 0.04})
+    assert first.headers["X-Cache"] == "miss" and second.headers["X-Cache"] == "hit"
+    gbif = [query for path, query in stub_upstream.requests if path.startswith("/gbif")]
+    assert [q["geoDistance"][0].rsplit(",", 1)[1] for q in gbif] == ["100m"]
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_coalesced_ones():
+    flight = SingleFlight()
+    started = asyncio.Event()
+
+    async def work():
+        started.set()
+        await asyncio.sleep(0.05)
+        return 42
+
+    leader = asyncio.create_task(flight.do("scan", work))
+    await started.wait()
+    follower = asyncio.create_task(flight.do("scan", work))
+    await asyncio.sleep(0)
+    leader.cancel()  # e.g. its client disconnected
+
+    assert await follower == 42
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+    assert len(flight) == 0
@@ -0,0 +1,215 @@
+"""
+Tests for the compiled ML catalog and the risk scoring engine.
+Compares the matrix-vector scoring path against sklearn's cosine_similarity.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.metrics.pairwise import cosine_similarity
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.ml_store import METADATA_COLS, compile_catalog, load_ml_data
+from app.ml.risk_engine import calculate_risk
+from conftest import ML_DATA_PATH
+
+PROFILE = {
+    'native_region_count': 1.0,
+    'growth_ph_minimum': 0.66,
+    'growth_ph_maximum': 0.66,
+    'habit_Graminoid': 1.0,
+}
+
+
+def _reference_scores(df: pd.DataFrame, profile: dict) -> np.ndarray:
+    feature_cols = [c for c in df.columns if c not in METADATA_COLS]
+    target_vec = np.zeros((1, len(feature_cols)))
+    for feature, value in profile.items():
+        if feature in feature_cols:
+            target_vec[0, feature_cols.index(feature)] = value
+    return cosine_similarity(df[feature_cols].astype(float), target_vec).flatten()
+
+
+def test_compiled_catalog_layout():
+    catalog = load_ml_data(ML_DATA_PATH)
+    assert catalog.features.dtype == np.float32
+    assert catalog.features.flags['C_CONTIGUOUS']
+    assert catalog.features.shape == (len(catalog), len(catalog.feature_names))
+    assert catalog.feature_index['habit_Graminoid'] == catalog.feature_names.index('habit_Graminoid')
+    np.testing.assert_allclose(catalog.norms, np.linalg.norm(catalog.features, axis=1), rtol=1e-6)
+
+
+def test_calculate_risk_matches_sklearn():
+    df = pd.read_csv(ML_DATA_PATH)
+    catalog = compile_catalog(df)
+    expected = _reference_scores(df, PROFILE)
+
+    results = calculate_risk(catalog, PROFILE)
+    assert len(results) == 50
+    by_name = dict(zip(df['scientific_name'], expected))
+    for item in results:
+        assert abs(item['risk_score'] - by_name[item['scientific_name']]) < 1e-5
+    assert results[0]['risk_score'] >= results[-1]['risk_score']
+    assert abs(results[0]['risk_score'] - expected.max()) < 1e-5
+
+
+def test_calculate_risk_restricted_rows():
+    df = pd.read_csv(ML_DATA_PATH)
+    catalog = compile_catalog(df)
+    rows = np.array([3, 10, 42])
+
+    results = calculate_risk(catalog, PROFILE, rows=rows)
+    assert {r['scientific_name'] for r in results} == set(df['scientific_name'].iloc[rows])
+
+
+def test_name_index_matches_normalized_names():
+    catalog = load_ml_data(ML_DATA_PATH)
+    rows = catalog.match_species({'urtica dioica', 'quercus rotundifolia', 'not in catalog'})
+    assert sorted(catalog.scientific_name[rows]) == ['Quercus rotundifolia', 'Urtica dioica']
+    assert catalog.match_species(set()).size == 0
+
+
+def test_top_k_matches_stable_sort_pages():
+    from app.ml.risk_engine import top_k_indices
+
+    rng = np.random.default_rng(0)
+    scores = np.round(rng.random(5000), 2).astype(np.float32)  # many ties
+    expected = np.argsort(-scores, kind='stable')
+
+    for k, offset in [(50, 0), (50, 50), (7, 4990), (10, 5000), (5000, 0)]:
+        top, total = top_k_indices(scores, k=k, offset=offset)
+        assert total == len(scores)
+        np.testing.assert_array_equal(top, expected[offset:offset + k])
+
+    top, total = top_k_indices(scores, k=1000, min_score=0.9)
+    assert total == int((scores >= 0.9).sum())
+    np.testing.assert_array_equal(top, expected[:total])
+
+
+def test_calculate_risk_pages_and_threshold():
+    catalog = load_ml_data(ML_DATA_PATH)
+    everything = calculate_risk(catalog, PROFILE, k=len(catalog))
+
+    page = calculate_risk(catalog, PROFILE, k=20, offset=40)
+    assert [r['scientific_name'] for r in page] == [r['scientific_name'] for r in everything[40:60]]
+
+    above = calculate_risk(catalog, PROFILE, k=len(catalog), min_score=0.5)
+    assert above and all(r['risk_score'] >= 0.5 for r in above)
+    assert len(above) == sum(r['risk_score'] >= 0.5 for r in everything)
+
+
+def test_binary_catalog_build_is_memory_mapped_and_hash_keyed(tmp_path, monkeypatch):
+    import shutil
+
+    from app.core.config import settings
+    from app.db.ml_store import build_catalog
+
+    csv_path = tmp_path / "catalog.csv"
+    shutil.copy(ML_DATA_PATH, csv_path)
+    monkeypatch.setattr(settings, "ml_catalog_cache_dir", str(tmp_path / "cache"))
+
+    catalog = load_ml_data(str(csv_path))
+    reference = compile_catalog(pd.read_csv(csv_path))
+    assert isinstance(catalog.features, np.memmap)
+    np.testing.assert_array_equal(catalog.features, reference.features)
+    np.testing.assert_array_equal(catalog.scientific_name, reference.scientific_name)
+    assert calculate_risk(catalog, PROFILE) == calculate_risk(reference, PROFILE)
+
+    first_build = build_catalog(str(csv_path), str(tmp_path / "cache"))
+    df = pd.read_csv(csv_path).iloc[:100]
+    df.to_csv(csv_path, index=False)
+
+    rebuilt = load_ml_data(str(csv_path))
+    assert len(rebuilt) == 100
+    assert not os.path.exists(first_build)
+
+
+def test_sparse_onehot_layout_matches_dense():
+    from app.db.ml_store import catalog_from_arrays, catalog_to_arrays
+    from app.ml.risk_engine import build_target_matrix, cosine_score_matrix
+
+    df = pd.read_csv(ML_DATA_PATH)
+    dense = compile_catalog(df, sparse_min_onehot=0)
+    sparse = compile_catalog(df, sparse_min_onehot=1)
+    assert dense.onehot is None
+    assert sparse.onehot.shape == (len(df), int(df.dtypes.eq(bool).sum()))
+    assert sparse.features.shape[1] + sparse.onehot.shape[1] == len(sparse.feature_names)
+    assert sparse.feature_bytes < dense.feature_bytes
+    np.testing.assert_allclose(sparse.norms, dense.norms, rtol=1e-6)
+    np.testing.assert_array_equal(sparse.dense_features(), dense.features)
+
+    expected = calculate_risk(dense, PROFILE, k=len(df))
+    got = calculate_risk(sparse, PROFILE, k=len(df))
+    assert [r['scientific_name'] for r in got][:50] == [r['scientific_name'] for r in expected][:50]
+    by_name = {r['scientific_name']: r['risk_score'] for r in expected}
+    assert all(abs(r['risk_score'] - by_name[r['scientific_name']]) < 1e-5 for r in got)
+
+    # Matrix scoring of a row subset, also after a binary build round trip
+    rows = np.array([0, 7, 300])
+    targets = build_target_matrix(dense, [PROFILE, {'growth_minimum_precipitation_mm': 0.4, 'light_6.0': 1.0}])
+    restored = catalog_from_arrays(*catalog_to_arrays(sparse))
+    np.testing.assert_allclose(
+        cosine_score_matrix(restored, targets, rows), cosine_score_matrix(dense, targets, rows), atol=1e-6
+    )
+
+
+def test_pca_scoring_space(tmp_path, monkeypatch):
+    from app.core.config import settings
+    from app.ml.projection import top_k_overlap
+    from app.ml.risk_engine import build_target_vector, cosine_scores
+
+    df = pd.read_csv(ML_DATA_PATH)
+    target = build_target_vector(compile_catalog(df), PROFILE)
+
+    # Keeping every component reproduces the exact scores
+    full = compile_catalog(df, pca_variance=1.0)
+    np.testing.assert_allclose(cosine_scores(full, target, reduced=True), cosine_scores(full, target), atol=1e-5)
+
+    reduced = compile_catalog(df, pca_variance=0.99)
+    assert reduced.projection.n_components < len(reduced.feature_names)
+    assert reduced.projection.explained_variance >= 0.99
+    exact_scores = cosine_scores(reduced, target, reduced=False)
+    assert top_k_overlap(exact_scores, cosine_scores(reduced, target, reduced=True)) >= 0.9
+
+    # The build stores the projection; RISK_SCORING_SPACE switches the engine to it
+    monkeypatch.setattr(settings, "ml_catalog_cache_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "risk_scoring_space", "pca")
+    monkeypatch.setattr(settings, "ml_pca_variance", 0.99)
+    loaded = load_ml_data(ML_DATA_PATH)
+    assert isinstance(loaded.projection.reduced, np.memmap)
+    results = calculate_risk(loaded, PROFILE, k=5)
+    assert [r['risk_score'] for r in results] == pytest.approx(
+        sorted(cosine_scores(reduced, target, reduced=True), reverse=True)[:5], abs=1e-6
+    )
+
+    monkeypatch.setattr(settings, "risk_scoring_space", "exact")
+    assert load_ml_data(ML_DATA_PATH).projection is None
+
+
+@pytest.mark.parametrize("variance", [0.5, 0.8, 0.95])
+def test_pca_scores_stay_within_unit_range(variance):
+    from app.ml.projection import reconstruction_norms
+    from app.ml.risk_engine import build_target_vector, cosine_score_matrix, cosine_scores
+
+    df = pd.read_csv(ML_DATA_PATH)
+    reduced = compile_catalog(df, pca_variance=variance)
+    projection = reduced.projection
+    reconstructed = projection.reduced @ projection.components + projection.mean
+    np.testing.assert_allclose(projection.norms, np.linalg.norm(reconstructed, axis=1), rtol=1e-4)
+    np.testing.assert_allclose(
+        reconstruction_norms(projection.mean, projection.components, projection.reduced), projection.norms
+    )
+
+    # Targets along the reconstructions that outgrew their rows most: divided
+    # by the exact norms these rows score above 1
+    ratio = projection.norms / np.where(reduced.norms > 0, reduced.norms, np.inf)
+    worst = np.argsort(-ratio)[:4]
+    assert ratio[worst[0]] > 1
+    targets = np.vstack([build_target_vector(reduced, PROFILE), reconstructed[worst]]).astype(np.float32)
+    scores = cosine_score_matrix(reduced, targets, reduced=True)
+    assert np.abs(scores).max() <= 1 + 1e-5
+    assert np.abs(cosine_scores(reduced, targets[0], reduced=True)).max() <= 1 + 1e-5
@@ -53,17 +53,14 @@ def test_ml_data_loading():
         from app.db.ml_store import load_ml_data
         
         # Try to load the ML data
-        ml_df = load_ml_data("../notebooks/vectorized_species_master.csv")
+        catalog = load_ml_data("../notebooks/vectorized_species_master.csv")
         print(f"\n✅ ML data loaded successfully!")
-        print(f"   Rows: {len(ml_df)}")
-        print(f"   Columns: {len(ml_df.columns)}")
-        print(f"   Sample columns: {list(ml_df.columns[:5])}")
+        print(f"   Rows: {len(catalog)}")
+        print(f"   Features: {len(catalog.feature_names)}")
+        print(f"   Sample features: {catalog.feature_names[:5]}")
+        print(f"   Sample species: {list(catalog.scientific_name[:3])}")
         
-        # Check if scientific_name column exists
-        if 'scientific_name' in ml_df.columns:
-            print(f"   Sample species: {ml_df['scientific_name'].head(3).tolist()}")
-        
-        return ml_df
+        return catalog
     except FileNotFoundError:
         print(f"\n⚠️  ML data file not found at expected path")
         print(f"   Expected: ../notebooks/vectorized_species_master.csv")
@@ -79,20 +76,16 @@ def test_species_matching():
     print("=" * 60)
     
     gbif_species = test_gbif_function()
-    ml_df = test_ml_data_loading()
+    catalog = test_ml_data_loading()
     
-    if not gbif_species or ml_df is None:
+    if not gbif_species or catalog is None:
         print("\n⚠️  Cannot test matching - missing data")
         return
     
     # Extract scientific names
     gbif_names = {s['scientific_name'] for s in gbif_species if s.get('scientific_name')}
     
-    if 'scientific_name' not in ml_df.columns:
-        print("\n❌ ML dataset doesn't have 'scientific_name' column")
-        return
-    
-    ml_names = set(ml_df['scientific_name'].dropna().unique())
+    ml_names = set(catalog.scientific_name)
     
     # Find matches
     matches = gbif_names.intersection(ml_names)
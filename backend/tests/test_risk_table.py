@@ -0,0 +1,96 @@
+"""
+Tests for the profile-space risk lookup table: table lookups must stay
+within tolerance of exact scoring (calculate_risk) across the profile space.
+"""
+
+import numpy as np
+import pytest
+
+from app.core.utils import estimate_soil_ph
+from app.db.ml_store import load_ml_data
+from app.ml.risk_engine import build_site_profile, calculate_risk, risk_labels
+from app.ml.risk_table import build_risk_table, get_risk_table, lookup_scores, set_risk_table, unload_risk_table
+from conftest import ML_DATA_PATH
+
+TOLERANCE = 5e-3
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    return load_ml_data(ML_DATA_PATH)
+
+
+@pytest.fixture(scope="module")
+def table(catalog):
+    return build_risk_table(catalog, rainfall_step_mm=50.0)
+
+
+def _exact(catalog, biome, is_urban, rainfall):
+    profile = build_site_profile(is_urban, biome, estimate_soil_ph(biome), rainfall)
+    results = calculate_risk(catalog, profile, k=len(catalog))
+    return {r['scientific_name']: r['risk_score'] for r in results}
+
+
+@pytest.mark.parametrize("biome", ["Desert", "Grassland", "Forest", "Rainforest", "Wetland", "Chaparral", "Tundra"])
+@pytest.mark.parametrize("is_urban", [False, True])
+def test_lookup_within_tolerance_of_calculate_risk(catalog, table, biome, is_urban):
+    rows = np.arange(len(catalog))
+    for rainfall in (0.0, 50.0, 437.5, 1234.0, 2999.9, 5000.0):
+        scores = table.lookup(biome, is_urban, rainfall, rows)
+        exact = _exact(catalog, biome, is_urban, rainfall)
+        got = dict(zip(catalog.scientific_name[rows], scores))
+        assert max(abs(got[name] - score) for name, score in exact.items()) < TOLERANCE
+
+
+@pytest.mark.parametrize("biome", ["Desert", "Grassland", "Forest", "Rainforest", "Wetland", "Chaparral", "Tundra"])
+@pytest.mark.parametrize("is_urban", [False, True])
+def test_lookup_labels_match_calculate_risk(catalog, table, biome, is_urban):
+    assert 0 < table.label_margin < TOLERANCE
+    rows = np.arange(len(catalog))
+    for rainfall in np.linspace(0.0, 3000.0, 37):
+        scores = lookup_scores(table, catalog, biome, is_urban, float(rainfall), rows)
+        got = dict(zip(catalog.scientific_name[rows], risk_labels(scores)))
+        exact = _exact(catalog, biome, is_urban, float(rainfall))
+        expected = dict(zip(exact, risk_labels(np.array(list(exact.values())))))
+        assert {name: got[name] for name in exact} == expected
+
+def test_lookup_gathers_only_requested_rows(catalog, table):
+    rows = np.array([3, 1, 42])
+    full = table.lookup("Forest", False, 800.0, np.arange(len(catalog)))
+    np.testing.assert_array_equal(table.lookup("Forest", False, 800.0, rows), full[rows])
+
+
+def test_off_grid_rainfall_falls_back(catalog):
+    table = build_risk_table(catalog, rainfall_step_mm=100.0, rainfall_max_mm=2000.0)
+    rows = np.arange(5)
+    assert table.lookup("Forest", False, 2500.0, rows) is None
+    assert table.lookup("Forest", False, -1.0, rows) is None
+    assert table.lookup("Forest", False, float("nan"), rows) is None
+    assert table.lookup("Forest", False, 2000.0, rows) is not None
+
+
+def test_table_is_bound_to_its_catalog(catalog, table):
+    try:
+        set_risk_table(catalog, table)
+        assert get_risk_table(catalog) is table
+        other = load_ml_data(ML_DATA_PATH)
+        assert get_risk_table(other) is None
+    finally:
+        unload_risk_table()
+
+
+@pytest.mark.asyncio
+async def test_scan_uses_table_within_tolerance(stub_upstream, api_client, ml_catalog):
+    site = {"lat": 37.7749, "lng": -122.4194, "biome_context": "Grassland", "is_urban": True, "radius_km": 50.0}
+    exact = (await api_client.post("/api/v1/risk/scan", json=site)).json()
+    try:
+        set_risk_table(ml_catalog, build_risk_table(ml_catalog))
+        looked_up = (await api_client.post("/api/v1/risk/scan", json=site)).json()
+    finally:
+        unload_risk_table()
+
+    assert len(looked_up["results"]) == len(exact["results"]) > 0
+    exact_scores = {r["scientific_name"]: r["risk_score"] for r in exact["results"]}
+    for r in looked_up["results"]:
+        if r["scientific_name"] in exact_scores:
+            assert r["risk_score"] == pytest.approx(exact_scores[r["scientific_name"]], abs=TOLERANCE)
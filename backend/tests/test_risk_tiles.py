@@ -0,0 +1,207 @@
+"""
+Tests for the gridded risk tiles: per-cell aggregates must match scoring
+each cell's species directly, and tiles are served from the tile cache.
+"""
+
+import asyncio
+import time
+
+import numpy as np
+import pytest
+
+from app.core import tile_cache
+from app.core.config import settings
+from app.core.geo import lat_to_tile_y, lng_to_tile_x
+from app.core.utils import estimate_soil_ph
+from app.db import csv_store
+from app.db.ml_store import compile_catalog, normalize_scientific_name, set_ml_catalog
+from app.db.precip_grid import PrecipGrid
+from app.ml import risk_tiles
+from app.ml.risk_engine import build_site_profile, build_target_vector, cosine_scores
+from app.ml.risk_tiles import cell_rainfall, popular_tiles, score_tile, tile_coordinates, tile_species
+from benchmarks.synthetic import make_catalog, make_occurrences
+
+GRID = 16
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    return compile_catalog(make_catalog(300, seed=2))
+
+
+@pytest.fixture(scope="module")
+def occurrences():
+    # 400 names against a 300-species catalog: some occurrences match nothing
+    df = csv_store.occurrence_from_arrays(*csv_store.occurrence_to_arrays(make_occurrences(20_000, 400, seed=2)))
+    return df, csv_store.build_spatial_index(df)
+
+
+def _expected(df, catalog, z, x, y, rainfall):
+    """Per-cell max / mean / species count, scoring each cell's species on its own."""
+    xf, yf = tile_coordinates(df["latitude"].to_numpy(), df["longitude"].to_numpy(), z)
+    inside = (np.floor(xf) == x) & (np.floor(yf) == y)
+    cell = np.minimum(((yf - y) * GRID).astype(int), GRID - 1) * GRID + np.minimum(((xf - x) * GRID).astype(int), GRID - 1)
+    names = df["scientific_name"].astype(str).to_numpy()
+
+    expected_max = np.full(GRID * GRID, np.nan)
+    expected_mean = np.full(GRID * GRID, np.nan)
+    expected_species = np.zeros(GRID * GRID, dtype=int)
+    for c in np.unique(cell[inside]):
+        rows = catalog.match_species({normalize_scientific_name(n) for n in names[inside & (cell == c)]})
+        if rows.size:
+            profile = build_site_profile(True, "Forest", estimate_soil_ph("Forest"), rainfall[c])
+            scores = cosine_scores(catalog, build_target_vector(catalog, profile), rows, reduced=False)
+            expected_max[c], expected_mean[c], expected_species[c] = scores.max(), scores.mean(), rows.size
+    return expected_max, expected_mean, expected_species
+
+
+@pytest.mark.parametrize("z", [4, 7, 9])
+def test_tile_aggregates_match_per_cell_scoring(catalog, occurrences, z):
+    df, index = occurrences
+    x, y = popular_tiles(df, z, 1)[0]
+    found = tile_species(df, index, catalog, z, x, y, GRID)
+    cells = np.unique(found.cells)
+    # A different rainfall per cell, so cells must not share one profile
+    rainfall = np.full(GRID * GRID, np.nan)
+    rainfall[cells] = 200.0 + 10.0 * cells
+    tile = score_tile(catalog, found, GRID, "Forest", True, cells, rainfall[cells])
+
+    expected_max, expected_mean, expected_species = _expected(df, catalog, z, x, y, rainfall)
+    assert found.rows.size > 0
+    np.testing.assert_allclose(tile.max.ravel(), expected_max, atol=1e-5)
+    np.testing.assert_allclose(tile.mean.ravel(), expected_mean, atol=1e-5)
+    np.testing.assert_array_equal(tile.species.ravel(), expected_species)
+
+
+def test_cell_rainfall_uses_grid_where_covered():
+    # 1-degree grid over lat [0, 2), lng [0, 2): west half 100 mm, east half 900 mm
+    precip = PrecipGrid(values=np.array([[100, 900], [100, 900]], dtype=np.float32), top=2.0, left=0.0, cellsize=1.0)
+    # NW cells of the z=8 tiles holding (1, 0.2) and (1, 1.8), plus one off the grid
+    z = 8
+    x0, x1, y0 = lng_to_tile_x(0.2, z), lng_to_tile_x(1.8, z), lat_to_tile_y(1.0, z)
+    west = cell_rainfall(z, x0, y0, 4, np.array([0]), fallback=500.0, precip=precip)
+    east = cell_rainfall(z, x1, y0, 4, np.array([0]), fallback=500.0, precip=precip)
+    off = cell_rainfall(z, x0, y0 + 20, 4, np.array([0]), fallback=500.0, precip=precip)
+    assert west[0] == pytest.approx(100) and east[0] == pytest.approx(900) and off[0] == 500.0
+
+
+def test_popular_tiles_are_busiest_first(occurrences):
+    df, _ = occurrences
+    xf, yf = tile_coordinates(df["latitude"].to_numpy(), df["longitude"].to_numpy(), 6)
+    tiles = popular_tiles(df, 6, 3)
+    counts = [int(((np.floor(xf) == x) & (np.floor(yf) == y)).sum()) for x, y in tiles]
+    assert counts == sorted(counts, reverse=True) and sum(counts) > 0
+
+
+@pytest.mark.asyncio
+async def test_tile_endpoint_renders_once_then_serves_from_cache(
+    stub_upstream, api_client, catalog, occurrences, monkeypatch, tmp_path
+):
+    df, index = occurrences
+    monkeypatch.setattr(settings, "risk_tile_cache_path", str(tmp_path / "tiles.sqlite3"))
+    set_ml_catalog(catalog)  # the synthetic occurrences' names; unloaded by the ml_catalog fixture
+    csv_store.set_df(df, index=index)
+    tile_cache.open_tile_cache()
+    try:
+        x, y = popular_tiles(df, 7, 1)[0]
+        url = f"/api/v1/risk/tiles/7/{x}/{y}"
+        params = {"biome_context": "Forest", "grid": GRID}
+        first = await api_client.get(url, params=params)
+        second = await api_client.get(url, params=params)
+        assert first.headers["X-Cache"] == "miss" and second.headers["X-Cache"] == "hit"
+        assert first.content == second.content
+        rainfall_calls = len(stub_upstream.requests)
+
+        # A fresh process finds it in the SQLite tier
+        tile_cache.close_tile_cache()
+        tile_cache.open_tile_cache()
+        third = await api_client.get(url, params=params)
+        assert third.headers["X-Cache"] == "hit" and third.content == first.content
+        assert tile_cache.get_tile_cache().disk_hits == 1
+        assert len(stub_upstream.requests) == rainfall_calls
+
+        body = first.json()
+        assert body["meta"]["occurrences"] > 0 and body["meta"]["rainfall_source"] == "tile_center"
+        assert len(body["max"]) == GRID and len(body["max"][0]) == GRID
+        assert not any(path.startswith("/gbif") for path, _ in stub_upstream.requests)
+
+        # Empty tiles skip the rainfall lookup; tiles outside the zoom level do not exist
+        empty = (await api_client.get("/api/v1/risk/tiles/7/0/0", params=params)).json()
+        assert empty["meta"]["occurrences"] == 0 and empty["meta"]["rainfall_used"] is None
+        assert len(stub_upstream.requests) == rainfall_calls
+        assert (await api_client.get("/api/v1/risk/tiles/2/4/0", params=params)).status_code == 404
+    finally:
+        tile_cache.close_tile_cache()
+        csv_store.unload_df()
+
+
+@pytest.mark.asyncio
+async def test_render_tile_keeps_the_event_loop_free(catalog, occurrences, monkeypatch):
+    df, index = occurrences
+    tile_species = risk_tiles.tile_species
+
+    def slow_tile_species(*args):
+        time.sleep(0.3)
+        return tile_species(*args)
+
+    monkeypatch.setattr(risk_tiles, "tile_species", slow_tile_species)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    try:
+        await risk_tiles.render_tile(df, index, catalog, 7, 0, 0, GRID, "Forest", True)
+    finally:
+        task.cancel()
+    assert ticks >= 10
+
+
+@pytest.mark.asyncio
+async def test_tile_cache_falls_back_to_memory_on_disk_errors(tmp_path):
+    cache = tile_cache.RiskTileCache(maxsize=4, db_path=str(tmp_path / "tiles.sqlite3"))
+    assert cache._db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    key = ("v1", 7, 1, 2, GRID, "Forest", True)
+    cache._db.close()  # every statement now raises sqlite3.ProgrammingError
+
+    async def compute():
+        return b"tile", True
+
+    assert await cache.get_or_compute(key, compute) == (b"tile", "miss")
+    assert await cache.get_or_compute(key, compute) == (b"tile", "hit")
+    assert cache.stats()["disk_errors"] == 2
+    cache._db = None
+
+
+@pytest.mark.asyncio
+async def test_tiles_scored_with_fallback_rainfall_are_not_cached(
+    stub_upstream, api_client, catalog, occurrences, monkeypatch, tmp_path
+):
+    df, index = occurrences
+    monkeypatch.setattr(settings, "risk_tile_cache_path", str(tmp_path / "tiles.sqlite3"))
+    archive_url = settings.open_meteo_archive_url
+    monkeypatch.setattr(settings, "open_meteo_archive_url", f"{stub_upstream.url}/missing")
+    set_ml_catalog(catalog)
+    csv_store.set_df(df, index=index)
+    tile_cache.open_tile_cache()
+    try:
+        x, y = popular_tiles(df, 7, 1)[0]
+        url = f"/api/v1/risk/tiles/7/{x}/{y}"
+        params = {"biome_context": "Forest", "grid": GRID}
+        degraded = await api_client.get(url, params=params)
+        assert degraded.headers["X-Cache"] == "miss"
+        assert degraded.json()["meta"]["rainfall_source"] == "fallback"
+        assert (await api_client.get(url, params=params)).headers["X-Cache"] == "miss"
+
+        # Open-Meteo is back: the next render is cached
+        monkeypatch.setattr(settings, "open_meteo_archive_url", archive_url)
+        first = await api_client.get(url, params=params)
+        assert first.headers["X-Cache"] == "miss" and first.json()["meta"]["rainfall_source"] == "tile_center"
+        assert (await api_client.get(url, params=params)).headers["X-Cache"] == "hit"
+    finally:
+        tile_cache.close_tile_cache()
+        csv_store.unload_df()
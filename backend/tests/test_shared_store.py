@@ -0,0 +1,118 @@
+"""
+Tests for hosting the datasets in a named shared memory segment.
+"""
+
+import os
+import signal
+import subprocess
+import sys
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from app.core.config import settings
+from app.db import csv_store, datasets, ml_store
+from app.db.shared_store import SharedDataset
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _segment_name() -> str:
+    return f"ist-test-{uuid.uuid4().hex[:8]}"
+
+
+def test_publish_attach_release_roundtrip():
+    name = _segment_name()
+    features = np.arange(12, dtype=np.float32).reshape(3, 4)
+    names = np.array(["Arundo donax", "Urtica dioica", "X"])
+
+    owner = SharedDataset.publish(name, {"g": ({"n": 3}, {"features": features, "names": names})})
+    worker = SharedDataset.attach(name)
+    assert worker is not None
+
+    meta, arrays = worker.group("g")
+    assert meta == {"n": 3}
+    np.testing.assert_array_equal(arrays["features"], features)
+    np.testing.assert_array_equal(arrays["names"], names)
+    assert not arrays["features"].flags.writeable
+    assert arrays["features"].ctypes.data % 64 == 0
+
+    del arrays
+    assert owner.release() is False
+    assert worker.release() is True
+    assert SharedDataset.attach(name) is None
+
+
+def _die_holding(name: str, publish: bool = False) -> None:
+    """Attach to (or publish) `name` in a child process that is then SIGKILLed without releasing."""
+    action = "publish(name, {'g': ({}, {'a': np.ones(4)})})" if publish else "attach(name)"
+    code = (
+        "import os, signal, numpy as np\n"
+        "from app.db.shared_store import SharedDataset\n"
+        f"name = {name!r}\n"
+        f"SharedDataset.{action}\n"
+        "os.kill(os.getpid(), signal.SIGKILL)\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR)
+    assert result.returncode == -signal.SIGKILL
+
+
+def test_dead_holders_do_not_keep_the_segment_alive():
+    name = _segment_name()
+    owner = SharedDataset.publish(name, {"g": ({}, {"a": np.ones(4)})})
+    _die_holding(name)
+    assert len(owner.holders()) == 2
+
+    assert owner.release() is True
+    assert SharedDataset.attach(name) is None
+
+
+def test_segments_of_dead_workers_are_reaped():
+    prefix = _segment_name()
+    _die_holding(f"{prefix}-old", publish=True)
+    live = SharedDataset.publish(f"{prefix}-live", {"g": ({}, {"a": np.ones(4)})})
+
+    assert SharedDataset.reap_orphans(prefix) == [f"{prefix}-old"]
+    assert SharedDataset.attach(f"{prefix}-old") is None
+    assert live.release() is True
+
+def test_load_datasets_in_shared_memory_mode(tmp_path, monkeypatch):
+    csv_path = tmp_path / "occurrences.csv"
+    pd.DataFrame({
+        "latitude": [1.0, 1.01, 2.0],
+        "longitude": [2.0, 2.0, 3.0],
+        "scientific_name": ["Arundo donax", "Arundo donax", "Ricinus communis"],
+        "common_name": ["Giant reed", "Giant reed", "Castor bean"],
+        "family": ["Poaceae", "Poaceae", "Euphorbiaceae"],
+    }).to_csv(csv_path, index=False)
+
+    monkeypatch.setattr(datasets, "OCCURRENCE_CSV_PATH", str(csv_path))
+    monkeypatch.setattr(settings, "shared_memory_enabled", True)
+    monkeypatch.setattr(settings, "shared_memory_prefix", _segment_name())
+    monkeypatch.setattr(settings, "shared_memory_lock_path", str(tmp_path / "shm.lock"))
+
+    datasets.load_datasets()
+    segment = datasets._shared.name
+    try:
+        df = csv_store.get_df()
+        catalog = ml_store.get_ml_catalog()
+        assert not df["latitude"].to_numpy().flags.writeable
+        assert not catalog.features.flags.writeable
+        assert len(catalog) > 0
+
+        rows = csv_store.query_species_by_location(df, 1.0, 2.0, 5.0, index=csv_store.get_spatial_index())
+        assert [(r["scientific_name"], r["common_name"]) for r in rows] == [
+            ("Arundo donax", "Giant reed"),
+            ("Ricinus communis", "Castor bean"),
+        ][:len(rows)]
+        assert rows[0]["distance_km"] == 0.0
+
+        # A second worker attaches to the same segment instead of publishing
+        other = SharedDataset.attach(segment)
+        assert other is not None and other.release() is False
+    finally:
+        datasets.unload_datasets()
+
+    assert SharedDataset.attach(segment) is None
+    assert not os.path.exists(f"/dev/shm/{segment}")
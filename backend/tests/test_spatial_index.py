@@ -0,0 +1,114 @@
+"""
+Tests for the occurrence grid index and query_species_by_location.
+Index-backed queries must return exactly what a full scan returns,
+including circles that cross the antimeridian or reach a pole.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.core.geo import haversine_km
+from app.db.csv_store import build_spatial_index, query_species_by_location
+from app.db.spatial_index import build_grid_index
+
+
+def _random_points(n, seed=0):
+    rng = np.random.default_rng(seed)
+    lats = np.degrees(np.arcsin(rng.uniform(-1, 1, n)))
+    lngs = rng.uniform(-180, 180, n)
+    return lats, lngs
+
+
+@pytest.mark.parametrize(
+    "lat,lng,radius_km",
+    [
+        (37.77, -122.42, 50.0),
+        (0.0, 179.95, 120.0),      # crosses the antimeridian eastwards
+        (-16.5, -179.9, 300.0),    # crosses the antimeridian westwards
+        (89.7, 10.0, 80.0),        # reaches the north pole
+        (-89.95, 0.0, 20.0),       # reaches the south pole
+        (60.0, 0.0, 1000.0),
+    ],
+)
+def test_grid_candidates_cover_every_point_in_radius(lat, lng, radius_km):
+    lats, lngs = _random_points(200_000)
+    index = build_grid_index(lats, lngs, cell_deg=0.5)
+
+    expected = np.flatnonzero(haversine_km(lat, lng, lats, lngs) <= radius_km)
+    candidates = index.candidates(lat, lng, radius_km)
+
+    assert np.isin(expected, candidates).all()
+    assert len(np.unique(candidates)) == len(candidates)
+    assert len(candidates) < len(lats) / 10
+
+
+def test_grid_candidates_keep_points_at_the_radius_edge():
+    # The query box ends just short of a cell boundary; the point sits 4.9998 km
+    # east, past the boundary, and must still be a candidate
+    lng = 0.1 - 1e-7 - 5 / 111.32
+    index = build_grid_index(np.array([0.0]), np.array([lng + 5 / 111.2]), cell_deg=0.1)
+    assert haversine_km(0.0, lng, 0.0, lng + 5 / 111.2) < 5.0
+    assert index.candidates(0.0, lng, 5.0).tolist() == [0]
+
+
+@pytest.mark.parametrize(
+    "box",
+    [
+        (30.0, -125.0, 40.0, -115.0),
+        (-10.0, 170.0, 10.0, 180.0),   # eastern edge of the last column
+        (-90.0, -180.0, -80.0, -170.0),
+    ],
+)
+def test_box_candidates_cover_every_point_in_box(box):
+    lats, lngs = _random_points(200_000, seed=2)
+    index = build_grid_index(lats, lngs, cell_deg=0.5)
+    min_lat, min_lng, max_lat, max_lng = box
+
+    expected = np.flatnonzero((lats >= min_lat) & (lats <= max_lat) & (lngs >= min_lng) & (lngs < max_lng))
+    candidates = index.box_candidates(*box)
+
+    assert np.isin(expected, candidates).all()
+    assert len(np.unique(candidates)) == len(candidates)
+    assert len(candidates) < len(lats) / 10
+
+
+def test_query_species_by_location_matches_full_scan():
+    lats, lngs = _random_points(50_000, seed=1)
+    df = pd.DataFrame({
+        "latitude": lats,
+        "longitude": lngs,
+        "scientific_name": [f"Species {i % 500}" for i in range(len(lats))],
+        "common_name": "",
+        "family": "",
+    })
+    index = build_spatial_index(df)
+
+    for lat, lng, radius in [(10.0, 179.9, 400.0), (-45.0, 30.0, 300.0), (89.0, -100.0, 500.0)]:
+        indexed = query_species_by_location(df, lat, lng, radius, limit=200, index=index)
+        scanned = query_species_by_location(df, lat, lng, radius, limit=200)
+        assert indexed == scanned
+        assert all(r["distance_km"] <= radius for r in indexed)
+
+
+def test_species_endpoint_serves_columnar_rows():
+    from fastapi.testclient import TestClient
+
+    from app.db import csv_store
+    from app.main import app
+    from app.schemas.species import SpeciesNearbyOut
+
+    df = pd.DataFrame({
+        "latitude": [1.0, 1.01, 1.02, 3.0],
+        "longitude": [2.0, 2.0, 2.0, 2.0],
+        "scientific_name": ["Arundo donax", "Arundo donax", "Ricinus communis", "Far away"],
+        "common_name": ["Giant reed", "Giant reed", "Castor bean", ""],
+        "family": ["Poaceae", "Poaceae", "Euphorbiaceae", ""],
+    })
+    with TestClient(app) as client:
+        csv_store.set_df(df)
+        response = client.get("/api/v1/species/by-location", params={"latitude": 1.0, "longitude": 2.0, "radius_km": 5})
+
+    rows = [SpeciesNearbyOut.model_validate(r) for r in response.json()]
+    assert [r.id for r in rows] == ["arundo_donax", "ricinus_communis"]
+    assert rows[0].distance_km == 0.0
@@ -0,0 +1,55 @@
+"""
+Tests that the async GBIF / Open-Meteo fetchers do not block the event loop.
+Runs against the local stub upstream from conftest.py.
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from app.schemas.risk import RiskAnalysisResponse
+
+SCAN = {"lat": 37.7749, "lng": -122.4194, "biome_context": "Grassland", "is_urban": True, "radius_km": 50.0}
+
+
+@pytest.mark.asyncio
+async def test_scan_uses_stub_upstream(stub_upstream, api_client):
+    response = await api_client.post("/api/v1/risk/scan", json=SCAN)
+    assert response.status_code == 200
+
+    data = response.json()
+    RiskAnalysisResponse.model_validate(data)
+    assert [r["risk_label"] for r in data["results"]] == ["Low Risk", "Low Risk"]
+    assert data["meta"]["rainfall_used"] == pytest.approx(730.0)
+    assert data["meta"]["species_found_nearby"] == 2
+    assert data["meta"]["species_in_ml_dataset"] == 2
+    paths = sorted(path for path, _ in stub_upstream.requests)
+    assert paths == ["/archive", "/gbif/occurrence/search"]
+
+
+@pytest.mark.asyncio
+async def test_gbif_and_rainfall_run_concurrently(stub_upstream, api_client):
+    stub_upstream.delay_s = 0.4
+
+    start = time.perf_counter()
+    response = await api_client.post("/api/v1/risk/scan", json=SCAN)
+    elapsed = time.perf_counter() - start
+
+    assert response.status_code == 200
+    # max(gbif, rainfall) rather than the sum of both
+    assert elapsed < 0.75
+
+
+@pytest.mark.asyncio
+async def test_concurrent_scans_do_not_serialize(stub_upstream, api_client):
+    stub_upstream.delay_s = 0.3
+    n = 8
+
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(api_client.post("/api/v1/risk/scan", json=SCAN) for _ in range(n)))
+    elapsed = time.perf_counter() - start
+
+    assert all(r.status_code == 200 for r in responses)
+    # Blocking fetchers would take at least n * 2 * delay = 4.8 s
+    assert elapsed < 1.5